@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Suscripción de un cliente al broadcaster. Cada llamada a `next_frame` bloquea
+    hasta que existe un frame más nuevo que el último enviado; si el cliente es lento
+    se salta los frames intermedios en lugar de encolarlos.
+    """
+    def __init__(self, broadcaster: 'FrameBroadcaster', sub_id: int, name: str):
+        self._broadcaster = broadcaster
+        self.id = sub_id
+        self.name = name
+        self.last_seq = 0
+        self.last_meta = None  # Metadatos publicados junto al último frame entregado
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+        self.effective_fps = 0.0  # Media móvil de los frames que realmente llegan al cliente
+        self._last_sent_at = None
+        self.connected_at = time.time()
+        self.closed = False
+
+    def next_frame(self, timeout: float = 1.0):
+        """
+        Devuelve el siguiente frame disponible (más nuevo que el último entregado).
+        Devuelve None si se agota el tiempo de espera o el broadcaster se cierra.
+        """
+        seq, payload, meta = self._broadcaster._wait(self.last_seq, timeout)
+        if payload is None:
+            return None
+        if self.last_seq:
+            self.frames_skipped += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.last_meta = meta
+        self.frames_sent += 1
+        return payload
+
+    def record_sent(self, nbytes: int):
+        """Registra un frame escrito al cliente (para los bytes y los FPS efectivos)"""
+        now = time.monotonic()
+        if self._last_sent_at is not None and now > self._last_sent_at:
+            fps = 1.0 / (now - self._last_sent_at)
+            self.effective_fps = fps if not self.effective_fps else 0.9 * self.effective_fps + 0.1 * fps
+        self._last_sent_at = now
+        self.bytes_sent += nbytes
+
+    def skip(self):
+        """El último frame entregado no se envió al cliente (p. ej. por presupuesto de bytes)"""
+        self.frames_sent -= 1
+        self.frames_skipped += 1
+
+    def stats(self) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+            "bytes_sent": self.bytes_sent,
+            "effective_fps": round(self.effective_fps, 1),
+            "connected_seconds": round(time.time() - self.connected_at, 1),
+        }
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._broadcaster._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FrameBroadcaster:
+    """
+    Difunde el último frame publicado a todos los suscriptores usando números de secuencia.
+    Solo se guarda un frame: los suscriptores esperan en una variable de condición
+    hasta que la secuencia avanza, así nadie reenvía bytes repetidos.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._payload = None
+        self._meta = None
+        self._subscribers: Dict[int, Subscription] = {}
+        self._next_id = 0
+        self._closed = False
+
+    def publish(self, payload, meta=None) -> int:
+        """
+        Publica un nuevo frame y despierta a los suscriptores. Devuelve su número de secuencia.
+        `meta` (p. ej. los flags de detección) se entrega junto a este frame y no a otro.
+        """
+        with self._cond:
+            self._seq += 1
+            self._payload = payload
+            self._meta = meta
+            self._cond.notify_all()
+            return self._seq
+
+    def latest(self):
+        """Devuelve (seq, payload) del último frame publicado sin esperar"""
+        with self._cond:
+            return self._seq, self._payload
+
+    def wait_newer(self, after_seq: int, timeout: float = 1.0):
+        """Espera un frame con secuencia mayor que `after_seq`. Devuelve (seq, payload) o (after_seq, None)."""
+        seq, payload, _ = self._wait(after_seq, timeout)
+        return seq, payload
+
+    def _wait(self, after_seq: int, timeout: float):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._closed and self._seq <= after_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return after_seq, None, None
+                self._cond.wait(remaining)
+            if self._closed or self._payload is None:
+                return after_seq, None, None
+            return self._seq, self._payload, self._meta
+
+    def subscribe(self, name: Optional[str] = None) -> Subscription:
+        with self._cond:
+            self._next_id += 1
+            sub = Subscription(self, self._next_id, name or f"cliente-{self._next_id}")
+            self._subscribers[sub.id] = sub
+        logger.info(f"Suscriptor {sub.name} añadido ({len(self._subscribers)} activos)")
+        return sub
+
+    def _unsubscribe(self, sub: Subscription):
+        with self._cond:
+            self._subscribers.pop(sub.id, None)
+        logger.info(f"Suscriptor {sub.name} eliminado: enviados={sub.frames_sent}, "
+                    f"saltados={sub.frames_skipped}")
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def stats(self) -> List[Dict]:
+        """Estadísticas por suscriptor: frames enviados y saltados"""
+        with self._cond:
+            subscribers = list(self._subscribers.values())
+        return [sub.stats() for sub in subscribers]
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        """Cierra el broadcaster y libera a todos los suscriptores en espera"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
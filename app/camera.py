@@ -1,13 +1,35 @@
 import cv2
-import os
-from typing import Dict, Tuple, Optional
-from ultralytics import YOLO
+from typing import Dict, List, Tuple, Optional, TYPE_CHECKING
 import numpy as np
 import logging
 import threading
 import time
+import copy
 import datetime
-from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from app.camera_manager import CameraManager, EVENT_SIN_BLISTER, EVENT_CON_BLISTER
+from app.stream_tiers import StreamTier, encode_frame
+from app.tracking import create_tracker, apply_tracker
+from app.scheduler import FrameScheduler, RateMeter
+from app.pipeline import Pipeline, stage_placements
+from app.roi import inspection_area, predict_frames
+from app.postprocess import summarize_detections
+from app.detection_snapshot import DetectionSnapshot
+from app.counting import CountEvent
+from app.inference_worker import InferenceWorker, boxes_to_result
+from app.model_registry import get_model, inference_lock
+from app.model_backends import adopt_selection, select_model
+from app.pulse_scheduler import PulseScheduler
+from app.metrics import STAGE_SECONDS
+from app.ws_stream import frame_flags
+from app.stream_guard import SendGuard
+from app.event_log import EventLog, DEFAULT_SHIFTS
+from app.startup import STARTUP
+
+# ultralytics y torch se importan al cargar el modelo, no al importar este módulo
+if TYPE_CHECKING:
+    from ultralytics import YOLO
 
 # Importar biblioteca para OPC-UA
 try:
@@ -26,53 +48,126 @@ except ImportError as e:
 logger = logging.getLogger(__name__)
 
 # Variables globales para la cámara y detección
-_camera_instance = None
+_camera_manager = None  # Cámaras del proceso: captura, difusión, ROI, nodos PLC y contadores de cada una
 _camera_lock = threading.RLock()
 _background_detection_active = False
-_latest_frame = None
-_latest_frame_lock = threading.Lock()
-_latest_detections = {}
-_thread_pool = ThreadPoolExecutor(max_workers=5)
+_scheduler = None  # Ritmo del loop de detección y estadísticas de FPS
+_detection_rate = RateMeter()  # Lotes que salen de la etapa de inferencia por segundo
+_event_log = None  # Registro persistente de las pizzas contadas (None = desactivado)
+_inference_worker = None  # Proceso de inferencia (None = inferencia en este proceso)
+_pipeline = None  # Etapas del loop de detección (None hasta que arranca el thread de fondo)
 
-# Contadores para estadísticas de detección
-_counter_pizza_sin_blister = 0
-_counter_pizza_con_blister = 0
-_counter_total = 0
-_counters_lock = threading.Lock()
+# Lote de la captura que recorre el pipeline: frames de cada cámara, sus áreas, los índices
+# a inferir (detector de cambios), la firma de cada frame para el detector (None = sin él) y,
+# tras la inferencia, un resultado por frame (None = reutilizar)
+FrameBatch = namedtuple('FrameBatch', ['iteration', 'batch', 'areas', 'to_infer', 'signatures', 'results'])
 
 # Cliente OPC-UA global para mantener una conexión persistente
 _opcua_client = None
 _opcua_reconnect_thread = None
 _opcua_should_reconnect = True  # Flag para controlar el hilo de reconexión
-_thread_pool = ThreadPoolExecutor(max_workers=10)  # Pool de hilos compartido
+
+class _LivenessHandler:
+    """
+    Handler de la suscripción a ServerStatus.CurrentTime: cada notificación del servidor
+    prueba que la conexión sigue viva, y un cambio de estado de la suscripción la da por perdida.
+    """
+    def __init__(self, opcua_client):
+        self.opcua_client = opcua_client
+
+    def datachange_notification(self, node, val, data):
+        self.opcua_client.mark_alive()
+
+    def status_change_notification(self, status):
+        self.opcua_client.mark_link_lost(f"estado de la suscripción: {status}")
 
 class OPCUAClient:
     """
     Clase para gestionar la comunicación con el PLC usando OPC-UA de forma persistente.
     Se conecta al servidor OPC-UA una sola vez y se utiliza la conexión para todas las operaciones.
     """
-    def __init__(self, config):
+    def __init__(self, config, node_ids=None):
         # Verificar disponibilidad antes de usar Client
         if not OPCUA_AVAILABLE:
             logger.error("OPC UA no disponible, inicialización fallida")
             self.client = None
             self.connected = False
+            self.pulse_scheduler = None
             return
         
         self.url = config.get('OPCUA_URL', 'opc.tcp://192.168.9.20:4840')
         self.node_sin_blister_id = config.get('OPCUA_NODE_SIN_BLISTER', 'ns=4;i=3')
         self.node_con_blister_id = config.get('OPCUA_NODE_CON_BLISTER', 'ns=4;i=4')
-        self.client = Client(self.url)
+        # Todos los nodos a resolver al conectar (los de cada cámara en modo multi-cámara)
+        self.node_ids = list(dict.fromkeys([self.node_sin_blister_id, self.node_con_blister_id] + list(node_ids or [])))
+        self.timeout = config.get('OPCUA_TIMEOUT', 1)
+        self.liveness_interval = config.get('OPCUA_LIVENESS_INTERVAL', 0.25)
+        self.liveness_timeout = config.get('OPCUA_LIVENESS_TIMEOUT', 0.6)
+        # Plazo máximo desde la última señal de vida hasta dar la conexión por perdida
+        self.link_loss_timeout = config.get('OPCUA_LINK_LOSS_TIMEOUT', 0.9)
+        self._probe_executor = None  # Hilo del sondeo: se espera solo lo que queda de plazo
+        self._probe = None
+        self.nodes = {}
         self.node_sin_blister = None
         self.node_con_blister = None
+        self.client = self._create_client()
+        self.subscription = None  # Suscripción de vida (se recrea en cada sesión)
+        self.last_alive = 0.0  # time.monotonic() de la última señal de vida del servidor
+        self.disconnects = 0
         self.connected = False
-        self.lock = threading.Lock()
+        self.lock = threading.RLock()  # Reentrante: write_value() reconecta con el lock tomado
         self.reconnect_interval = 5  # Intentar reconectar cada 5 segundos
         self.last_connection_attempt = 0  # Timestamp del último intento de conexión
+
+        # Un solo hilo escribe los flancos de todos los pulsos, en orden y sin dormir entre ellos
+        self.pulse_scheduler = PulseScheduler(
+            self._write_edges,
+            pulse_width=config.get('OPCUA_PULSE_WIDTH', 0.1),
+            min_gap=config.get('OPCUA_PULSE_MIN_GAP', 0.1),
+            max_queue=config.get('OPCUA_PULSE_QUEUE_SIZE', 64),
+            batch_window=config.get('OPCUA_WRITE_BATCH_WINDOW', 0.005),
+        )
         
         # Iniciar thread de reconexión automática
         self.start_reconnect_thread()
     
+    def _create_client(self):
+        """
+        Crea el cliente y resuelve los nodos una sola vez. Los handles se reutilizan en
+        todas las reconexiones de este cliente; solo se resuelven de nuevo si se recrea.
+        """
+        client = Client(self.url, timeout=self.timeout)
+        self.nodes = {node_id: client.get_node(node_id) for node_id in self.node_ids}
+        self.node_sin_blister = self.nodes[self.node_sin_blister_id]
+        self.node_con_blister = self.nodes[self.node_con_blister_id]
+        return client
+
+    def mark_alive(self):
+        """Registra una señal de vida del servidor (notificación o escritura correcta)"""
+        self.last_alive = time.monotonic()
+
+    def mark_link_lost(self, reason):
+        """Da la conexión por perdida; el thread de reconexión se encarga de recuperarla"""
+        if self.connected:
+            self.connected = False
+            self.disconnects += 1
+            logger.warning(f"Conexión OPC-UA perdida ({reason})")
+
+    def is_stale(self) -> bool:
+        """True si el servidor lleva más de liveness_timeout sin dar señales de vida"""
+        return time.monotonic() - self.last_alive > self.liveness_timeout
+
+    def _start_liveness(self):
+        """Suscripción a la hora del servidor para detectar caídas sin sondear"""
+        try:
+            self.subscription = self.client.create_subscription(int(self.liveness_interval * 1000),
+                                                                _LivenessHandler(self))
+            self.subscription.subscribe_data_change(
+                self.client.get_node(ua.ObjectIds.Server_ServerStatus_CurrentTime))
+        except Exception as e:
+            self.subscription = None
+            logger.warning(f"No se pudo crear la suscripción de vida OPC-UA, se usará sondeo: {e}")
+
     def start_reconnect_thread(self):
         """Inicia un thread que monitorea y restablece la conexión con el servidor OPC-UA"""
         global _opcua_reconnect_thread
@@ -105,7 +200,7 @@ class OPCUAClient:
                             self.client.disconnect()
                         except:
                             pass
-                        self.client = Client(self.url)
+                        self.client = self._create_client()
                         consecutive_failures = 0
                     
                     success = self.connect(force=True)
@@ -113,14 +208,19 @@ class OPCUAClient:
                         consecutive_failures = 0
                     else:
                         consecutive_failures += 1
-                # Si está conectado, verificar que la conexión sigue activa
-                elif self.connected:
-                    if self.check_connection():
+                # Si está conectado, sondear solo cuando la suscripción lleva un rato en silencio
+                elif self.is_stale():
+                    if self.check_connection(deadline=self.last_alive + self.link_loss_timeout):
                         consecutive_failures = 0
                     else:
                         consecutive_failures += 1
                         logger.warning(f"La conexión al servidor OPC-UA parece estar caída ({consecutive_failures} fallos)")
-                
+
+                if self.connected:
+                    # Despertar justo cuando la conexión pasaría a estar en silencio, no después
+                    stale_in = self.last_alive + self.liveness_timeout - time.monotonic()
+                    time.sleep(min(self.liveness_interval, max(stale_in, 0.01)))
+                    continue
                 # Ajustar intervalo según número de fallos (backoff exponencial limitado)
                 wait_time = min(self.reconnect_interval * (1 + consecutive_failures * 0.2), 30)
                 time.sleep(wait_time)
@@ -129,24 +229,37 @@ class OPCUAClient:
                 consecutive_failures += 1
                 time.sleep(self.reconnect_interval)
                 
-    def check_connection(self):
-        """Verifica si la conexión sigue activa"""
+    def check_connection(self, deadline: Optional[float] = None):
+        """
+        Verifica si la conexión sigue activa. Con `deadline` (time.monotonic) la respuesta
+        se espera solo hasta ese instante, no todo OPCUA_TIMEOUT: un enlace mudo (cable
+        desconectado) se da por perdido dentro de OPCUA_LINK_LOSS_TIMEOUT.
+        """
         try:
             # Intentar una operación simple para verificar conexión
             if self.client and hasattr(self.client, "uaclient") and self.client.uaclient:
-                try:
+                if self._probe_executor is None:
+                    self._probe_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="opcua-probe")
+                # Un sondeo anterior colgado se sigue esperando en lugar de encolar otro
+                if self._probe is None or self._probe.done():
                     # Leer un atributo del servidor para verificar la conexión
-                    self.client.get_namespace_array()
+                    self._probe = self._probe_executor.submit(self.client.get_namespace_array)
+                wait = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+                try:
+                    self._probe.result(timeout=wait)
+                    self.mark_alive()
                     return True
+                except FutureTimeout:
+                    self.mark_link_lost("sin respuesta del servidor dentro del plazo")
+                    return False
                 except Exception:
-                    logger.warning("Conexión OPC-UA inactiva, marcando como desconectado")
-                    self.connected = False
+                    self.mark_link_lost("sin respuesta del servidor")
                     return False
             else:
-                self.connected = False
+                self.mark_link_lost("cliente sin sesión")
                 return False
         except Exception:
-            self.connected = False
+            self.mark_link_lost("error al verificar la conexión")
             return False
         
     def connect(self, force=False):
@@ -163,7 +276,8 @@ class OPCUAClient:
                 
             self.last_connection_attempt = current_time
             
-            # Intentar desconectar primero si ya estaba conectado
+            # Intentar desconectar primero si ya estaba conectado (la suscripción muere con la sesión)
+            self.subscription = None
             try:
                 self.client.disconnect()
             except Exception:
@@ -174,19 +288,21 @@ class OPCUAClient:
                 logger.info(f"Intentando conectar al servidor OPC-UA en {self.url}...")
                 self.client.connect()
                 
-                # Obtener los nodos
+                # Los nodos ya están resueltos en este cliente: solo se registra la suscripción de vida
                 try:
-                    self.node_sin_blister = self.client.get_node(self.node_sin_blister_id)
-                    self.node_con_blister = self.client.get_node(self.node_con_blister_id)
+                    self._start_liveness()
                     
                     logger.info(f"Nodo sin blister: {self.node_sin_blister.nodeid}")
                     logger.info(f"Nodo con blister: {self.node_con_blister.nodeid}")
+                    for node_id, node in self.nodes.items():
+                        logger.debug(f"Nodo {node_id}: {node.nodeid}")
                     
+                    self.mark_alive()
                     self.connected = True
                     logger.info(f"✓ Conexión OPC-UA establecida con {self.url}")
                     return True
                 except Exception as e:
-                    logger.error(f"Error al obtener nodos OPC-UA: {e}")
+                    logger.error(f"Error al preparar la sesión OPC-UA: {e}")
                     self.connected = False
                     try:
                         self.client.disconnect()
@@ -200,7 +316,16 @@ class OPCUAClient:
 
     def disconnect(self):
         """Cierra la conexión si está abierta."""
+        if self._probe_executor is not None:
+            self._probe_executor.shutdown(wait=False)
+            self._probe_executor = self._probe = None
         with self.lock:
+            if self.subscription is not None:
+                try:
+                    self.subscription.delete()
+                except Exception:
+                    pass
+                self.subscription = None
             if self.connected:
                 try:
                     self.client.disconnect()
@@ -216,18 +341,59 @@ class OPCUAClient:
             if not self.connected:
                 self.connect()
                 if not self.connected:
-                    logger.warning(f"No se pudo escribir valor: OPC-UA no conectado")
+                    logger.warning("No se pudo escribir valor: OPC-UA no conectado")
                     return False
             
             try:
                 dv = ua.DataValue(ua.Variant(value, ua.VariantType.Boolean))
-                node.set_attribute(ua.AttributeIds.Value, dv)
+                with STAGE_SECONDS.time('opcua_write'):
+                    node.set_attribute(ua.AttributeIds.Value, dv)
+                self.mark_alive()
                 return True
             except Exception as e:
                 logger.error(f"Error al escribir valor en nodo OPC-UA: {e}")
                 self.connected = False
                 return False
     
+    def write_values(self, values: List[Tuple[str, bool]]) -> bool:
+        """Escribe varios nodos booleanos (por NodeId) en una sola llamada Write al servidor"""
+        with self.lock:
+            if not self.connected:
+                self.connect()
+                if not self.connected:
+                    logger.warning("No se pudo escribir valores: OPC-UA no conectado")
+                    return False
+
+            params = ua.WriteParameters()
+            for node_id, value in values:
+                node = self.nodes.get(node_id)
+                if node is None:
+                    logger.warning(f"⚠️ Nodo {node_id} no disponible")
+                    continue
+                write = ua.WriteValue()
+                write.NodeId = node.nodeid
+                write.AttributeId = ua.AttributeIds.Value
+                write.Value = ua.DataValue(ua.Variant(value, ua.VariantType.Boolean))
+                params.NodesToWrite.append(write)
+            if not params.NodesToWrite:
+                return False
+
+            try:
+                with STAGE_SECONDS.time('opcua_write'):
+                    statuses = self.client.uaclient.write(params)
+            except Exception as e:
+                logger.error(f"Error al escribir valores en nodos OPC-UA: {e}")
+                self.mark_link_lost("fallo de escritura")
+                return False
+            # El servidor respondió: la conexión está viva aunque algún nodo rechace la escritura
+            self.mark_alive()
+            ok = True
+            for write, status in zip(params.NodesToWrite, statuses):
+                if not status.is_good():
+                    logger.error(f"Escritura rechazada en nodo {write.NodeId}: {status}")
+                    ok = False
+            return ok
+
     def write_pizza_sin_blister(self, value: bool):
         """Escribe en el nodo correspondiente a pizza sin blister"""
         return self.write_value(self.node_sin_blister, value)
@@ -238,89 +404,96 @@ class OPCUAClient:
     
     def generate_pulse_pizza_sin_blister(self):
         """Genera un pulso en el nodo de pizza sin blister sin bloquear el hilo principal"""
-        global _thread_pool
-        
-        # Usar el pool de hilos en lugar de crear uno nuevo cada vez
-        _thread_pool.submit(self._execute_pulse_pizza_sin_blister)
-        return True  # Siempre retorna True para no bloquear el flujo
-
-    def _execute_pulse_pizza_sin_blister(self):
-        """Método interno para ejecutar el pulso"""
-        try:
-            if not self.connected:
-                logger.info("Intentando reconectar al OPC-UA antes de enviar pulso...")
-                self.connect(force=True)
-            
-            # Intentar enviar pulso aunque la conexión falle
-            try:
-                if self.write_pizza_sin_blister(True):
-                    time.sleep(0.1)  # Pequeña pausa para el flanco
-                    self.write_pizza_sin_blister(False)
-                    logger.info("✅ Pulso pizza sin blister enviado correctamente")
-                else:
-                    logger.warning("⚠️ No se pudo enviar pulso pizza sin blister")
-            except Exception as e:
-                logger.error(f"❌ Error al enviar pulso pizza sin blister: {e}")
-        except Exception as e:
-            logger.error(f"❌ Error en thread de pulso: {e}")
+        return self.generate_pulse(self.node_sin_blister_id, "pizza sin blister")
 
     def generate_pulse_pizza_con_blister(self):
         """Genera un pulso en el nodo de pizza con blister sin bloquear el hilo principal"""
-        global _thread_pool
-        
-        # Usar el pool de hilos en lugar de crear uno nuevo cada vez
-        _thread_pool.submit(self._execute_pulse_pizza_con_blister)
-        return True  # Siempre retorna True para no bloquear el flujo
+        return self.generate_pulse(self.node_con_blister_id, "pizza con blister")
 
-    def _execute_pulse_pizza_con_blister(self):
-        """Método interno para ejecutar el pulso"""
-        try:
-            if not self.connected:
-                logger.info("Intentando reconectar al OPC-UA antes de enviar pulso...")
-                self.connect(force=True)
-            
-            # Intentar enviar pulso aunque la conexión falle
-            try:
-                if self.write_pizza_con_blister(True):
-                    time.sleep(0.1)  # Pequeña pausa para el flanco
-                    self.write_pizza_con_blister(False)
-                    logger.info("✅ Pulso pizza con blister enviado correctamente")
-                else:
-                    logger.warning("⚠️ No se pudo enviar pulso pizza con blister")
-            except Exception as e:
-                logger.error(f"❌ Error al enviar pulso pizza con blister: {e}")
-        except Exception as e:
-            logger.error(f"❌ Error en thread de pulso: {e}")
+    def generate_pulse(self, node_id, label, detected_at=None):
+        """
+        Programa un pulso en cualquier nodo configurado sin bloquear el hilo principal.
+        Devuelve False si OPC-UA no está disponible o la cola de pulsos está llena.
+        """
+        if self.pulse_scheduler is None:
+            logger.warning(f"⚠️ No se pudo enviar pulso {label}: OPC-UA no disponible")
+            return False
+        return self.pulse_scheduler.submit(node_id, label, detected_at)
+
+    def _write_edges(self, values: List[Tuple[str, bool]]) -> bool:
+        """Escribe un lote de flancos de pulso (lo llama el hilo del planificador de pulsos)"""
+        return self.write_values(values)
+
+    def pulse_stats(self) -> Dict:
+        """Profundidad de la cola de pulsos y latencia desde la detección hasta la escritura"""
+        return self.pulse_scheduler.stats() if self.pulse_scheduler else {}
+
+    def link_stats(self) -> Dict:
+        """Estado de la conexión: modo de vigilancia, última señal de vida y caídas detectadas"""
+        if self.client is None:
+            return {"connected": False}
+        return {
+            "connected": self.connected,
+            "liveness": "subscription" if self.subscription is not None else "polling",
+            "last_alive_ms": round((time.monotonic() - self.last_alive) * 1000, 1) if self.last_alive else None,
+            "disconnects": self.disconnects,
+        }
 
 class VideoCamera:
-    def __init__(self, config):
+    def __init__(self, config, camera_id=None):
         self.config = config
-        global _camera_instance
+        global _camera_manager
         global _camera_lock
         global _background_detection_active
         global _opcua_client
-        
-        # Inicializar la conexión OPC-UA con sistema de reconexión
-        if _opcua_client is None:
-            logger.info("Inicializando cliente OPC-UA con reconexión automática")
-            _opcua_client = OPCUAClient(config)
-            # El cliente ahora maneja su propia reconexión automática
+        global _event_log
         
         with _camera_lock:
-            if _camera_instance is None:
-                logger.info("Inicializando cámara compartida")
-                _camera_instance = cv2.VideoCapture(config['VIDEO_SOURCE'])
-                if not _camera_instance.isOpened():
+            if _camera_manager is None:
+                logger.info("Inicializando cámaras compartidas")
+                manager = CameraManager(config)
+                
+                if _event_log is None and config.get('EVENT_LOG_ENABLED', True):
+                    _event_log = EventLog(config.get('EVENT_LOG_PATH', 'events.db'),
+                                          flush_interval=config.get('EVENT_LOG_FLUSH_INTERVAL', 1.0),
+                                          retention_days=config.get('EVENT_LOG_RETENTION_DAYS', 0),
+                                          shifts=config.get('EVENT_LOG_SHIFTS', DEFAULT_SHIFTS))
+                
+                # Inicializar la conexión OPC-UA con sistema de reconexión
+                if _opcua_client is None:
+                    logger.info("Inicializando cliente OPC-UA con reconexión automática")
+                    _opcua_client = OPCUAClient(config, manager.node_ids())
+                    # El cliente ahora maneja su propia reconexión automática
+                
+                _camera_manager = manager
+                if not manager.start():
                     logger.error("Error abriendo la cámara")
                 else:
+                    STARTUP.mark('cameras_opened')
+                    if config.get('RECORDING_ENABLED', False):
+                        manager.start_recording(config)
                     # Iniciar el proceso de detección en segundo plano
                     self.start_background_detection_thread(config)
         
-        self.cap = _camera_instance
-        self.model = self.initialize_model()
-        self.previous_red = False  # Para detectar flanco de subida
-        self.previous_green = False  # Para detectar flanco de subida
-        self.frame_lock = threading.Lock()
+        self.camera = _camera_manager.get(camera_id) or _camera_manager.default
+        self.grabber = self.camera.grabber if self.camera.opened else None
+        # Con la inferencia en otro proceso el modelo no se carga en este
+        self.model = None if inference_in_worker(config) else self.initialize_model()
+        self.last_seq = 0  # Último frame consumido por el modo sin detección de fondo
+
+    @classmethod
+    def offline(cls, config):
+        """
+        Instancia sin cámaras, OPC-UA ni thread de fondo, para reproducir vídeo grabado
+        por los mismos métodos de inferencia y post-procesado (ver benchmarks/pipeline.py)
+        """
+        camera = cls.__new__(cls)
+        camera.config = config
+        camera.camera = None
+        camera.grabber = None
+        camera.model = None
+        camera.last_seq = 0
+        return camera
 
     def start_background_detection_thread(self, config):
         """Avvia un thread dedicato per il rilevamento in background"""
@@ -335,193 +508,305 @@ class VideoCamera:
         bg_thread.start()
         
     def background_detection_loop(self, config):
-        """Loop continuo que realiza detección incluso sin clientes conectados"""
+        """
+        Loop continuo que realiza detección incluso sin clientes conectados, como pipeline
+        de etapas concurrentes (ver app.pipeline): este hilo es la captura (toma el frame más
+        reciente de cada cámara con frame nuevo y aplica el detector de cambios) y entrega el
+        lote a la inferencia, que lo infiere en una sola llamada con tracking por cámara;
+        después vienen el post-procesado (conteo, pulsos, estado) y la codificación para los
+        clientes. Entre etapas hay colas acotadas que descartan lo más antiguo.
+        """
         logger.info("Proceso de detección en segundo plano iniciado")
-        model = self.initialize_model()
-        
-        if not model:
-            logger.error("No se pudo inicializar el modelo para detección en segundo plano")
+        global _inference_worker
+        global _pipeline
+        cameras = list(_camera_manager.contexts.values())
+        try:
+            placements = stage_placements(config)
+        except ValueError as e:
+            logger.error(f"Configuración del pipeline no válida: {e}")
             return
+        if placements['inference'] == 'process':
+            # Inferencia y tracking en un proceso aparte; este proceso solo post-procesa
+            _inference_worker = start_inference_worker(config, len(cameras))
+            if _inference_worker is None:
+                logger.error("No se pudo arrancar el proceso de inferencia para detección en segundo plano")
+                return
+            STARTUP.mark('model_ready')
+            model = None
+        else:
+            model = self.initialize_model()
+            if not model:
+                logger.error("No se pudo inicializar el modelo para detección en segundo plano")
+                return
+            # El búfer de tracks perdidos del tracker se mide en frames: ajustarlo al ritmo real de inferencia
+            for ctx in cameras:
+                ctx.tracker = create_tracker(config, frame_rate=config.get('DETECTION_TARGET_FPS', 15) or 30)
+        camera_index = {ctx.id: i for i, ctx in enumerate(cameras)}
         
-        global _latest_detections
-        global _latest_frame
-        global _latest_frame_lock
-        global _opcua_client
-        global _counter_pizza_sin_blister
-        global _counter_pizza_con_blister
-        global _counter_total
-        global _counters_lock
+        pipeline = Pipeline(queue_size=config.get('PIPELINE_QUEUE_SIZE', 2))
+        pipeline.add('inference', lambda item: self.infer_batch(item, model, camera_index), placements['inference'])
+        # Sin descartes entre inferencia y post-procesado: un lote inferido ya movió la
+        # referencia del detector de cambios y lleva el conteo y los pulsos de sus frames
+        pipeline.add('postprocess', self.postprocess_batch, lossless=True)
+        pipeline.add('encode', self.publish_frames)
+        pipeline.start()
+        _pipeline = pipeline
         
-        previous_red = False
-        previous_green = False
+        # Ritmo objetivo de captura (0 = máximo rendimiento, sin pausas)
+        global _scheduler
+        scheduler = FrameScheduler(config.get('DETECTION_TARGET_FPS', 15), observer=STAGE_SECONDS.observe)
+        _scheduler = scheduler
         iteration_count = 0
+        idle_since = time.perf_counter()
         
         while _background_detection_active:
             try:
-                # Capturar frame
-                with _camera_lock:
-                    ret, frame = _camera_instance.read()
+                scheduler.begin()
                 
-                if not ret:
+                # Tomar el frame más reciente de cada cámara publicado por su hilo de captura
+                # (la lectura del dispositivo se mide aparte, como etapa 'capture', en FrameGrabber)
+                with scheduler.stage('wait_frame'):
+                    batch = _camera_manager.collect_frames(timeout=1.0)
+                
+                if not batch:
                     logger.error("Error al capturar frame en proceso de fondo")
-                    time.sleep(1)
+                    scheduler.reset()
                     continue
                 
-                # Detectar objetos
-                results = model.track(frame, conf=config['CONF_THRESHOLD'])
-                annotated_frame = results[0].plot()
-                
-                # Dibujar área verde
-                area_coords = self.draw_green_box(annotated_frame)
-                
-                # Analizar detecciones
-                detections = {'pizza': False, 'blister': False, 'conf_pizza': 0.0, 'conf_blister': 0.0}
-                boxes = results[0].boxes
-                
-                for box in boxes:
-                    cls = int(box.cls[0].item()) if box.cls is not None else -1
-                    conf = float(box.conf[0].item()) if box.conf is not None else 0.0
-                    conf_percent = round(conf * 100, 1)  # Convertir a porcentaje con 1 decimal
-                    coords = box.xyxy[0].cpu().numpy()
-                    
-                    if self.is_inside_area(coords, area_coords):
-                        if cls == config['PIZZA_CLASS_ID']:
-                            detections['pizza'] = True
-                            detections['conf_pizza'] = conf_percent
-                        elif cls == config['BLISTER_CLASS_ID']:
-                            detections['blister'] = True
-                            detections['conf_blister'] = conf_percent
-                
-                # Actualizar estado para PLC basado en el código que funciona
-                if detections['pizza'] and not detections['blister']:
-                    # Caso: pizza sin blister - punto rojo
-                    self.draw_dot(annotated_frame, config['RED_DOT_POSITION'], 
-                                 config['RED_DOT_RADIUS'], config['RED_DOT_COLOR'])
-                    
-                    # Detectar flanco de subida: de False a True
-                    if not previous_red and _opcua_client:
-                        logger.info("¡FLANCO DETECTADO! Generando pulso para pizza sin blister")
-                        _opcua_client.generate_pulse_pizza_sin_blister()
-                        
-                        # Actualizar contadores
-                        with _counters_lock:
-                            _counter_pizza_sin_blister += 1
-                            _counter_total += 1
-                    
-                    previous_red = True
-                    previous_green = False
-                
-                elif detections['pizza'] and detections['blister']:
-                    # Caso: pizza con blister - punto verde
-                    self.draw_dot(annotated_frame, config['GREEN_DOT_POSITION'], 
-                                 config['GREEN_DOT_RADIUS'], config['GREEN_DOT_COLOR'])
-                    
-                    # Detectar flanco de subida para pizza con blister
-                    if not previous_green and _opcua_client:
-                        logger.info("¡FLANCO DETECTADO! Generando pulso para pizza con blister")
-                        _opcua_client.generate_pulse_pizza_con_blister()
-                        
-                        # Actualizar contadores
-                        with _counters_lock:
-                            _counter_pizza_con_blister += 1
-                            _counter_total += 1
-                            print(_counter_pizza_con_blister)
-                    
-                    previous_red = False
-                    previous_green = True
-                
-                else:
-                    # No hay detecciones relevantes
-                    previous_red = False
-                    previous_green = False
-                
-                # Actualizar estado global
-                _latest_detections = detections
-                
-                # Guardar último frame procesado para clientes
-                with _latest_frame_lock:
-                    _, jpeg = cv2.imencode('.jpg', annotated_frame)
-                    _latest_frame = jpeg.tobytes()
+                STARTUP.mark('first_frame')
+                busy_since = time.perf_counter()
+                areas = [ctx.area_coords(captured.frame.shape) for ctx, captured in batch]
                 
-                # Define opcua_connected FUERA del bloque condicional
-                opcua_connected = _opcua_client and _opcua_client.connected if _opcua_client else False
-                
-                # AÑADIR ESTE CÓDIGO para calcular los porcentajes (sin dibujar en pantalla)
-                total = _counter_total if _counter_total > 0 else 1  # Evitar división por cero
-                porcentaje_sin_blister = (_counter_pizza_sin_blister / total) * 100
-                porcentaje_con_blister = (_counter_pizza_con_blister / total) * 100
-
-                # Actualizar estado compartido
-                timestamp = datetime.datetime.now().isoformat()
+                # Con el detector de cambios, solo se infieren las cámaras cuyo área cambió. La
+                # referencia del detector se mueve en la etapa de inferencia, con el resultado:
+                # si el lote se descarta antes, el frame siguiente vuelve a disparar la inferencia
+                with scheduler.stage('motion'):
+                    checks = [self.check_motion(ctx, captured.frame, area)
+                              for (ctx, captured), area in zip(batch, areas)]
+                to_infer = [i for i, (infer, _) in enumerate(checks) if infer]
+                signatures = [signature for _, signature in checks]
                 
-                logger.debug(f"Actualizando shared_state con: pizza={detections['pizza']}, blister={detections['blister']}, " +
-                             f"contadores=[{_counter_pizza_sin_blister}/{_counter_pizza_con_blister}/{_counter_total}], " +
-                             f"porcentajes=[{porcentaje_sin_blister:.1f}/{porcentaje_con_blister:.1f}]")
-
-                if hasattr(self, 'shared_state') and self.shared_state:
-                    self.shared_state.last_detection = {
-                        "pizza": detections['pizza'],
-                        "blister": detections['blister'],
-                        "conf_pizza": detections['conf_pizza'],
-                        "conf_blister": detections['conf_blister'],
-                        "opcua_connected": opcua_connected,
-                        "counter_sin_blister": _counter_pizza_sin_blister,
-                        "counter_con_blister": _counter_pizza_con_blister,
-                        "counter_total": _counter_total,
-                        "porcentaje_sin_blister": porcentaje_sin_blister,
-                        "porcentaje_con_blister": porcentaje_con_blister,
-                        "timestamp": timestamp
-                    }
-                
-                # Mostrar menos logs para no saturar
+                pipeline.submit(FrameBatch(iteration_count, batch, areas, to_infer, signatures, None))
+                now = time.perf_counter()
+                pipeline.source.record(now - busy_since, busy_since - idle_since)
+                idle_since = now
                 iteration_count += 1
-                if iteration_count % 10 == 0:
-                    logger.info(f"BG Detection: Pizza={detections['pizza']}({detections['conf_pizza']}%), "
-                               f"Blister={detections['blister']}({detections['conf_blister']}%), "
-                               f"OPCUA={opcua_connected}, "
-                               f"Estadísticas=[{_counter_pizza_sin_blister}/{_counter_pizza_con_blister}]")
                 
-                # Pausa breve para no saturar el sistema
-                time.sleep(0.05)
+                # Esperar solo lo que falta para el siguiente ciclo (sin pausa fija)
+                scheduler.end()
                 
             except Exception as e:
                 logger.error(f"Error en proceso de detección de fondo: {e}")
                 time.sleep(1)
+                scheduler.reset()
+        
+        pipeline.stop()
     
-    # El resto de métodos se mantienen igual
-    def initialize_model(self) -> Optional[YOLO]:
-        """Inicializa el modelo YOLO."""
-        try:
-            model_path = self.config['BASE_DIR'] / 'models' / 'yolo_weights.pt'
-            engine_path = self.config['BASE_DIR'] / 'models' / 'yolo_weights_engine.engine'
-            
-            # Verificar si existe el archivo del modelo
-            if not os.path.exists(model_path):
-                logger.error(f"No se encontró el modelo en {model_path}")
+    def infer_batch(self, item: 'FrameBatch', model, camera_index: Dict[str, int]) -> Optional['FrameBatch']:
+        """
+        Etapa de inferencia: infiere en una sola llamada los frames del lote que lo necesitan
+        y aplica el tracker de cada cámara. Sin `model` se usa el proceso de inferencia, que
+        ya devuelve las cajas con tracking. None descarta el lote (el proceso falló).
+        """
+        results = [None] * len(item.batch)
+        if not item.to_infer:
+            _detection_rate.tick()
+            return item._replace(results=results)
+        frames = [item.batch[i][1].frame for i in item.to_infer]
+        areas = [item.areas[i] for i in item.to_infer]
+        if model is None:
+            with STAGE_SECONDS.time('inference'):
+                inferred = _inference_worker.infer(frames, areas,
+                                                   [camera_index[item.batch[i][0].id] for i in item.to_infer])
+            if inferred is None:
                 return None
+            for i, boxes in zip(item.to_infer, inferred):
+                results[i] = boxes_to_result(boxes, item.batch[i][1].frame, _inference_worker.names)
+        else:
+            with STAGE_SECONDS.time('inference'), inference_lock(model):
+                inferred = self.run_inference(model, frames, areas)
+            # En esta etapa y no después: el tracker ve todos los frames inferidos, en orden
+            for i, result in zip(item.to_infer, inferred):
+                results[i] = apply_tracker(item.batch[i][0].tracker, result)
+        # Ya hay resultado: los frames siguientes se comparan con los recién inferidos
+        for i in item.to_infer:
+            gate = item.batch[i][0].motion_gate
+            if gate is not None and item.signatures[i] is not None:
+                gate.accept(item.signatures[i])
+        _detection_rate.tick()
+        return item._replace(results=results)
+    
+    def postprocess_batch(self, item: 'FrameBatch') -> Optional[List[Tuple]]:
+        """
+        Etapa de post-procesado: conteo, pulsos y estado de cada cámara del lote. Devuelve
+        los frames a anotar para la etapa de codificación (None si nadie está viendo).
+        """
+        pending = []
+        with STAGE_SECONDS.time('postprocess'):
+            for (ctx, captured), result, area_coords in zip(item.batch, item.results, item.areas):
+                if result is not None:
+                    ctx.last_result = result
+                else:
+                    # Área sin cambios: reutilizar la detección anterior sobre el frame actual, en
+                    # una copia (la etapa de codificación puede estar anotando la anterior)
+                    result = copy.copy(ctx.last_result)
+                    result.orig_img = captured.frame
+                detections = self.process_detections(ctx, [result], area_coords, captured,
+                                                      publish=lambda *frame: pending.append(frame))
+                STARTUP.mark('first_detection')
                 
-            model = YOLO(model_path)
-            logger.info(f"Modelo YOLO cargado desde {model_path}")
-            # Si existe una versión optimizada, usarla
-            if (os.path.exists(engine_path)):
-                logger.info(f"Usando modelo optimizado desde {engine_path}")
-                return YOLO(engine_path)
-            return model
-        except Exception as e:
-            logger.error(f"Error al cargar el modelo: {e}")
-            return None
+                # Mostrar menos logs para no saturar
+                if item.iteration % 10 == 0:
+                    counters = ctx.counters()
+                    logger.info(f"BG Detection [{ctx.id}]: Pizza={detections['pizza']}({detections['conf_pizza']}%), "
+                               f"Blister={detections['blister']}({detections['conf_blister']}%), "
+                               f"OPCUA={opcua_is_connected()}, "
+                               f"Estadísticas=[{counters['counter_sin_blister']}/{counters['counter_con_blister']}], "
+                               f"FPS={detection_fps():.1f}")
+        return pending or None
+    
+    def publish_frames(self, pending: List[Tuple]):
+        """Etapa de codificación: anota y publica cada frame y lo codifica para los tiers con clientes"""
+        for ctx, results, detections, area_coords, flags in pending:
+            seq, annotated = self.publish_annotated(ctx, results, detections, area_coords, flags)
+            ctx.tier_encoder.prime(seq, annotated)
+    
+    def publish_annotated(self, ctx, results, detections, area_coords, flags):
+        """Anota el frame y lo publica a los clientes de la cámara. Devuelve (seq, frame anotado)."""
+        with STAGE_SECONDS.time('annotate'):
+            annotated = self.annotate_frame(results, detections, area_coords)
+        return ctx.broadcaster.publish(annotated, flags), annotated
+    
+    def needs_inference(self, ctx, frame, area_coords) -> bool:
+        """
+        Decide si hay que ejecutar el modelo para esta cámara o reutilizar su última detección.
+        Para quien infiere en el acto: mueve ya la referencia del detector de cambios.
+        """
+        infer, signature = self.check_motion(ctx, frame, area_coords)
+        if infer and signature is not None:
+            ctx.motion_gate.accept(signature)
+        return infer
+    
+    def check_motion(self, ctx, frame, area_coords) -> Tuple[bool, Optional[np.ndarray]]:
+        """
+        Como needs_inference() pero sin mover la referencia: (inferir, firma del frame). La
+        firma se pasa a motion_gate.accept() cuando el resultado de la inferencia existe.
+        """
+        if ctx.motion_gate is None:
+            return True, None
+        changed, signature = ctx.motion_gate.check(frame, area_coords)
+        return changed or ctx.last_result is None, signature
+    
+    def process_detections(self, ctx, results, area_coords, captured=None, publish=None):
+        """
+        Post-procesa el resultado de una cámara: flags, conteo (por id de track o por flanco),
+        un pulso al PLC por pizza contada, frame anotado para los clientes y estado compartido.
+        Si la cámara está grabando, encola el frame capturado con sus flags y el pulso emitido.
+        `publish(ctx, results, detections, area_coords, flags)` sustituye a la anotación en
+        línea (el pipeline la difiere a su etapa de codificación).
+        """
+        # Analizar detecciones
+        detections = self.get_detection_flags(results, area_coords)
+        
+        # Conteo: cada track una sola vez (con blister en cuanto se ve, sin blister tras
+        # COUNT_EXIT_SECONDS sin verse) o, sin motor de tracks, en el flanco de subida de los flags
+        if ctx.track_counter is not None:
+            counted = ctx.track_counter.update(results[0].boxes, area_coords,
+                                               captured.timestamp if captured is not None else None)
+            for item in counted:
+                ctx.count(con_blister=item.result == EVENT_CON_BLISTER)
+        else:
+            edge = ctx.update_edges(detections['pizza'], detections['blister'])
+            counted = [CountEvent(edge, None, detections['conf_pizza'], detections['conf_blister'])] if edge else []
+        
+        # Pulso al PLC por cada pizza contada
+        for item in counted:
+            if item.result == EVENT_SIN_BLISTER and _opcua_client:
+                # Caso: pizza sin blister - punto rojo
+                logger.info(f"¡PIZZA NUEVA! [{ctx.id}] (track {item.track_id}) Generando pulso para pizza sin blister")
+                _opcua_client.generate_pulse(ctx.node_sin_blister, "pizza sin blister")
+            elif item.result == EVENT_CON_BLISTER and _opcua_client:
+                # Caso: pizza con blister - punto verde
+                logger.info(f"¡PIZZA NUEVA! [{ctx.id}] (track {item.track_id}) Generando pulso para pizza con blister")
+                _opcua_client.generate_pulse(ctx.node_con_blister, "pizza con blister")
+            
+            # Cada pizza contada queda en el registro persistente (los contadores se pueden reiniciar)
+            if _event_log is not None:
+                _event_log.append(ctx.id, item.result, item.conf_pizza, item.conf_blister, track_id=item.track_id,
+                                  timestamp=captured.timestamp if captured is not None else None)
+        events = [item.result for item in counted]
+        event = events[0] if events else None
+        
+        recorder = ctx.recorder
+        if recorder is not None and captured is not None:
+            recorder.record(captured, detections, events)
+        
+        opcua_connected = opcua_is_connected()
+        # Anotar solo si hay clientes viendo el stream. La codificación JPEG la hace
+        # el primer cliente de cada tier y se comparte con el resto (ver TierEncoder)
+        if ctx.broadcaster.subscriber_count() > 0:
+            # Los flags viajan con el frame para la cabecera del stream WebSocket
+            (publish or self.publish_annotated)(ctx, results, detections, area_coords,
+                                                frame_flags(detections, event, opcua_connected))
+        
+        # Publicar el estado del frame con un único cambio de referencia (lectores sin lock)
+        counters = ctx.counters()
+        ctx.snapshot = DetectionSnapshot.from_frame(
+            detections, counters, opcua_connected,
+            seq=captured.seq if captured is not None else 0,
+            timestamp=captured.timestamp if captured is not None else None)
+        logger.debug(f"Actualizando estado [{ctx.id}] con: pizza={detections['pizza']}, blister={detections['blister']}, " +
+                     f"contadores=[{counters['counter_sin_blister']}/{counters['counter_con_blister']}/{counters['counter_total']}], " +
+                     f"porcentajes=[{counters['porcentaje_sin_blister']:.1f}/{counters['porcentaje_con_blister']:.1f}]")
+        return detections
+    
+    # El resto de métodos se mantienen igual
+    def initialize_model(self) -> Optional['YOLO']:
+        """
+        Devuelve el modelo YOLO compartido del proceso, en el backend elegido por
+        app.model_backends (el más rápido de los disponibles, exportado y cacheado).
+        El registro lo carga y calienta una sola vez; las siguientes llamadas solo obtienen la referencia.
+        """
+        return load_model(self.config)
     
-    def draw_green_box(self, frame) -> Tuple[int, int, int, int]:
+    def get_area_coords(self, frame) -> Tuple[int, int, int, int]:
+        """
+        Devuelve las coordenadas del área de inspección en el centro del frame: (x1, y1, x2, y2)
+        """
+        return inspection_area(frame.shape)
+    
+    def run_inference(self, model, frames, areas):
+        """
+        Ejecuta YOLO sobre un lote de frames (uno por cámara) en una sola llamada y devuelve
+        un resultado por frame (ver app.roi.predict_frames, también usado por el proceso de
+        inferencia). El tracking se aplica después, por cámara (ver app.tracking).
         """
-        Dibuja un recuadro verde en el centro del frame.
+        return predict_frames(model, frames, areas, self.config)
+    
+    def draw_green_box(self, frame, area_coords=None) -> Tuple[int, int, int, int]:
+        """
+        Dibuja un recuadro verde en el área de inspección (por defecto, en el centro del frame).
         Devuelve las coordenadas del área: (x1, y1, x2, y2)
         """
-        h, w = frame.shape[:2]
-        x1, y1 = w // 2 - 260, h // 2 - 165
-        x2, y2 = w // 2 + 160, h // 2 + 165
+        x1, y1, x2, y2 = area_coords or self.get_area_coords(frame)
         cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
         return x1, y1, x2, y2
     
+    def annotate_frame(self, results, detections, area_coords=None):
+        """
+        Genera el frame anotado para los clientes: cajas de YOLO, área de inspección
+        y punto de estado (rojo: pizza sin blister, verde: pizza con blister).
+        """
+        annotated = results[0].plot()
+        self.draw_green_box(annotated, area_coords)
+        if detections['pizza'] and not detections['blister']:
+            self.draw_dot(annotated, self.config['RED_DOT_POSITION'], 
+                         self.config['RED_DOT_RADIUS'], self.config['RED_DOT_COLOR'])
+        elif detections['pizza'] and detections['blister']:
+            self.draw_dot(annotated, self.config['GREEN_DOT_POSITION'], 
+                         self.config['GREEN_DOT_RADIUS'], self.config['GREEN_DOT_COLOR'])
+        return annotated
+    
     def draw_dot(self, frame, position: Tuple[int, int], radius: int, color: Tuple[int, int, int]):
         """Dibuja un punto de color en la posición especificada."""
         cv2.circle(frame, position, radius, color, -1)
@@ -536,153 +821,344 @@ class VideoCamera:
     
     def get_detection_flags(self, results, area_coords, shared_state=None) -> Dict[str, bool]:
         """
-        Recorre las detecciones y establece flags si se encuentra 'pizza' y/o 'blister'
-        dentro del área definida.
+        Establece flags si se encuentra 'pizza' y/o 'blister' dentro del área definida,
+        con la mejor confianza de cada clase. Todas las cajas se procesan de una vez
+        con NumPy (ver app.postprocess); lo usan tanto el thread de fondo como get_frame.
         """
-        flags = {'pizza': False, 'blister': False, 'conf_pizza': 0.0, 'conf_blister': 0.0}
-        boxes = results[0].boxes
-
-        for box in boxes:
-            cls = int(box.cls[0].item()) if box.cls is not None else -1
-            conf = float(box.conf[0].item()) if box.conf is not None else 0.0
-            conf_percent = round(conf * 100, 1)  # Convertir a porcentaje con 1 decimal
-            coords = box.xyxy[0].cpu().numpy()
-            
-            if self.is_inside_area(coords, area_coords):
-                if cls == self.config['PIZZA_CLASS_ID']:
-                    flags['pizza'] = True
-                    flags['conf_pizza'] = conf_percent
-                elif cls == self.config['BLISTER_CLASS_ID']:
-                    flags['blister'] = True
-                    flags['conf_blister'] = conf_percent
+        summary = summarize_detections(results[0].boxes, area_coords,
+                                       self.config['PIZZA_CLASS_ID'], self.config['BLISTER_CLASS_ID'])
+        flags = summary.as_dict()
         
         # Actualizar el estado compartido si se proporcionó
         if shared_state:
             # Agregar estado del PLC
-            opcua_connected = _opcua_client and _opcua_client.connected if _opcua_client else False
             shared_state.last_detection = {
                 "pizza": flags['pizza'],
                 "blister": flags['blister'],
                 "conf_pizza": flags['conf_pizza'],
                 "conf_blister": flags['conf_blister'],
-                "opcua_connected": opcua_connected,
+                "opcua_connected": opcua_is_connected(),
                 "timestamp": datetime.datetime.now().isoformat()
             }
         
         return flags
     
-    def get_frame(self, detection_enabled: bool, shared_state=None):
+    def get_frame(self, detection_enabled: bool, shared_state=None, tier: Optional[StreamTier] = None):
         """
         Devuelve el último frame procesado por el thread de fondo
         o procesa uno nuevo si la detección de fondo no está activa
         """
         self.shared_state = shared_state  # Guardar referencia al estado compartido
-        
-        global _latest_frame
-        global _latest_frame_lock
+        tier = tier or default_stream_tier(self.config)
         
         if detection_enabled and _background_detection_active:
             # Usar el frame ya procesado por el thread de fondo
-            with _latest_frame_lock:
-                if _latest_frame is not None:
-                    return _latest_frame
+            seq, latest_frame = self.camera.broadcaster.latest()
+            if latest_frame is not None:
+                return self.camera.tier_encoder.encode(seq, latest_frame, tier)
         
         # Si no hay detección en segundo plano o está deshabilitada,
-        # capturar y procesar frame normalmente
-        with self.frame_lock:
-            ret, frame = self.cap.read()
+        # tomar el siguiente frame del hilo de captura y procesarlo normalmente
+        captured = self.grabber.wait_for_frame(self.last_seq) if self.grabber else None
         
-        if not ret:
+        if captured is None:
             blank_image = np.zeros((480, 640, 3), np.uint8)
-            _, jpeg = cv2.imencode('.jpg', blank_image)
-            return jpeg.tobytes()
+            return encode_frame(blank_image, tier)
+        
+        self.last_seq = captured.seq
+        frame = captured.frame
         
         if not detection_enabled or not self.model:
-            _, jpeg = cv2.imencode('.jpg', frame)
-            return jpeg.tobytes()
+            return encode_frame(frame, tier)
         
-        # Procesar frame con detección
-        results = self.model.track(frame, conf=self.config['CONF_THRESHOLD'])
-        annotated = results[0].plot()
-        area_coords = self.draw_green_box(annotated)
+        # Procesar frame con detección (el modelo es compartido con el thread de fondo)
+        area_coords = self.camera.area_coords(frame.shape)
+        with inference_lock(self.model):
+            results = self.run_inference(self.model, [frame], [area_coords])
         detections = self.get_detection_flags(results, area_coords, shared_state)
+        annotated = self.annotate_frame(results, detections, area_coords)
         
-        if detections['pizza'] and not detections['blister']:
-            self.draw_dot(annotated, self.config['RED_DOT_POSITION'], 
-                         self.config['RED_DOT_RADIUS'], self.config['RED_DOT_COLOR'])
-        elif detections['pizza'] and detections['blister']:
-            self.draw_dot(annotated, self.config['GREEN_DOT_POSITION'], 
-                         self.config['GREEN_DOT_RADIUS'], self.config['GREEN_DOT_COLOR'])
-        
-        _, jpeg = cv2.imencode('.jpg', annotated)
-        return jpeg.tobytes()
+        return encode_frame(annotated, tier)
 
-def generate_frames(config, shared_state):
+    def snapshot(self, tier: Optional[StreamTier] = None) -> Optional[bytes]:
+        """
+        JPEG del último frame disponible sin esperar ni inferir: el anotado si la detección
+        de fondo está activa, si no el último capturado. None si aún no hay ninguno.
+        """
+        tier = tier or default_stream_tier(self.config)
+        seq, latest_frame = self.camera.broadcaster.latest()
+        if _background_detection_active and latest_frame is not None:
+            return self.camera.tier_encoder.encode(seq, latest_frame, tier)
+        captured = self.grabber.latest() if self.grabber else None
+        return encode_frame(captured.frame, tier) if captured is not None else None
+
+def default_stream_tier(config) -> StreamTier:
+    """Tier usado cuando el cliente no pide una calidad concreta"""
+    return StreamTier(config.get('STREAM_WIDTH', 0), config.get('STREAM_JPEG_QUALITY', 95),
+                      config.get('STREAM_MAX_FPS', 0))
+
+def generate_frames(config, shared_state, tier: Optional[StreamTier] = None, camera_id=None,
+                    guard: Optional[SendGuard] = None):
     """
-    Genera frames para streaming, compatible con múltiples clientes.
+    Genera frames para streaming de una cámara (la primera si no se indica),
+    compatible con múltiples clientes.
     Cada cliente recibe su propia transmisión, pero comparten la misma cámara física.
+    Con la detección de fondo activa, el cliente se suscribe al broadcaster y
+    solo envía un frame cuando existe uno nuevo, codificado según su tier
+    (resolución, calidad JPEG y FPS máximos).
+    Con `guard`, los frames se saltan mientras el cliente supera su presupuesto de bytes
+    y el stream termina si el cliente es expulsado por lento.
     """
     client_id = threading.get_ident()  # Identificador único para este cliente
-    logger.info(f"Nuevo cliente conectado (ID: {client_id}), detection_enabled={shared_state.detection_enabled}")
+    tier = tier or default_stream_tier(config)
+    logger.info(f"Nuevo cliente conectado (ID: {client_id}), detection_enabled={shared_state.detection_enabled}, "
+                f"tier={tier}")
     
-    camera = VideoCamera(config)
+    camera = VideoCamera(config, camera_id)
+    broadcaster = camera.camera.broadcaster
+    tier_encoder = camera.camera.tier_encoder
+    subscription = None
+    min_interval = 1.0 / tier.max_fps if tier.max_fps else 0.0
+    last_sent = 0.0
+    writing_since = None  # Inicio de la escritura en curso (el servidor la hace tras el yield)
+    tier_encoder.acquire(tier)
     
     try:
         while True:
-            frame = camera.get_frame(shared_state.detection_enabled, shared_state)
+            # Respetar los FPS máximos del tier: los frames intermedios se saltan
+            if min_interval:
+                wait = last_sent + min_interval - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            
+            if shared_state.detection_enabled and _background_detection_active:
+                # Suscribirse solo mientras se consumen frames del thread de fondo:
+                # el número de suscriptores decide si se anota y codifica
+                if subscription is None:
+                    subscription = broadcaster.subscribe(f"mjpeg-{camera.camera.id}-{client_id}")
+                annotated = subscription.next_frame(timeout=1.0)
+                if annotated is None:
+                    if broadcaster.closed:
+                        break
+                    # Sin frame nuevo todavía: volver a comprobar el estado de la detección
+                    continue
+                if guard is not None and not guard.can_send():
+                    # Cliente por encima de su presupuesto de bytes: este frame no se le
+                    # envía, y tampoco se codifica
+                    subscription.skip()
+                    if guard.evicted:
+                        break
+                    continue
+                frame = tier_encoder.encode(subscription.last_seq, annotated, tier)
+            else:
+                if subscription is not None:
+                    subscription.close()
+                    subscription = None
+                # get_frame() lee la cámara y marca el ritmo del bucle: se comprueba el presupuesto después
+                frame = camera.get_frame(shared_state.detection_enabled, shared_state, tier)
+                if frame is not None and guard is not None and not guard.can_send():
+                    if guard.evicted:
+                        break
+                    continue
             if frame is None:
                 break
+            last_sent = writing_since = time.monotonic()
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
+            if guard is not None:
+                guard.sent(writing_since)
+            writing_since = None
+            if subscription is not None:
+                subscription.record_sent(len(frame))
+            if guard is not None and guard.evicted:
+                break
     except Exception as e:
         logger.error(f"Error en stream del cliente {client_id}: {e}")
     finally:
+        # Si el servidor corta la conexión durante una escritura (plazo agotado), contarla
+        if guard is not None and writing_since is not None:
+            guard.sent(writing_since)
+        if subscription is not None:
+            subscription.close()
+        tier_encoder.release(tier)
         logger.info(f"Cliente desconectado (ID: {client_id})")
 
+def opcua_is_connected() -> bool:
+    """Estado de la conexión OPC-UA compartida"""
+    return bool(_opcua_client and _opcua_client.connected)
+
+def opcua_stats() -> Dict:
+    """Conexión OPC-UA y cola de pulsos al PLC: profundidad, descartes y latencia detección→escritura"""
+    if not _opcua_client:
+        return {"link": {"connected": False}, "pulses": {}}
+    return {"link": _opcua_client.link_stats(), "pulses": _opcua_client.pulse_stats()}
+
+def metrics_samples():
+    """Gauges y contadores para /metrics, leídos del estado actual solo cuando se consultan"""
+    contexts = list(_camera_manager.contexts.values()) if _camera_manager else []
+    yield ('yolo_stream_clients', 'gauge', 'Clientes de streaming conectados por cámara',
+           [({"camera": ctx.id}, ctx.broadcaster.subscriber_count()) for ctx in contexts])
+    yield ('yolo_frames_captured_total', 'counter', 'Frames leídos del dispositivo por cámara',
+           [({"camera": ctx.id}, ctx.grabber.frames_captured) for ctx in contexts])
+    pizzas = []
+    for ctx in contexts:
+        counters = ctx.counters()
+        pizzas.append(({"camera": ctx.id, "result": EVENT_SIN_BLISTER}, counters['counter_sin_blister']))
+        pizzas.append(({"camera": ctx.id, "result": EVENT_CON_BLISTER}, counters['counter_con_blister']))
+    yield ('yolo_pizzas_total', 'counter', 'Pizzas contadas por cámara y resultado', pizzas)
+    yield ('yolo_motion_skipped_frames_total', 'counter', 'Frames sin inferencia por el detector de cambios',
+           [({"camera": ctx.id}, ctx.motion_gate.skipped) for ctx in contexts if ctx.motion_gate])
+
+    if _scheduler is not None:
+        yield ('yolo_detection_fps', 'gauge', 'Lotes que completan la inferencia por segundo en la ventana reciente',
+               [({}, round(detection_fps(), 2))])
+        yield ('yolo_deadline_misses_total', 'counter', 'Ciclos de detección que no cumplieron su plazo',
+               [({}, _scheduler.deadline_misses)])
+    if _pipeline is not None:
+        stages = _pipeline.stats()['stages']
+        yield ('yolo_pipeline_stage_utilization', 'gauge', 'Fracción del tiempo ocupada de cada etapa del pipeline',
+               [({"stage": name}, stage['utilization']) for name, stage in stages.items()])
+        yield ('yolo_pipeline_queue_depth', 'gauge', 'Lotes esperando en la cola de entrada de cada etapa',
+               [({"stage": name}, stage['queue_depth']) for name, stage in stages.items() if 'queue_depth' in stage])
+        yield ('yolo_pipeline_dropped_total', 'counter', 'Lotes descartados por cola llena a la entrada de cada etapa',
+               [({"stage": name}, stage['queue_dropped']) for name, stage in stages.items() if 'queue_dropped' in stage])
+
+    stats = opcua_stats()
+    yield ('yolo_opcua_connected', 'gauge', 'Conexión OPC-UA con el PLC (1 = conectada)',
+           [({}, int(stats['link'].get('connected', False)))])
+    if stats['pulses']:
+        yield ('yolo_opcua_pulse_queue_depth', 'gauge', 'Pulsos pendientes de escribir en el PLC',
+               [({}, stats['pulses']['queue_depth'])])
+        yield ('yolo_opcua_pulses_dropped_total', 'counter', 'Pulsos descartados por cola llena',
+               [({}, stats['pulses']['pulses_dropped'])])
+        yield ('yolo_opcua_write_failures_total', 'counter', 'Lotes de escritura OPC-UA fallidos',
+               [({}, stats['pulses']['writes_failed'])])
+    if 'disconnects' in stats['link']:
+        yield ('yolo_opcua_disconnects_total', 'counter', 'Caídas de la conexión OPC-UA detectadas',
+               [({}, stats['link']['disconnects'])])
+
+def get_scheduler() -> Optional[FrameScheduler]:
+    """Planificador del loop de detección (None hasta que arranca el thread de fondo)"""
+    return _scheduler
+
+def detection_fps() -> float:
+    """Lotes por segundo que salen de la etapa de inferencia (sin los descartados antes de inferir)"""
+    return _detection_rate.rate()
+
+def get_event_log() -> Optional[EventLog]:
+    return _event_log
+
+def inference_in_worker(config) -> bool:
+    """True si la etapa de inferencia se ejecuta en el proceso de inferencia (PIPELINE_PLACEMENT)"""
+    return (config.get('PIPELINE_PLACEMENT') or {}).get('inference', 'thread') == 'process'
+
+def load_model(config) -> Optional['YOLO']:
+    """Elige el backend, carga el modelo y lo calienta con una inferencia de prueba (una vez por proceso)"""
+    try:
+        path = select_model(config)
+        if path is None:
+            return None
+        STARTUP.mark('model_selected')
+        model = get_model(path, imgsz=config.get('MODEL_IMGSZ', 640))
+    except Exception as e:
+        logger.error(f"Error al cargar el modelo: {e}")
+        return None
+    if model is not None:
+        STARTUP.mark('model_ready')
+    return model
+
+def warm_up_model(config):
+    """
+    Carga y calienta el modelo al arrancar, en paralelo con la apertura de las cámaras y la
+    conexión al PLC, para que el primer frame no espere a la carga. Con la inferencia en
+    otro proceso no hace nada: ese proceso se calienta al arrancar.
+    """
+    if not inference_in_worker(config):
+        load_model(config)
+
+def get_inference_worker() -> Optional[InferenceWorker]:
+    """Proceso de inferencia (None si la inferencia es un hilo de este proceso o aún no arrancó)"""
+    return _inference_worker
+
+def get_pipeline() -> Optional[Pipeline]:
+    """Etapas del loop de detección (None hasta que arranca el thread de fondo)"""
+    return _pipeline
+
+def start_inference_worker(config, cameras: int) -> Optional[InferenceWorker]:
+    """
+    Arranca el proceso de inferencia. None si no arranca. La elección del backend (y su
+    micro-benchmark) se hace dentro de ese proceso: este no importa torch ni carga modelos.
+    """
+    worker = InferenceWorker(None, config, cameras=cameras,
+                             max_frame_bytes=config.get('INFERENCE_WORKER_MAX_FRAME_BYTES', 1920 * 1080 * 3),
+                             request_timeout=config.get('INFERENCE_WORKER_TIMEOUT', 5.0))
+    if not worker.start():
+        worker.close()
+        return None
+    # /api/models y la fase 'model_selected' del arranque reflejan la elección del proceso
+    adopt_selection(worker.selection)
+    STARTUP.mark('model_selected')
+    return worker
+
+def get_camera_manager() -> Optional[CameraManager]:
+    """Gestor de cámaras del proceso (None hasta que se crea la primera VideoCamera)"""
+    return _camera_manager
+
 # Función para limpiar recursos al finalizar
 def cleanup():
     """Limpia recursos globales al finalizar la aplicación"""
-    global _camera_instance
+    global _camera_manager
     global _opcua_client
     global _opcua_should_reconnect
-    global _thread_pool
+    global _background_detection_active
     
     logger.info("Limpiando recursos antes de finalizar...")
     
-    # Detener thread de reconexión
+    # Detener thread de reconexión y de detección
     _opcua_should_reconnect = False
+    _background_detection_active = False
     
-    # Apagar el pool de hilos
-    try:
-        _thread_pool.shutdown(wait=False)
-    except:
-        pass
-    
-    # Desconectar OPC-UA
+    # Desconectar OPC-UA tras escribir los flancos pendientes (ningún nodo queda a True)
     if _opcua_client:
         try:
+            if _opcua_client.pulse_scheduler:
+                _opcua_client.pulse_scheduler.stop()
             _opcua_client.disconnect()
         except:
             pass
     
-    # Liberar cámara
-    if _camera_instance:
+    # Liberar a los clientes de streaming en espera, detener la captura y liberar las cámaras
+    if _camera_manager:
         try:
-            _camera_instance.release()
+            _camera_manager.stop()
+        except:
+            pass
+    
+    # Detener las etapas del pipeline antes que el proceso de inferencia que usa una de ellas
+    if _pipeline:
+        try:
+            _pipeline.stop()
+        except:
+            pass
+    
+    # Detener el proceso de inferencia y liberar la memoria compartida
+    if _inference_worker:
+        try:
+            _inference_worker.close()
+        except:
+            pass
+    
+    # Escribir los eventos de producción pendientes
+    if _event_log:
+        try:
+            _event_log.close()
         except:
             pass
 
 def reset_counters():
-    """Reinicia los contadores de detección"""
-    global _counter_pizza_sin_blister
-    global _counter_pizza_con_blister
-    global _counter_total
-    global _counters_lock
-    
-    with _counters_lock:
-        _counter_pizza_sin_blister = 0
-        _counter_pizza_con_blister = 0
-        _counter_total = 0
+    """Reinicia los contadores de detección de todas las cámaras"""
+    if _camera_manager:
+        _camera_manager.reset_counters()
     
     logger.info("Contadores de detección reiniciados")
-    return True
\ No newline at end of file
+    return True
@@ -0,0 +1,279 @@
+import datetime
+import logging
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.capture import FrameGrabber, CapturedFrame
+from app.broadcaster import FrameBroadcaster
+from app.stream_tiers import TierEncoder
+from app.roi import inspection_area
+from app.motion import MotionGate
+from app.recording import FrameRecorder
+from app.detection_snapshot import DetectionSnapshot, EMPTY_SNAPSHOT
+from app.counting import create_track_counter
+
+# Eventos de flanco de subida: una pizza nueva en el área de inspección
+EVENT_SIN_BLISTER = 'sin_blister'
+EVENT_CON_BLISTER = 'con_blister'
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+
+class CameraContext:
+    """
+    Estado de una cámara/línea: su captura, el broadcaster y la caché de codificación
+    para sus clientes, el área de inspección, los nodos OPC-UA y los contadores.
+    """
+    def __init__(self, cam_id: str, source, roi: Optional[Tuple[int, int, int, int]] = None,
+                 node_sin_blister: Optional[str] = None, node_con_blister: Optional[str] = None):
+        self.id = str(cam_id)
+        self.source = source
+        self.roi = tuple(roi) if roi else None  # None = recuadro centrado por defecto
+        self.node_sin_blister = node_sin_blister
+        self.node_con_blister = node_con_blister
+        self.grabber = FrameGrabber(source)
+        self.broadcaster = FrameBroadcaster()
+        self.tier_encoder = TierEncoder()
+        self.tracker = None  # Tracker propio de la cámara (lo crea el loop de detección)
+        self.motion_gate = None  # Detector de cambios opcional delante de la inferencia
+        self.track_counter = None  # Conteo por id de track (None = por flancos de los flags)
+        self.last_result = None  # Último resultado inferido, reutilizado si el área no cambia
+        self.recorder = None  # Grabación de frames y detecciones (None = sin grabar)
+        self.opened = False
+        self.last_seq = 0  # Último frame de captura entregado a la inferencia
+
+        # Estado para detectar flancos de subida
+        self.previous_red = False
+        self.previous_green = False
+
+        # Contadores para estadísticas de detección
+        self.counters_lock = threading.Lock()
+        self.counter_sin_blister = 0
+        self.counter_con_blister = 0
+        self.counter_total = 0
+
+        # Último estado de detección: lo sustituye entero el hilo de detección en cada frame
+        self.snapshot: DetectionSnapshot = EMPTY_SNAPSHOT
+
+    @property
+    def last_detection(self) -> Dict:
+        """Último estado de detección como diccionario (compartido, no modificar)"""
+        return self.snapshot.as_dict()
+
+    def area_coords(self, frame_shape) -> Tuple[int, int, int, int]:
+        """Área de inspección de esta cámara: la configurada o el recuadro centrado por defecto"""
+        return self.roi or inspection_area(frame_shape)
+
+    def start(self, on_frame=None) -> bool:
+        self.grabber.on_frame = on_frame
+        self.opened = self.grabber.start()
+        return self.opened
+
+    def stop(self):
+        self.broadcaster.close()
+        self.grabber.stop()
+        self.stop_recording()
+
+    def start_recording(self, config, session: str):
+        """Empieza a grabar esta cámara en RECORDING_DIR/<sesión>_cam<id>"""
+        if self.recorder is not None:
+            return
+        directory = Path(config.get('RECORDING_DIR', 'recordings')) / f"{session}_cam{self.id}"
+        self.recorder = FrameRecorder(directory,
+                                      encoding=config.get('RECORDING_ENCODING', 'jpeg'),
+                                      jpeg_quality=config.get('RECORDING_JPEG_QUALITY', 90),
+                                      queue_size=config.get('RECORDING_QUEUE_SIZE', 64),
+                                      max_bytes=int(config.get('RECORDING_MAX_MB', 2048)) * 1024 * 1024,
+                                      camera_id=self.id)
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def update_edges(self, pizza: bool, blister: bool) -> Optional[str]:
+        """
+        Detección de flancos de subida sobre los flags del frame. Devuelve EVENT_SIN_BLISTER
+        o EVENT_CON_BLISTER (y lo cuenta) cuando aparece una pizza, o None.
+        """
+        event = None
+        if pizza and not blister:
+            # Caso: pizza sin blister - de False a True
+            if not self.previous_red:
+                event = EVENT_SIN_BLISTER
+            self.previous_red = True
+            self.previous_green = False
+        elif pizza and blister:
+            # Caso: pizza con blister - de False a True
+            if not self.previous_green:
+                event = EVENT_CON_BLISTER
+            self.previous_red = False
+            self.previous_green = True
+        else:
+            # No hay detecciones relevantes
+            self.previous_red = False
+            self.previous_green = False
+
+        if event is not None:
+            self.count(con_blister=event == EVENT_CON_BLISTER)
+        return event
+
+    def count(self, con_blister: bool):
+        """Suma una pizza a los contadores de la cámara"""
+        with self.counters_lock:
+            if con_blister:
+                self.counter_con_blister += 1
+            else:
+                self.counter_sin_blister += 1
+            self.counter_total += 1
+
+    def reset_counters(self):
+        with self.counters_lock:
+            self.counter_sin_blister = 0
+            self.counter_con_blister = 0
+            self.counter_total = 0
+        # Publicar ya los contadores a cero, sin esperar al siguiente frame
+        self.snapshot = self.snapshot.with_counters(self.counters())
+
+    def counters(self) -> Dict:
+        """Contadores y porcentajes con una vista consistente"""
+        with self.counters_lock:
+            sin_blister, con_blister, total = self.counter_sin_blister, self.counter_con_blister, self.counter_total
+        divisor = total if total > 0 else 1  # Evitar división por cero
+        return {
+            "counter_sin_blister": sin_blister,
+            "counter_con_blister": con_blister,
+            "counter_total": total,
+            "porcentaje_sin_blister": (sin_blister / divisor) * 100,
+            "porcentaje_con_blister": (con_blister / divisor) * 100,
+        }
+
+
+def camera_configs(config) -> List[Dict]:
+    """
+    Lista de cámaras configuradas. Sin CAMERAS se usa una sola cámara con
+    VIDEO_SOURCE y los nodos OPC-UA generales (configuración anterior).
+    """
+    cameras = config.get('CAMERAS')
+    if cameras:
+        return cameras
+    return [{
+        "id": "0",
+        "source": config['VIDEO_SOURCE'],
+        "opcua_node_sin_blister": config.get('OPCUA_NODE_SIN_BLISTER', 'ns=4;i=3'),
+        "opcua_node_con_blister": config.get('OPCUA_NODE_CON_BLISTER', 'ns=4;i=4'),
+    }]
+
+
+def create_motion_gate(config) -> Optional[MotionGate]:
+    """Detector de cambios según la configuración (None si MOTION_GATING está desactivado)"""
+    if not config.get('MOTION_GATING', False):
+        return None
+    return MotionGate(threshold=config.get('MOTION_THRESHOLD', 0.01),
+                      pixel_delta=config.get('MOTION_PIXEL_DELTA', 20),
+                      scale=config.get('MOTION_SCALE', 0.25),
+                      max_skip=config.get('MOTION_MAX_SKIP', 50))
+
+
+class CameraManager:
+    """
+    Gestiona todas las cámaras del proceso y entrega al loop de detección, en cada
+    ciclo, el frame más reciente de cada cámara que tenga uno nuevo para inferir en lote.
+    """
+    def __init__(self, config):
+        self.contexts: "OrderedDict[str, CameraContext]" = OrderedDict()
+        self._frame_cond = threading.Condition()
+        for index, cam in enumerate(camera_configs(config)):
+            ctx = CameraContext(
+                cam.get('id', str(index)),
+                cam['source'],
+                roi=cam.get('roi'),
+                node_sin_blister=cam.get('opcua_node_sin_blister', config.get('OPCUA_NODE_SIN_BLISTER')),
+                node_con_blister=cam.get('opcua_node_con_blister', config.get('OPCUA_NODE_CON_BLISTER')),
+            )
+            ctx.motion_gate = create_motion_gate(config)
+            ctx.track_counter = create_track_counter(config)
+            if ctx.id in self.contexts:
+                raise ValueError(f"Identificador de cámara duplicado: {ctx.id}")
+            self.contexts[ctx.id] = ctx
+
+    def _notify_frame(self):
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    def start(self) -> bool:
+        """Abre todas las cámaras. Devuelve True si al menos una se abrió."""
+        for ctx in self.contexts.values():
+            logger.info(f"Inicializando cámara {ctx.id} (fuente {ctx.source})")
+            if not ctx.start(on_frame=self._notify_frame):
+                logger.error(f"Error abriendo la cámara {ctx.id}")
+        return any(ctx.opened for ctx in self.contexts.values())
+
+    def stop(self):
+        for ctx in self.contexts.values():
+            ctx.stop()
+        self._notify_frame()
+
+    @property
+    def default(self) -> CameraContext:
+        return next(iter(self.contexts.values()))
+
+    def get(self, cam_id=None) -> Optional[CameraContext]:
+        """Devuelve la cámara pedida, o la primera si no se indica ninguna"""
+        if cam_id is None:
+            return self.default
+        return self.contexts.get(str(cam_id))
+
+    def node_ids(self) -> List[str]:
+        """Todos los nodos OPC-UA usados por las cámaras, sin repetir"""
+        ids = []
+        for ctx in self.contexts.values():
+            for node_id in (ctx.node_sin_blister, ctx.node_con_blister):
+                if node_id and node_id not in ids:
+                    ids.append(node_id)
+        return ids
+
+    def collect_frames(self, timeout: float = 1.0) -> List[Tuple[CameraContext, CapturedFrame]]:
+        """
+        Espera hasta que alguna cámara tenga un frame nuevo y devuelve el más reciente
+        de cada cámara que lo tenga. Lista vacía si se agota el tiempo.
+        """
+        deadline = time.monotonic() + timeout
+        with self._frame_cond:
+            while True:
+                batch = []
+                for ctx in self.contexts.values():
+                    captured = ctx.grabber.latest() if ctx.opened else None
+                    if captured is not None and captured.seq > ctx.last_seq:
+                        batch.append((ctx, captured))
+                if batch:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._frame_cond.wait(remaining)
+        for ctx, captured in batch:
+            ctx.last_seq = captured.seq
+        return batch
+
+    def reset_counters(self):
+        for ctx in self.contexts.values():
+            ctx.reset_counters()
+
+    def start_recording(self, config) -> str:
+        """Graba todas las cámaras en una misma sesión. Devuelve el nombre de la sesión."""
+        session = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        for ctx in self.contexts.values():
+            ctx.start_recording(config, session)
+        return session
+
+    def stop_recording(self):
+        for ctx in self.contexts.values():
+            ctx.stop_recording()
+
+    def recording_stats(self) -> Dict:
+        return {ctx.id: ctx.recorder.stats() for ctx in self.contexts.values() if ctx.recorder is not None}
@@ -0,0 +1,130 @@
+import cv2
+import os
+import logging
+import threading
+import time
+from collections import namedtuple
+from typing import Optional
+
+from app.metrics import STAGE_SECONDS
+from app.recording import ReplayCapture, is_recording
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Frame publicado por el hilo de captura: número de secuencia, instante de captura y la imagen
+CapturedFrame = namedtuple('CapturedFrame', ['seq', 'timestamp', 'frame'])
+
+_CAPTURE_SECONDS = STAGE_SECONDS.labels('capture')
+
+
+class FrameGrabber:
+    """
+    Hilo de captura dedicado que es el único propietario del dispositivo de vídeo.
+    Lee frames a la velocidad del sensor y publica solo el más reciente en una ranura
+    compartida, de modo que la inferencia y el streaming nunca procesan frames
+    acumulados en el buffer del driver ni acceden directamente al dispositivo.
+    """
+    def __init__(self, source, loop_files=True):
+        self.source = source
+        self.loop_files = loop_files
+        self.cap = None
+        self._cond = threading.Condition()
+        self._latest = None
+        self._seq = 0
+        self._running = False
+        self._thread = None
+        self._pace = 0.0  # Pausa entre lecturas para fuentes de fichero (0 = velocidad del sensor)
+        self.on_frame = None  # Callback opcional tras publicar cada frame
+        self.frames_captured = 0
+        self.read_failures = 0
+
+    @property
+    def is_file_source(self) -> bool:
+        return isinstance(self.source, str) and (os.path.isfile(self.source) or is_recording(self.source))
+
+    def start(self) -> bool:
+        """Abre el dispositivo y arranca el hilo de captura. Devuelve False si no se pudo abrir."""
+        # Un directorio de grabación (ver app.recording) se reproduce como una cámara más
+        self.cap = ReplayCapture(self.source) if is_recording(self.source) else cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            logger.error(f"Error abriendo la fuente de vídeo {self.source}")
+            return False
+
+        if self.is_file_source:
+            # Los ficheros se reproducen a su velocidad nominal para simular una cámara real
+            fps = self.cap.get(cv2.CAP_PROP_FPS) or 0
+            self._pace = 1.0 / fps if fps > 0 else 0.0
+        else:
+            # Mantener el buffer del driver al mínimo; no todos los backends lo soportan
+            try:
+                self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            except Exception:
+                pass
+
+        self._running = True
+        self._thread = threading.Thread(target=self._capture_loop, name="frame-grabber", daemon=True)
+        self._thread.start()
+        logger.info(f"Hilo de captura iniciado para la fuente {self.source}")
+        return True
+
+    def _capture_loop(self):
+        """Vacía el dispositivo continuamente y publica cada frame con su secuencia y timestamp"""
+        while self._running:
+            read_start = time.perf_counter()
+            ret, frame = self.cap.read()
+            if not ret:
+                if self.is_file_source and self.loop_files:
+                    # Fin del fichero: volver al principio
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                self.read_failures += 1
+                logger.error("Error al capturar frame en el hilo de captura")
+                time.sleep(0.5)
+                continue
+
+            _CAPTURE_SECONDS.observe(time.perf_counter() - read_start)
+            captured_at = time.time()
+            with self._cond:
+                self._seq += 1
+                self._latest = CapturedFrame(self._seq, captured_at, frame)
+                self._cond.notify_all()
+            self.frames_captured += 1
+            if self.on_frame is not None:
+                self.on_frame()
+
+            if self._pace:
+                time.sleep(self._pace)
+
+    def latest(self) -> Optional[CapturedFrame]:
+        """Devuelve el último frame publicado sin esperar (None si aún no hay ninguno)"""
+        return self._latest
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: float = 1.0) -> Optional[CapturedFrame]:
+        """
+        Espera hasta que exista un frame con secuencia mayor que `after_seq` y lo devuelve.
+        Devuelve None si se agota el tiempo de espera o el hilo se detiene.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._running and (self._latest is None or self._latest.seq <= after_seq):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._latest is None or self._latest.seq <= after_seq:
+                return None
+            return self._latest
+
+    def stop(self):
+        """Detiene el hilo de captura y libera el dispositivo"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self.cap is not None:
+            try:
+                self.cap.release()
+            except Exception:
+                pass
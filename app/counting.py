@@ -0,0 +1,165 @@
+import logging
+import time
+from collections import OrderedDict, namedtuple
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.postprocess import boxes_data, inside_area_mask
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Pizza contada por el motor de tracks: resultado (EVENT_* de app.camera_manager), id de track
+# y mejores confianzas (porcentaje) vistas durante todo el track
+CountEvent = namedtuple('CountEvent', ['result', 'track_id', 'conf_pizza', 'conf_blister'])
+
+
+class _Track:
+    __slots__ = ('first_seen', 'last_seen', 'hits', 'blister', 'conf_pizza', 'conf_blister', 'counted')
+
+    def __init__(self, now: float):
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 0
+        self.blister = False
+        self.conf_pizza = 0.0
+        self.conf_blister = 0.0
+        self.counted = False
+
+
+def blister_on_pizzas(pizza_xyxy: np.ndarray, blister_xyxy: np.ndarray, blister_conf: np.ndarray) -> np.ndarray:
+    """Mejor confianza de blister cuyo centro cae dentro de cada caja de pizza (0 = sin blister)"""
+    if len(pizza_xyxy) == 0 or len(blister_xyxy) == 0:
+        return np.zeros(len(pizza_xyxy), dtype=np.float32)
+    cx = (blister_xyxy[:, 0] + blister_xyxy[:, 2]) / 2
+    cy = (blister_xyxy[:, 1] + blister_xyxy[:, 3]) / 2
+    # Matriz pizzas x blisters: el centro del blister dentro de la pizza
+    on = ((cx[None, :] >= pizza_xyxy[:, 0:1]) & (cx[None, :] <= pizza_xyxy[:, 2:3]) &
+          (cy[None, :] >= pizza_xyxy[:, 1:2]) & (cy[None, :] <= pizza_xyxy[:, 3:4]))
+    return np.where(on, blister_conf[None, :], 0.0).max(axis=1)
+
+
+class TrackCounter:
+    """
+    Conteo por id de track en lugar de por flanco de los flags del frame: cada pizza que
+    entra en el área se cuenta una sola vez, aunque falte en algunos frames o salga y
+    vuelva a entrar, mientras su track siga en la tabla. La tabla está acotada
+    (`max_tracks`, se expulsa el menos reciente) y los tracks caducan tras `ttl` segundos
+    sin verse, de modo que el resultado no depende de la frecuencia de inferencia.
+    Una pizza se cuenta con blister si un blister tiene el centro dentro de su caja en
+    algún frame del track: en cuanto se ve el blister (con `min_hits` frames) se cuenta con
+    blister; si no, se cuenta sin blister cuando el track lleva `exit_after` segundos sin
+    verse en el área (por defecto `ttl`, al caducar) o se expulsa, con la mejor confianza
+    de todo el track. Un frame perdido o una caja que roza el borde del área no bastan
+    para decidirlo.
+    Las cajas sin id (el tracker aún no confirmó el track) no se cuentan: se cuentan en
+    cuanto el tracker les da id, y esos frames quedan en `untracked_frames`.
+    """
+    def __init__(self, pizza_class_id: int, blister_class_id: int, ttl: float = 2.0,
+                 max_tracks: int = 256, min_hits: int = 1, exit_after: Optional[float] = None):
+        self.pizza_class_id = pizza_class_id
+        self.blister_class_id = blister_class_id
+        self.ttl = ttl
+        # Segundos sin ver un track en el área para contarlo sin blister (como mucho `ttl`)
+        self.exit_after = ttl if exit_after is None else min(exit_after, ttl)
+        self.max_tracks = max_tracks
+        self.min_hits = min_hits  # Frames dentro del área para que un track cuente (1 = uno basta)
+        self._tracks: "OrderedDict[int, _Track]" = OrderedDict()  # Del menos al más reciente
+
+        # Estadísticas
+        self.counted = 0
+        self.expired = 0
+        self.evicted = 0
+        self.untracked_frames = 0  # Frames con pizza en el área pero sin id de track
+
+    def update(self, boxes, area: Tuple[int, int, int, int], now: Optional[float] = None) -> List[CountEvent]:
+        """Actualiza la tabla con las cajas de un frame y devuelve las pizzas nuevas a contar"""
+        now = time.monotonic() if now is None else now
+        events = self._expire(now)
+        if boxes is None or len(boxes) == 0:
+            data = np.zeros((0, 7), dtype=np.float32)
+        else:
+            data = boxes_data(boxes)
+        cls, conf, xyxy = data[:, -1], data[:, -2], data[:, :4]
+        inside = inside_area_mask(xyxy, area)
+        pizzas = inside & (cls == self.pizza_class_id)
+        if data.shape[1] < 7:
+            # Sin ids no se sabe qué tracks siguen en el área: no se decide ninguna salida
+            if pizzas.any():
+                self.untracked_frames += 1
+            return events
+        blisters = inside & (cls == self.blister_class_id)
+        blister_conf = blister_on_pizzas(xyxy[pizzas], xyxy[blisters], conf[blisters])
+
+        for track_id, pizza_conf, on_blister in zip(data[pizzas, 4].astype(int).tolist(), conf[pizzas], blister_conf):
+            track = self._tracks.get(track_id)
+            if track is None:
+                track = self._tracks[track_id] = _Track(now)
+                if len(self._tracks) > self.max_tracks:
+                    evicted_id, evicted = self._tracks.popitem(last=False)
+                    self.evicted += 1
+                    self._decide(evicted_id, evicted, events)
+            else:
+                self._tracks.move_to_end(track_id)
+            track.last_seen = now
+            track.hits += 1
+            track.conf_pizza = max(track.conf_pizza, round(float(pizza_conf) * 100, 1))
+            if on_blister > 0:
+                track.blister = True
+                track.conf_blister = max(track.conf_blister, round(float(on_blister) * 100, 1))
+            # Con blister ya no puede cambiar: se cuenta sin esperar a que salga
+            if track.blister:
+                self._decide(track_id, track, events)
+
+        # Tracks que llevan `exit_after` segundos fuera del área: su resultado es el mejor
+        # visto mientras estuvieron (los que caducan se deciden en _expire)
+        if self.exit_after < self.ttl:
+            for track_id, track in self._tracks.items():
+                if not track.counted and now - track.last_seen > self.exit_after:
+                    self._decide(track_id, track, events)
+        return events
+
+    def _decide(self, track_id: int, track: _Track, events: List[CountEvent]):
+        """Cuenta el track (una sola vez) si estuvo al menos `min_hits` frames en el área"""
+        if track.counted or track.hits < self.min_hits:
+            return
+        track.counted = True
+        self.counted += 1
+        events.append(CountEvent('con_blister' if track.blister else 'sin_blister', track_id,
+                                 track.conf_pizza, track.conf_blister))
+
+    def _expire(self, now: float) -> List[CountEvent]:
+        """
+        Quita los tracks que llevan más de `ttl` segundos sin verse (los primeros de la tabla)
+        y devuelve los que caducan sin haberse contado todavía
+        """
+        events = []
+        while self._tracks:
+            track_id, track = next(iter(self._tracks.items()))
+            if now - track.last_seen <= self.ttl:
+                break
+            del self._tracks[track_id]
+            self.expired += 1
+            self._decide(track_id, track, events)
+        return events
+
+    def stats(self) -> Dict:
+        return {
+            "active_tracks": len(self._tracks),
+            "counted": self.counted,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "untracked_frames": self.untracked_frames,
+        }
+
+
+def create_track_counter(config) -> Optional[TrackCounter]:
+    """Motor de conteo por tracks según la configuración (None = conteo por flancos)"""
+    if config.get('COUNT_BY', 'track') != 'track':
+        return None
+    return TrackCounter(config['PIZZA_CLASS_ID'], config['BLISTER_CLASS_ID'],
+                        ttl=config.get('COUNT_TRACK_TTL', 2.0),
+                        max_tracks=config.get('COUNT_MAX_TRACKS', 256),
+                        min_hits=config.get('COUNT_MIN_HITS', 1),
+                        exit_after=config.get('COUNT_EXIT_SECONDS'))
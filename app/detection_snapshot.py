@@ -0,0 +1,95 @@
+import datetime
+import json
+import time
+from typing import Dict, Optional
+
+
+class DetectionSnapshot:
+    """
+    Estado de detección de una cámara en un frame: flags, confianzas, contadores, estado
+    OPC-UA, secuencia y hora. Es inmutable: el hilo de detección publica uno nuevo en cada
+    frame sustituyendo la referencia, y los lectores lo usan sin lock con una vista
+    consistente (los porcentajes salen de los mismos contadores). El diccionario y el JSON
+    se calculan una sola vez por snapshot.
+    """
+    __slots__ = ('pizza', 'blister', 'conf_pizza', 'conf_blister',
+                 'counter_sin_blister', 'counter_con_blister', 'counter_total',
+                 'opcua_connected', 'seq', 'timestamp', '_dict', '_json')
+
+    def __init__(self, pizza=False, blister=False, conf_pizza=0.0, conf_blister=0.0,
+                 counter_sin_blister=0, counter_con_blister=0, counter_total=0,
+                 opcua_connected=False, seq=0, timestamp: Optional[float] = None):
+        setattr_ = object.__setattr__
+        setattr_(self, 'pizza', pizza)
+        setattr_(self, 'blister', blister)
+        setattr_(self, 'conf_pizza', conf_pizza)
+        setattr_(self, 'conf_blister', conf_blister)
+        setattr_(self, 'counter_sin_blister', counter_sin_blister)
+        setattr_(self, 'counter_con_blister', counter_con_blister)
+        setattr_(self, 'counter_total', counter_total)
+        setattr_(self, 'opcua_connected', opcua_connected)
+        setattr_(self, 'seq', seq)  # Secuencia de captura del frame (0 = sin frame)
+        setattr_(self, 'timestamp', timestamp)  # Epoch en segundos (None = sin frame)
+        setattr_(self, '_dict', None)
+        setattr_(self, '_json', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DetectionSnapshot es inmutable")
+
+    @classmethod
+    def from_frame(cls, detections: Dict, counters: Dict, opcua_connected: bool,
+                   seq: int = 0, timestamp: Optional[float] = None) -> 'DetectionSnapshot':
+        return cls(detections['pizza'], detections['blister'],
+                   detections['conf_pizza'], detections['conf_blister'],
+                   counters['counter_sin_blister'], counters['counter_con_blister'], counters['counter_total'],
+                   opcua_connected, seq, time.time() if timestamp is None else timestamp)
+
+    def with_counters(self, counters: Dict) -> 'DetectionSnapshot':
+        """Copia con otros contadores (p. ej. tras reiniciarlos sin esperar al siguiente frame)"""
+        return DetectionSnapshot(self.pizza, self.blister, self.conf_pizza, self.conf_blister,
+                                 counters['counter_sin_blister'], counters['counter_con_blister'],
+                                 counters['counter_total'], self.opcua_connected, self.seq, self.timestamp)
+
+    @property
+    def porcentaje_sin_blister(self) -> float:
+        return self.counter_sin_blister / (self.counter_total or 1) * 100
+
+    @property
+    def porcentaje_con_blister(self) -> float:
+        return self.counter_con_blister / (self.counter_total or 1) * 100
+
+    def as_dict(self) -> Dict:
+        """Formato de `last_detection` en /status. Compartido entre lectores: no modificar."""
+        if self._dict is None:
+            object.__setattr__(self, '_dict', {
+                "pizza": self.pizza,
+                "blister": self.blister,
+                "conf_pizza": self.conf_pizza,
+                "conf_blister": self.conf_blister,
+                "opcua_connected": self.opcua_connected,
+                "counter_sin_blister": self.counter_sin_blister,
+                "counter_con_blister": self.counter_con_blister,
+                "counter_total": self.counter_total,
+                "porcentaje_sin_blister": self.porcentaje_sin_blister,
+                "porcentaje_con_blister": self.porcentaje_con_blister,
+                "seq": self.seq,
+                "timestamp": datetime.datetime.fromtimestamp(self.timestamp).isoformat()
+                if self.timestamp is not None else None,
+            })
+        return self._dict
+
+    def to_json(self) -> str:
+        if self._json is None:
+            object.__setattr__(self, '_json', json.dumps(self.as_dict(), separators=(',', ':')))
+        return self._json
+
+
+# Estado inicial de una cámara antes de su primer frame
+EMPTY_SNAPSHOT = DetectionSnapshot()
+
+
+def embed_json(envelope: Dict, key: str, raw_json: str) -> str:
+    """JSON de `envelope` con `raw_json` (ya serializado) añadido bajo `key`, sin volver a serializarlo"""
+    head = json.dumps(envelope, separators=(',', ':'))
+    separator = ',' if len(head) > 2 else ''
+    return f'{head[:-1]}{separator}{json.dumps(key)}:{raw_json}}}'
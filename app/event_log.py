@@ -0,0 +1,260 @@
+import datetime
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Pizza contada: instante (epoch), cámara, resultado (EVENT_* de app.camera_manager),
+# confianzas en porcentaje e id de track (None si no hay tracker)
+ProductionEvent = namedtuple('ProductionEvent',
+                             ['timestamp', 'camera', 'result', 'conf_pizza', 'conf_blister', 'track_id'])
+
+# Turnos por defecto: (nombre, hora local de inicio); cada turno dura hasta el inicio del siguiente
+DEFAULT_SHIFTS = (('mañana', 6), ('tarde', 14), ('noche', 22))
+
+# Tamaño del bucket de cada tabla de agregados, en segundos
+ROLLUPS = {'minute': 60, 'hour': 3600}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    camera TEXT NOT NULL,
+    result TEXT NOT NULL,
+    conf_pizza REAL,
+    conf_blister REAL,
+    track_id INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+CREATE TABLE IF NOT EXISTS rollup_minute (
+    bucket INTEGER NOT NULL,
+    camera TEXT NOT NULL,
+    sin_blister INTEGER NOT NULL DEFAULT 0,
+    con_blister INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, camera)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_hour (
+    bucket INTEGER NOT NULL,
+    camera TEXT NOT NULL,
+    sin_blister INTEGER NOT NULL DEFAULT 0,
+    con_blister INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, camera)
+) WITHOUT ROWID;
+"""
+
+
+def parse_time(value: Optional[str], default: float) -> float:
+    """Instante de un parámetro de consulta: epoch en segundos o fecha/hora ISO (hora local)"""
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def shift_of(moment: datetime.datetime, shifts: Sequence[Tuple[str, int]]) -> Tuple[datetime.date, str]:
+    """
+    Turno al que pertenece un instante local: (fecha de inicio del turno, nombre).
+    Las horas anteriores al primer turno del día son del último turno del día anterior.
+    """
+    ordered = sorted(shifts, key=lambda shift: shift[1])
+    for name, start in reversed(ordered):
+        if moment.hour >= start:
+            return moment.date(), name
+    return moment.date() - datetime.timedelta(days=1), ordered[-1][0]
+
+
+class EventLog:
+    """
+    Registro persistente de producción en SQLite (modo WAL): una fila por pizza contada.
+    append() nunca bloquea; un hilo propio escribe los eventos por lotes y, en la misma
+    transacción, suma cada lote a los agregados por minuto y por hora, de modo que las
+    consultas de agregados no recorren los eventos. Los eventos más antiguos que
+    `retention_days` se borran; los agregados se conservan.
+    """
+    def __init__(self, path, flush_interval: float = 1.0, batch_size: int = 500,
+                 queue_size: int = 10000, retention_days: int = 0,
+                 shifts: Sequence[Tuple[str, int]] = DEFAULT_SHIFTS):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days  # 0 = conservar todos los eventos
+        self.shifts = tuple(shifts)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._last_prune = 0.0
+
+        # Estadísticas
+        self.events_written = 0
+        self.events_dropped = 0
+        self.batches_written = 0
+        self.write_errors = 0
+
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+        logger.info(f"Registro de producción en {self.path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        # En WAL, NORMAL no corrompe la base ante un corte; como mucho se pierde el último lote
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def append(self, camera, result: str, conf_pizza: float = 0.0, conf_blister: float = 0.0,
+               track_id: Optional[int] = None, timestamp: Optional[float] = None) -> bool:
+        """Encola una pizza contada. No bloquea; si la cola está llena el evento se descarta."""
+        if self._closed:
+            return False
+        event = ProductionEvent(time.time() if timestamp is None else timestamp, str(camera), result,
+                                conf_pizza, conf_blister, track_id)
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.events_dropped += 1
+            return False
+
+    def _run(self):
+        conn = self._connect()
+        running = True
+        while running:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ()
+            batch = []
+            while item is not None:
+                if item:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            running = item is not None
+            if batch:
+                try:
+                    self._write(conn, batch)
+                except sqlite3.Error as e:
+                    logger.error(f"Error al escribir {len(batch)} eventos en {self.path}: {e}")
+                    self.write_errors += 1
+                    self.events_dropped += len(batch)
+            self._prune(conn)
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, batch: List[ProductionEvent]):
+        rollups = {name: Counter() for name in ROLLUPS}
+        for event in batch:
+            for name, seconds in ROLLUPS.items():
+                rollups[name][(int(event.timestamp // seconds), event.camera, event.result)] += 1
+        with conn:
+            conn.executemany('INSERT INTO events (ts, camera, result, conf_pizza, conf_blister, track_id) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', batch)
+            for name, counts in rollups.items():
+                conn.executemany(
+                    f'INSERT INTO rollup_{name} (bucket, camera, sin_blister, con_blister) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (bucket, camera) DO UPDATE SET '
+                    'sin_blister = sin_blister + excluded.sin_blister, '
+                    'con_blister = con_blister + excluded.con_blister',
+                    [(bucket, camera, n if result == 'sin_blister' else 0, n if result == 'con_blister' else 0)
+                     for (bucket, camera, result), n in counts.items()])
+        self.events_written += len(batch)
+        self.batches_written += 1
+
+    def _prune(self, conn: sqlite3.Connection):
+        """Borra, como mucho una vez por hora, los eventos fuera del periodo de retención"""
+        now = time.time()
+        if not self.retention_days or now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        try:
+            with conn:
+                deleted = conn.execute('DELETE FROM events WHERE ts < ?',
+                                       (now - self.retention_days * 86400,)).rowcount
+            if deleted:
+                logger.info(f"Registro de producción: {deleted} eventos antiguos borrados")
+        except sqlite3.Error as e:
+            logger.error(f"Error al borrar eventos antiguos de {self.path}: {e}")
+
+    def aggregates(self, granularity: str, start: float, end: float, camera=None) -> List[Dict]:
+        """
+        Pizzas por cámara y periodo entre `start` y `end` (epoch): granularidad 'minute',
+        'hour' o 'shift'. Los turnos se suman desde los agregados por hora. Los eventos
+        aún en la cola del escritor (como mucho `flush_interval` segundos) no se incluyen.
+        """
+        if granularity == 'shift':
+            return self._shift_aggregates(start, end, camera)
+        if granularity not in ROLLUPS:
+            raise ValueError(f"Granularidad no soportada: {granularity}")
+        seconds = ROLLUPS[granularity]
+        return [{
+            "start": datetime.datetime.fromtimestamp(bucket * seconds).isoformat(),
+            "camera": cam,
+            "sin_blister": sin_blister,
+            "con_blister": con_blister,
+            "total": sin_blister + con_blister,
+        } for bucket, cam, sin_blister, con_blister in self._rollup_rows(granularity, start, end, camera)]
+
+    def _rollup_rows(self, granularity: str, start: float, end: float, camera=None):
+        seconds = ROLLUPS[granularity]
+        query = (f'SELECT bucket, camera, sin_blister, con_blister FROM rollup_{granularity} '
+                 'WHERE bucket >= ? AND bucket <= ?')
+        params = [int(start // seconds), int(end // seconds)]
+        if camera is not None:
+            query += ' AND camera = ?'
+            params.append(str(camera))
+        conn = self._connect()
+        try:
+            return conn.execute(query + ' ORDER BY bucket, camera', params).fetchall()
+        finally:
+            conn.close()
+
+    def _shift_aggregates(self, start: float, end: float, camera=None) -> List[Dict]:
+        # Cada hora se asigna al turno de su hora local de inicio (turnos en horas enteras)
+        order = {name: i for i, (name, _) in enumerate(sorted(self.shifts, key=lambda shift: shift[1]))}
+        totals: Dict[Tuple, List[int]] = {}
+        for bucket, cam, sin_blister, con_blister in self._rollup_rows('hour', start, end, camera):
+            day, name = shift_of(datetime.datetime.fromtimestamp(bucket * 3600), self.shifts)
+            counts = totals.setdefault((day, order[name], name, cam), [0, 0])
+            counts[0] += sin_blister
+            counts[1] += con_blister
+        return [{
+            "date": day.isoformat(),
+            "shift": name,
+            "camera": cam,
+            "sin_blister": sin_blister,
+            "con_blister": con_blister,
+            "total": sin_blister + con_blister,
+        } for (day, _, name, cam), (sin_blister, con_blister) in sorted(totals.items())]
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "events_written": self.events_written,
+            "events_dropped": self.events_dropped,
+            "batches_written": self.batches_written,
+            "write_errors": self.write_errors,
+            "queue_depth": self._queue.qsize(),
+        }
+
+    def close(self, timeout: float = 5.0):
+        """Escribe los eventos pendientes y detiene el hilo escritor"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+        logger.info(f"Registro de producción cerrado: {self.events_written} eventos escritos")
@@ -0,0 +1,322 @@
+import logging
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Columnas de cada caja devuelta por el proceso: [x1, y1, x2, y2, track_id, conf, cls]
+RESULT_COLUMNS = 7
+
+# Claves de configuración que necesita el proceso de inferencia (valores que se pueden
+# enviar al proceso), incluidas las de la elección del backend (ver app.model_backends)
+WORKER_CONFIG_KEYS = ('CONF_THRESHOLD', 'INFERENCE_ROI', 'INFERENCE_ROI_MARGIN', 'MODEL_IMGSZ', 'TRACKER',
+                      'DETECTION_TARGET_FPS', 'BASE_DIR', 'MODEL_BACKEND', 'MODEL_BACKEND_CANDIDATES',
+                      'MODEL_CACHE_DIR', 'MODEL_BENCHMARK_RUNS', 'MODEL_BACKEND_REBENCHMARK', 'MODEL_INT8_DATA')
+
+
+class SharedRing:
+    """
+    Buffers de frames y de resultados en memoria compartida, divididos en `slots` ranuras
+    de tamaño fijo. El proceso principal copia cada frame en su ranura y el proceso de
+    inferencia lo lee en el sitio, como vista numpy, sin serializarlo; las cajas vuelven
+    igual, como un array float32 por ranura. Por la tubería solo viajan índices y formas.
+    """
+    def __init__(self, slots: int, frame_bytes: int, max_boxes: int,
+                 names: Optional[Tuple[str, str]] = None):
+        self.slots = slots
+        self.frame_bytes = frame_bytes
+        self.max_boxes = max_boxes
+        self.result_bytes = max_boxes * RESULT_COLUMNS * 4
+        self.owner = names is None
+        if self.owner:
+            self.frames = shared_memory.SharedMemory(create=True, size=slots * frame_bytes)
+            self.results = shared_memory.SharedMemory(create=True, size=slots * self.result_bytes)
+        else:
+            self.frames = shared_memory.SharedMemory(name=names[0])
+            self.results = shared_memory.SharedMemory(name=names[1])
+        self._next = 0
+
+    @property
+    def names(self) -> Tuple[str, str]:
+        return self.frames.name, self.results.name
+
+    def next_slot(self) -> int:
+        slot = self._next
+        self._next = (self._next + 1) % self.slots
+        return slot
+
+    def frame_view(self, slot: int, shape: Tuple[int, ...]) -> np.ndarray:
+        return np.ndarray(shape, dtype=np.uint8, buffer=self.frames.buf, offset=slot * self.frame_bytes)
+
+    def put_frame(self, slot: int, frame: np.ndarray) -> Tuple[int, ...]:
+        """Copia el frame en su ranura (la única copia) y devuelve la forma para el otro proceso"""
+        if frame.nbytes > self.frame_bytes:
+            raise ValueError(f"Frame de {frame.nbytes} bytes mayor que la ranura ({self.frame_bytes})")
+        np.copyto(self.frame_view(slot, frame.shape), frame, casting='no')
+        return frame.shape
+
+    def result_view(self, slot: int) -> np.ndarray:
+        return np.ndarray((self.max_boxes, RESULT_COLUMNS), dtype=np.float32,
+                          buffer=self.results.buf, offset=slot * self.result_bytes)
+
+    def put_result(self, slot: int, data: np.ndarray) -> int:
+        """Escribe las cajas de un resultado; devuelve cuántas caben (el resto se descarta)"""
+        count = min(len(data), self.max_boxes)
+        if count:
+            self.result_view(slot)[:count] = data[:count]
+        return count
+
+    def close(self):
+        for segment in (self.frames, self.results):
+            segment.close()
+            if self.owner:
+                segment.unlink()
+
+
+def _with_track_column(data: np.ndarray) -> np.ndarray:
+    """Cajas sin id de track (6 columnas) con la columna de id a -1, para un formato fijo"""
+    if data.shape[1] == RESULT_COLUMNS:
+        return data
+    return np.concatenate([data[:, :4], np.full((len(data), 1), -1, dtype=data.dtype), data[:, 4:]], axis=1)
+
+
+def _worker_main(conn, names, slots, frame_bytes, max_boxes, model_path, config):
+    """
+    Proceso de inferencia: carga el modelo una vez y atiende peticiones (lote de ranuras
+    con la cámara y el área de cada frame). Ejecuta predict en lote y el tracker de cada
+    cámara, y deja las cajas en la ranura de resultados de cada frame. Sin `model_path`
+    elige aquí el backend (exportaciones y micro-benchmark, ver app.model_backends), de
+    modo que el proceso principal no carga torch ni ningún candidato.
+    """
+    logging.basicConfig(level=logging.INFO)
+    # Importaciones pesadas solo en el proceso de inferencia
+    from app.model_backends import backend_stats, select_model
+    from app.model_registry import get_model
+    from app.postprocess import boxes_data
+    from app.roi import predict_frames
+    from app.tracking import create_tracker, apply_tracker
+
+    ring = SharedRing(slots, frame_bytes, max_boxes, names)
+    selection = {}
+    if model_path is None:
+        try:
+            model_path = select_model(config)
+        except Exception as e:
+            conn.send(('error', f"No se pudo elegir el backend del modelo: {e}"))
+            return
+        if model_path is None:
+            conn.send(('error', "No se encontró ningún modelo"))
+            return
+        selection = backend_stats()
+    model = get_model(model_path, imgsz=config.get('MODEL_IMGSZ', 640))
+    if model is None:
+        conn.send(('error', f"No se pudo cargar el modelo {model_path}"))
+        return
+    trackers = {}
+    frame_rate = config.get('DETECTION_TARGET_FPS', 15) or 30
+    conn.send(('ready', {"names": dict(model.names), "model_path": str(model_path), "selection": selection}))
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        request_id, items = request
+        start = time.perf_counter()
+        frames = [ring.frame_view(slot, shape) for slot, _, shape, _ in items]
+        results = predict_frames(model, frames, [area for _, _, _, area in items], config)
+        counts = []
+        for (slot, camera, _, _), result in zip(items, results):
+            tracker = trackers.get(camera)
+            if tracker is None:
+                tracker = trackers[camera] = create_tracker(config, frame_rate=frame_rate)
+            result = apply_tracker(tracker, result)
+            data = boxes_data(result.boxes) if result.boxes is not None and len(result.boxes) else \
+                np.zeros((0, RESULT_COLUMNS), dtype=np.float32)
+            counts.append(ring.put_result(slot, _with_track_column(data)))
+        conn.send((request_id, counts, time.perf_counter() - start))
+
+
+class InferenceWorker:
+    """
+    Inferencia y tracking en un proceso propio, para que no compitan por el GIL con el
+    streaming, la codificación JPEG y los hilos de Flask. Los frames pasan por un anillo
+    de memoria compartida (ver SharedRing) y los resultados vuelven como arrays.
+    El proceso se supervisa: si muere o no responde a tiempo se reinicia (con una espera
+    mínima entre reinicios) y la petición en curso se da por perdida. Si llega un frame
+    mayor que las ranuras, el anillo se agranda (y el proceso se reinicia) una vez.
+    """
+    def __init__(self, model_path, config, cameras: int = 1, max_frame_bytes: int = 1920 * 1080 * 3,
+                 max_boxes: int = 300, request_timeout: float = 5.0, start_timeout: float = 120.0,
+                 restart_delay: float = 2.0):
+        # None = el proceso elige el backend al arrancar (la elección queda en `selection`)
+        self.model_path = str(model_path) if model_path is not None else None
+        self._select_in_worker = model_path is None
+        self.config = {key: config.get(key) for key in WORKER_CONFIG_KEYS if config.get(key) is not None}
+        # Dos lotes de ranuras: el de la petición en curso y el siguiente
+        self.ring = SharedRing(max(cameras, 1) * 2, max_frame_bytes, max_boxes)
+        self.ring_resizes = 0
+        self.request_timeout = request_timeout
+        self.start_timeout = start_timeout
+        self.restart_delay = restart_delay
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._request_id = 0
+        self._last_start = 0.0
+        self.names: Dict[int, str] = {}
+        self.selection: Dict = {}  # Backend elegido por el proceso (vacío si se le pasó la ruta)
+
+        # Estadísticas
+        self.requests = 0
+        self.failures = 0
+        self.restarts = 0
+        self.last_infer_ms = 0.0
+
+    def start(self) -> bool:
+        """Arranca el proceso y espera a que el modelo esté cargado"""
+        with self._lock:
+            return self._start()
+
+    def _start(self) -> bool:
+        self._last_start = time.monotonic()
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, name="inference-worker", daemon=True,
+            args=(child, self.ring.names, self.ring.slots, self.ring.frame_bytes, self.ring.max_boxes,
+                  None if self._select_in_worker else self.model_path, self.config))
+        process.start()
+        child.close()
+        self._process, self._conn = process, parent
+        if not parent.poll(self.start_timeout):
+            logger.error(f"El proceso de inferencia no arrancó en {self.start_timeout}s")
+            self._stop_process()
+            return False
+        try:
+            status, payload = parent.recv()
+        except (EOFError, OSError) as e:
+            logger.error(f"El proceso de inferencia terminó al arrancar: {e}")
+            self._stop_process()
+            return False
+        if status != 'ready':
+            logger.error(f"Error en el proceso de inferencia: {payload}")
+            self._stop_process()
+            return False
+        self.names = payload['names']
+        self.model_path = payload['model_path']
+        self.selection = payload['selection']
+        logger.info(f"Proceso de inferencia listo (PID {process.pid}, modelo {self.model_path})")
+        return True
+
+    def _stop_process(self):
+        process, conn = self._process, self._conn
+        self._process = self._conn = None
+        if conn is not None:
+            try:
+                conn.send(None)
+            except (OSError, ValueError):
+                pass
+            conn.close()
+        if process is not None:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.kill()
+                process.join(timeout=2.0)
+
+    def _restart(self, reason: str) -> bool:
+        exitcode = self._process.exitcode if self._process is not None else None
+        logger.error(f"Reiniciando el proceso de inferencia ({reason}, código de salida {exitcode})")
+        self._stop_process()
+        # No reiniciar en bucle si el proceso muere nada más arrancar
+        wait = self._last_start + self.restart_delay - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self.restarts += 1
+        return self._start()
+
+    def _resize_ring(self, frame_bytes: int) -> bool:
+        """Sustituye el anillo por uno con ranuras de `frame_bytes` y reinicia el proceso sobre él"""
+        logger.warning(f"Frame de {frame_bytes} bytes mayor que las ranuras del proceso de inferencia "
+                       f"({self.ring.frame_bytes}): se agrandan (sube INFERENCE_WORKER_MAX_FRAME_BYTES)")
+        self._stop_process()
+        self.ring.close()
+        self.ring = SharedRing(self.ring.slots, frame_bytes, self.ring.max_boxes)
+        self.ring_resizes += 1
+        return self._start()
+
+    def infer(self, frames: Sequence[np.ndarray], areas: Sequence, cameras: Sequence[int]) -> Optional[List[np.ndarray]]:
+        """
+        Infiere un lote de frames con el tracker de cada cámara. Devuelve por frame un array
+        [N, 7] (x1, y1, x2, y2, track_id, conf, cls; id -1 sin track), o None si el proceso
+        falló (se reinicia para la siguiente petición).
+        """
+        with self._lock:
+            largest = max((frame.nbytes for frame in frames), default=0)
+            if largest > self.ring.frame_bytes and not self._resize_ring(largest):
+                self.failures += 1
+                return None
+            if self._process is None or not self._process.is_alive():
+                if not self._restart("proceso caído"):
+                    self.failures += 1
+                    return None
+            slots = [self.ring.next_slot() for _ in frames]
+            items = [(slot, camera, self.ring.put_frame(slot, frame), tuple(area))
+                     for slot, frame, camera, area in zip(slots, frames, cameras, areas)]
+            self._request_id += 1
+            self.requests += 1
+            try:
+                self._conn.send((self._request_id, items))
+                if not self._conn.poll(self.request_timeout):
+                    raise TimeoutError(f"sin respuesta en {self.request_timeout}s")
+                request_id, counts, seconds = self._conn.recv()
+                if request_id != self._request_id:
+                    raise OSError(f"respuesta {request_id} a la petición {self._request_id}")
+            except (EOFError, OSError, TimeoutError) as e:
+                self.failures += 1
+                self._restart(str(e) or type(e).__name__)
+                return None
+            self.last_infer_ms = seconds * 1000
+            # Copiar las cajas fuera de la ranura: es pequeño y la ranura se reutiliza
+            return [self.ring.result_view(slot)[:count].copy() for slot, count in zip(slots, counts)]
+
+    def stats(self) -> Dict:
+        process = self._process
+        return {
+            "pid": process.pid if process is not None else None,
+            "alive": bool(process is not None and process.is_alive()),
+            "requests": self.requests,
+            "failures": self.failures,
+            "restarts": self.restarts,
+            "ring_resizes": self.ring_resizes,
+            "frame_bytes": self.ring.frame_bytes,
+            "last_infer_ms": round(self.last_infer_ms, 2),
+        }
+
+    def close(self):
+        with self._lock:
+            self._stop_process()
+            self.ring.close()
+
+
+def boxes_to_result(data: np.ndarray, frame, names: Dict[int, str]):
+    """Resultado de ultralytics a partir de las cajas devueltas por el proceso (plot, boxes.data...)"""
+    import torch
+    from ultralytics.engine.results import Results
+    tracked = data[:, 4] >= 0
+    # Boxes admite 7 columnas (con id) o 6 (sin id): las cajas sin track pierden la columna
+    if tracked.all():
+        boxes = data
+    elif not tracked.any():
+        boxes = np.delete(data, 4, axis=1)
+    else:
+        boxes = data[tracked]
+    return Results(frame, path='', names=names, boxes=torch.from_numpy(np.ascontiguousarray(boxes)))
@@ -0,0 +1,135 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Límites de los buckets en segundos: de 1 ms a 2,5 s, suficiente para todas las etapas
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Muestra de un collector: (nombre, tipo, ayuda, [(etiquetas, valor), ...])
+Sample = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Histograma con buckets fijos. observe() solo hace una búsqueda binaria y dos sumas
+    bajo un lock propio de este histograma, así que no compite con otras etapas.
+    Los contadores son por bucket; los acumulados se calculan al servir /metrics.
+    """
+    __slots__ = ('buckets', '_counts', '_sum', '_lock')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # El último es +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class HistogramFamily:
+    """Histogramas de una métrica, uno por valor de su única etiqueta (p. ej. stage="inference")"""
+    def __init__(self, name: str, documentation: str, label: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._children: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value: str) -> Histogram:
+        child = self._children.get(value)
+        if child is None:
+            # Solo se toma el lock la primera vez que aparece una etiqueta
+            with self._lock:
+                child = self._children.setdefault(value, Histogram(self.buckets))
+        return child
+
+    def observe(self, value: str, seconds: float):
+        self.labels(value).observe(seconds)
+
+    @contextmanager
+    def time(self, value: str):
+        """Mide la duración del bloque en el histograma de la etiqueta"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.labels(value).observe(time.perf_counter() - start)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for value, child in sorted(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels({self.label: value, "le": _number(bound)})} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels({self.label: value})} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels({self.label: value})} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Métricas del proceso en formato de texto de Prometheus. Los histogramas se actualizan
+    en el camino caliente; gauges y contadores los generan collectors al servir /metrics,
+    por lo que no cuestan nada entre consultas.
+    """
+    def __init__(self):
+        self._families: List[HistogramFamily] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def register(self, family: HistogramFamily) -> HistogramFamily:
+        self._families.append(family)
+        return family
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for family in self._families:
+            lines.extend(family.render())
+        for collector in self._collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.extend(f'{name}{_labels(labels)} {_number(value)}' for labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# Duración por etapa: capture, wait_frame, motion, inference, postprocess (conteo, pulsos y
+# estado, sin anotar), annotate (en la etapa de codificación del pipeline), encode (JPEG)
+# y opcua_write
+STAGE_SECONDS = REGISTRY.register(HistogramFamily(
+    'yolo_stage_seconds', 'Duración de cada etapa del pipeline en segundos', 'stage'))
@@ -0,0 +1,264 @@
+import datetime
+import hashlib
+import importlib.util
+import json
+import logging
+import shutil
+import statistics
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.model_registry import get_model, release
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Variante del modelo: formato de exportación de ultralytics (None = los pesos tal cual),
+# argumentos de exportación y módulos Python que necesita para exportarse y ejecutarse
+BackendVariant = namedtuple('BackendVariant', ['name', 'format', 'export_args', 'requires'])
+
+VARIANTS = {
+    'pytorch': BackendVariant('pytorch', None, {}, ('torch',)),
+    'tensorrt': BackendVariant('tensorrt', None, {}, ('tensorrt',)),
+    'onnx': BackendVariant('onnx', 'onnx', {'simplify': True}, ('onnx', 'onnxruntime')),
+    # Cuantización dinámica de los pesos a INT8 con ONNX Runtime sobre la exportación ONNX
+    'onnx_int8': BackendVariant('onnx_int8', 'onnx', {'simplify': True}, ('onnx', 'onnxruntime')),
+    'openvino': BackendVariant('openvino', 'openvino', {}, ('openvino',)),
+    'openvino_fp16': BackendVariant('openvino_fp16', 'openvino', {'half': True}, ('openvino',)),
+    # Cuantización INT8 con NNCF: necesita un dataset de calibración (MODEL_INT8_DATA)
+    'openvino_int8': BackendVariant('openvino_int8', 'openvino', {'int8': True}, ('openvino', 'nncf')),
+}
+
+DEFAULT_CANDIDATES = ('pytorch', 'tensorrt', 'onnx', 'openvino', 'openvino_fp16')
+
+_selection: Optional[Dict] = None
+_selection_lock = threading.Lock()
+
+
+def weights_hash(path: Path) -> str:
+    """Huella de los pesos (SHA-1 abreviado): cambia la caché de exportaciones si cambian los pesos"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def cache_key(weights: Path, imgsz: int, dynamic: bool) -> str:
+    """Directorio de caché de unas exportaciones: pesos, huella, tamaño de entrada y si es dinámico"""
+    return f"{weights.stem}_{weights_hash(weights)}_{imgsz}{'_dynamic' if dynamic else ''}"
+
+
+def missing_requirements(variant: BackendVariant) -> List[str]:
+    """Módulos que faltan para una variante (no se instalan: los PCs de línea no tienen red)"""
+    return [module for module in variant.requires if importlib.util.find_spec(module) is None]
+
+
+def _quantize_onnx(path: Path) -> Path:
+    """Cuantiza los pesos de un modelo ONNX a INT8 conservando los metadatos de ultralytics"""
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    target = path.with_name(f"{path.stem}_int8.onnx")
+    quantize_dynamic(str(path), str(target), weight_type=QuantType.QUInt8)
+    # Nombres de clases, stride y tarea viajan en metadata_props
+    source, quantized = onnx.load(str(path)), onnx.load(str(target))
+    del quantized.metadata_props[:]
+    quantized.metadata_props.extend(source.metadata_props)
+    onnx.save(quantized, str(target))
+    path.unlink()
+    return target
+
+
+def export_variant(weights: Path, variant: BackendVariant, cache_dir: Path, imgsz: int,
+                   dynamic: bool = False, int8_data: Optional[str] = None) -> Optional[Path]:
+    """
+    Ruta del modelo exportado en la variante pedida, exportándolo solo si no está en la caché.
+    Cada variante tiene su directorio con un manifest.json. None si no se pudo exportar.
+    """
+    directory = cache_dir / variant.name
+    manifest_path = directory / 'manifest.json'
+    if manifest_path.exists():
+        try:
+            exported = directory / json.loads(manifest_path.read_text())['path']
+            if exported.exists():
+                return exported
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Manifiesto de {variant.name} no válido, se exporta de nuevo: {e}")
+
+    args = {**variant.export_args, 'imgsz': imgsz, 'dynamic': dynamic, 'device': 'cpu'}
+    if args.get('int8'):
+        if not int8_data:
+            logger.info(f"Variante {variant.name} omitida: falta MODEL_INT8_DATA para calibrar")
+            return None
+        args['data'] = int8_data
+
+    from ultralytics import YOLO
+    directory.mkdir(parents=True, exist_ok=True)
+    # Exportar desde una copia de los pesos: ultralytics deja el resultado junto a ellos
+    source = directory / weights.name
+    shutil.copy2(weights, source)
+    start = time.perf_counter()
+    try:
+        exported = Path(YOLO(str(source)).export(format=variant.format, verbose=False, **args))
+        if variant.name == 'onnx_int8':
+            exported = _quantize_onnx(exported)
+    except Exception as e:
+        logger.error(f"No se pudo exportar la variante {variant.name}: {e}")
+        return None
+    finally:
+        source.unlink(missing_ok=True)
+    manifest_path.write_text(json.dumps({
+        "variant": variant.name,
+        "path": exported.relative_to(directory).as_posix(),
+        "weights": weights.name,
+        "imgsz": imgsz,
+        "dynamic": dynamic,
+        "exported_at": datetime.datetime.now().isoformat(),
+    }, indent=2))
+    logger.info(f"Variante {variant.name} exportada en {time.perf_counter() - start:.1f}s: {exported}")
+    return exported
+
+
+def benchmark_model(path: Path, imgsz: int, runs: int = 10) -> float:
+    """Mediana en segundos de `runs` inferencias sobre un frame sintético (el modelo queda en el registro)"""
+    model = get_model(path, imgsz=imgsz)
+    if model is None:
+        raise RuntimeError(f"No se pudo cargar {path}")
+    frame = np.random.default_rng(0).integers(0, 256, (imgsz, imgsz, 3), dtype=np.uint8)
+    model.predict(frame, imgsz=imgsz, verbose=False)
+    times = []
+    for _ in range(max(runs, 1)):
+        start = time.perf_counter()
+        model.predict(frame, imgsz=imgsz, verbose=False)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def candidate_paths(config, weights: Path, cache_dir: Path, candidates) -> Dict[str, Path]:
+    """Ruta de cada variante candidata disponible (exportando las que falten en la caché)"""
+    imgsz = config.get('MODEL_IMGSZ', 640)
+    # Con INFERENCE_ROI el tamaño de entrada cambia con el recorte: exportar con entrada dinámica
+    dynamic = bool(config.get('INFERENCE_ROI', False))
+    paths = {}
+    for name in candidates:
+        variant = VARIANTS.get(name)
+        if variant is None:
+            logger.warning(f"Backend de modelo desconocido: {name}")
+            continue
+        missing = missing_requirements(variant)
+        if missing:
+            logger.info(f"Backend {name} omitido: faltan {', '.join(missing)}")
+            continue
+        if name == 'pytorch':
+            paths[name] = weights
+        elif name == 'tensorrt':
+            engine = weights.with_name(f"{weights.stem}_engine.engine")
+            if engine.exists():
+                paths[name] = engine
+        else:
+            exported = export_variant(weights, variant, cache_dir, imgsz, dynamic, config.get('MODEL_INT8_DATA'))
+            if exported is not None:
+                paths[name] = exported
+    return paths
+
+
+def select_model(config) -> Optional[Path]:
+    """
+    Modelo a usar en este proceso según MODEL_BACKEND: una variante concreta o, con 'auto',
+    la más rápida de MODEL_BACKEND_CANDIDATES medida con un micro-benchmark al arrancar.
+    La elección se guarda junto a las exportaciones y se reutiliza mientras no cambien los
+    pesos, el tamaño de entrada ni los candidatos. None si no están los pesos.
+    """
+    global _selection
+    with _selection_lock:
+        if _selection is not None:
+            return Path(_selection['path'])
+
+        weights = Path(config['BASE_DIR']) / 'models' / 'yolo_weights.pt'
+        if not weights.exists():
+            logger.error(f"No se encontró el modelo en {weights}")
+            return None
+        imgsz = config.get('MODEL_IMGSZ', 640)
+        backend = config.get('MODEL_BACKEND', 'auto')
+        candidates = list(config.get('MODEL_BACKEND_CANDIDATES', DEFAULT_CANDIDATES)) if backend == 'auto' else [backend]
+        cache_dir = Path(config.get('MODEL_CACHE_DIR', weights.parent / 'cache')) / \
+            cache_key(weights, imgsz, bool(config.get('INFERENCE_ROI', False)))
+
+        paths = candidate_paths(config, weights, cache_dir, candidates)
+        if not paths:
+            logger.warning(f"Ningún backend disponible de {candidates}: se usan los pesos PyTorch")
+            paths = {'pytorch': weights}
+
+        selection_path = cache_dir / 'selection.json'
+        selection = _cached_selection(selection_path, paths, config)
+        if selection is None:
+            selection = _benchmark_selection(paths, imgsz, config.get('MODEL_BENCHMARK_RUNS', 10))
+            if len(paths) > 1:
+                cache_dir.mkdir(parents=True, exist_ok=True)
+                selection_path.write_text(json.dumps(selection, indent=2))
+        _selection = selection
+        logger.info(f"Backend del modelo: {selection['backend']} ({selection['path']})")
+        return Path(selection['path'])
+
+
+def _cached_selection(selection_path: Path, paths: Dict[str, Path], config) -> Optional[Dict]:
+    """Elección guardada si sigue siendo válida para los mismos candidatos"""
+    if len(paths) == 1:
+        name, path = next(iter(paths.items()))
+        return {"backend": name, "path": str(path), "timings_ms": {}, "benchmarked": False}
+    if config.get('MODEL_BACKEND_REBENCHMARK', False) or not selection_path.exists():
+        return None
+    try:
+        selection = json.loads(selection_path.read_text())
+    except ValueError:
+        return None
+    if sorted(selection.get('timings_ms', {})) != sorted(paths) or selection.get('backend') not in paths:
+        return None
+    return {**selection, "path": str(paths[selection['backend']])}
+
+
+def _benchmark_selection(paths: Dict[str, Path], imgsz: int, runs: int) -> Dict:
+    """Mide cada candidato y elige el más rápido; los demás se descargan del registro"""
+    timings = {}
+    for name, path in paths.items():
+        try:
+            timings[name] = benchmark_model(path, imgsz, runs)
+            logger.info(f"Backend {name}: {timings[name] * 1000:.1f} ms por frame")
+        except Exception as e:
+            logger.error(f"Backend {name} descartado en el micro-benchmark: {e}")
+    if not timings:
+        return {"backend": 'pytorch', "path": str(paths.get('pytorch', next(iter(paths.values())))),
+                "timings_ms": {}, "benchmarked": False}
+    best = min(timings, key=timings.get)
+    for name, path in paths.items():
+        if name != best:
+            release(path)
+    return {
+        "backend": best,
+        "path": str(paths[best]),
+        "timings_ms": {name: round(seconds * 1000, 2) for name, seconds in timings.items()},
+        "benchmarked": True,
+        "benchmarked_at": datetime.datetime.now().isoformat(),
+    }
+
+
+def adopt_selection(selection: Dict):
+    """Toma como propia la elección hecha en otro proceso (el de inferencia), para las estadísticas"""
+    global _selection
+    with _selection_lock:
+        _selection = dict(selection) if selection else None
+
+
+def selected_backend() -> Optional[str]:
+    """Nombre del backend elegido (None hasta que se elige)"""
+    return _selection['backend'] if _selection is not None else None
+
+
+def backend_stats() -> Dict:
+    """Backend elegido, su ruta y los tiempos del micro-benchmark de cada candidato"""
+    return dict(_selection) if _selection is not None else {}
@@ -0,0 +1,140 @@
+import os
+import logging
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Tamaño de la imagen usada para el calentamiento del modelo
+WARMUP_SHAPE = (640, 640, 3)
+
+
+class LoadedModel:
+    """Entrada del registro: el modelo compartido y sus datos de carga y memoria."""
+    __slots__ = ('path', 'model', 'lock', 'load_seconds', 'warmup_seconds',
+                 'parameter_bytes', 'rss_delta_bytes', 'file_bytes')
+
+    def __init__(self, path: str, model):
+        self.path = path
+        self.model = model
+        self.lock = threading.Lock()  # Serializa inferencias: YOLO no es thread-safe
+        self.load_seconds = 0.0
+        self.warmup_seconds = 0.0
+        self.parameter_bytes = 0
+        self.rss_delta_bytes = 0
+        self.file_bytes = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "file_mb": round(self.file_bytes / 1e6, 1),
+            "parameters_mb": round(self.parameter_bytes / 1e6, 1),
+            "rss_delta_mb": round(self.rss_delta_bytes / 1e6, 1),
+            "load_seconds": round(self.load_seconds, 3),
+            "warmup_seconds": round(self.warmup_seconds, 3),
+        }
+
+
+_models: Dict[str, LoadedModel] = {}
+_registry_lock = threading.Lock()
+_unregistered_lock = threading.Lock()
+
+
+def _current_rss_bytes() -> int:
+    """Memoria residente del proceso en bytes (0 si no se puede determinar)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # En Linux ru_maxrss está en KiB (es un máximo, no el valor actual)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        return 0
+
+
+def _parameter_bytes(model) -> int:
+    """Bytes ocupados por los parámetros del modelo PyTorch subyacente (0 para motores exportados)"""
+    try:
+        return sum(p.numel() * p.element_size() for p in model.model.parameters())
+    except Exception:
+        return 0
+
+
+def get_model(path, warmup: bool = True, imgsz: int = 640):
+    """
+    Devuelve el modelo YOLO compartido para `path`, cargándolo y calentándolo (una
+    inferencia de prueba a `imgsz`) una única vez por proceso. None si no se pudo cargar.
+    """
+    key = str(path)
+    entry = _models.get(key)
+    if entry is not None:
+        return entry.model
+
+    with _registry_lock:
+        # Otro hilo pudo cargarlo mientras esperábamos el lock
+        entry = _models.get(key)
+        if entry is not None:
+            return entry.model
+
+        if not os.path.exists(key):
+            logger.error(f"No se encontró el modelo en {key}")
+            return None
+
+        # Importación diferida: ultralytics (y torch) tardan segundos en importarse y
+        # no deben retrasar el arranque del servidor web
+        from ultralytics import YOLO
+        rss_before = _current_rss_bytes()
+        start = time.perf_counter()
+        model = YOLO(key)
+        entry = LoadedModel(key, model)
+        entry.load_seconds = time.perf_counter() - start
+
+        if warmup:
+            start = time.perf_counter()
+            try:
+                # La primera inferencia inicializa el predictor; hacerla aquí y no con el primer frame real
+                model.predict(np.zeros(WARMUP_SHAPE, dtype=np.uint8), imgsz=imgsz, verbose=False)
+            except Exception as e:
+                logger.warning(f"Fallo en el calentamiento del modelo {key}: {e}")
+            entry.warmup_seconds = time.perf_counter() - start
+
+        entry.parameter_bytes = _parameter_bytes(model)
+        entry.rss_delta_bytes = max(_current_rss_bytes() - rss_before, 0)
+        _models[key] = entry
+
+        logger.info(f"Modelo YOLO cargado desde {key} en {entry.load_seconds:.2f}s "
+                    f"(calentamiento {entry.warmup_seconds:.2f}s, +{entry.rss_delta_bytes / 1e6:.0f} MB RSS)")
+        return model
+
+
+def inference_lock(model) -> threading.Lock:
+    """Devuelve el lock de inferencia asociado a un modelo del registro"""
+    for entry in list(_models.values()):
+        if entry.model is model:
+            return entry.lock
+    # Modelo no registrado: lock común para no dejarlo sin protección
+    return _unregistered_lock
+
+
+def model_stats() -> List[Dict]:
+    """Estadísticas de carga y memoria de cada modelo cargado"""
+    return [entry.stats() for entry in list(_models.values())]
+
+
+def release(path):
+    """Descarta un modelo del registro (p. ej. los candidatos no elegidos por app.model_backends)"""
+    with _registry_lock:
+        _models.pop(str(path), None)
+
+
+def clear():
+    """Descarta todos los modelos del registro"""
+    with _registry_lock:
+        _models.clear()
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+from typing import Dict, Tuple
+
+
+class MotionGate:
+    """
+    Detector de cambios barato delante de la inferencia. Compara una versión reducida
+    en escala de grises del área de inspección con la del último frame inferido: si la
+    fracción de píxeles que cambia no supera el umbral, se reutiliza la detección anterior.
+    En cuanto empieza un cambio se fuerza la inferencia en ese mismo frame, y cada
+    `max_skip` frames se infiere igualmente para refrescar el estado.
+    """
+    def __init__(self, threshold: float = 0.01, pixel_delta: int = 20, scale: float = 0.25, max_skip: int = 50):
+        self.threshold = threshold  # Fracción de píxeles cambiados que dispara la inferencia
+        self.pixel_delta = pixel_delta  # Diferencia de gris a partir de la cual un píxel cuenta como cambiado
+        self.scale = scale
+        self.max_skip = max_skip
+        self._reference = None
+        self._consecutive_skips = 0
+        self.frames = 0
+        self.skipped = 0
+        self.last_change = 0.0
+
+    def _signature(self, frame, area: Tuple[int, int, int, int]) -> np.ndarray:
+        h, w = frame.shape[:2]
+        x1, y1, x2, y2 = max(area[0], 0), max(area[1], 0), min(area[2], w), min(area[3], h)
+        roi = frame[y1:y2, x1:x2]
+        size = (max(int((x2 - x1) * self.scale), 1), max(int((y2 - y1) * self.scale), 1))
+        small = cv2.resize(roi, size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        # Suavizado ligero para no reaccionar al ruido del sensor
+        return cv2.GaussianBlur(gray, (3, 3), 0)
+
+    def should_infer(self, frame, area: Tuple[int, int, int, int]) -> bool:
+        """Devuelve True si el área cambió (o toca refresco) y hay que ejecutar el modelo"""
+        infer, signature = self.check(frame, area)
+        if infer:
+            self.accept(signature)
+        return infer
+
+    def check(self, frame, area: Tuple[int, int, int, int]) -> Tuple[bool, np.ndarray]:
+        """
+        Como should_infer() pero sin mover la referencia: devuelve (inferir, firma del frame).
+        Quien infiere llama a accept() con la firma solo cuando obtiene el resultado; si el
+        frame se pierde antes, los siguientes se siguen comparando con la referencia anterior
+        y disparan la inferencia.
+        """
+        self.frames += 1
+        signature = self._signature(frame, area)
+        reference = self._reference
+        if reference is None or reference.shape != signature.shape:
+            return True, signature
+
+        diff = cv2.absdiff(signature, reference)
+        self.last_change = float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+        if self.last_change > self.threshold or self._consecutive_skips >= self.max_skip:
+            return True, signature
+
+        self._consecutive_skips += 1
+        self.skipped += 1
+        return False, signature
+
+    def accept(self, signature: np.ndarray):
+        """Toma como referencia la firma de un frame ya inferido"""
+        # La referencia es el último frame inferido: los cambios lentos se acumulan y acaban disparando
+        self._reference = signature
+        self._consecutive_skips = 0
+
+    def stats(self) -> Dict:
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skipped_fraction": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+            "last_change": round(self.last_change, 4),
+        }
@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Etapas del loop de detección, en orden, y dónde puede ejecutarse cada una. Solo la
+# inferencia admite un proceso propio (ver app.inference_worker): el resto usa el cliente
+# OPC-UA, los contadores y los broadcasters de este proceso.
+STAGES = ('capture', 'inference', 'postprocess', 'encode')
+PLACEMENTS = {
+    'capture': ('thread',),
+    'inference': ('thread', 'process'),
+    'postprocess': ('thread',),
+    'encode': ('thread',),
+}
+
+
+def stage_placements(config) -> Dict[str, str]:
+    """Ubicación de cada etapa según PIPELINE_PLACEMENT ('thread' por defecto); ValueError si no se admite"""
+    configured = config.get('PIPELINE_PLACEMENT') or {}
+    unknown = set(configured) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Etapas de pipeline desconocidas: {', '.join(sorted(unknown))}")
+    placements = {}
+    for stage in STAGES:
+        placement = configured.get(stage, 'thread')
+        if placement not in PLACEMENTS[stage]:
+            raise ValueError(f"La etapa '{stage}' no admite la ubicación '{placement}' "
+                             f"(admitidas: {', '.join(PLACEMENTS[stage])})")
+        placements[stage] = placement
+    return placements
+
+
+class HandoffQueue:
+    """
+    Cola acotada entre dos etapas. Por defecto, si está llena, put() descarta el elemento
+    más antiguo en lugar de bloquear a la etapa anterior, de modo que la siguiente siempre
+    recibe los frames más recientes y el retraso no se acumula. Con `drop_oldest=False`
+    put() espera a que haya sitio: para entradas que no se pueden perder (p. ej. resultados
+    ya inferidos, con su conteo y sus pulsos pendientes).
+    """
+    def __init__(self, maxsize: int = 2, drop_oldest: bool = True):
+        self.maxsize = max(maxsize, 1)
+        self.drop_oldest = drop_oldest
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item) -> bool:
+        """
+        Encola el elemento. Devuelve False si se descartó uno antiguo para hacer sitio o,
+        sin descarte, si la cola se cerró mientras esperaba.
+        """
+        with self._cond:
+            if not self.drop_oldest:
+                while len(self._items) >= self.maxsize and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return False
+            dropped = len(self._items) >= self.maxsize
+            if dropped:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify_all()
+            return not dropped
+
+    def get(self, timeout: float = 0.5):
+        """Siguiente elemento, o None si se agota el tiempo o la cola está cerrada y vacía"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._items:
+                remaining = deadline - time.monotonic()
+                if self._closed or remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            item = self._items.popleft()
+            # Despertar a un put() que espera sitio
+            self._cond.notify_all()
+            return item
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
+
+
+class StageStats:
+    """
+    Utilización de una etapa: fracción del tiempo ocupada (no esperando su entrada),
+    como media móvil exponencial por elemento, y duración media de cada elemento.
+    """
+    def __init__(self, name: str, placement: str = 'thread', alpha: float = 0.1):
+        self.name = name
+        self.placement = placement
+        self.alpha = alpha
+        self.items = 0
+        self.errors = 0
+        self.busy_ms = 0.0
+        self.utilization = 0.0
+
+    def record(self, busy: float, idle: float):
+        """Registra un elemento: segundos ocupada y segundos esperando antes de recibirlo"""
+        busy_ms = busy * 1000
+        fraction = busy / (busy + idle) if busy + idle > 0 else 0.0
+        if self.items == 0:
+            self.busy_ms, self.utilization = busy_ms, fraction
+        else:
+            self.busy_ms += self.alpha * (busy_ms - self.busy_ms)
+            self.utilization += self.alpha * (fraction - self.utilization)
+        self.items += 1
+
+    def stats(self) -> Dict:
+        return {
+            "placement": self.placement,
+            "items": self.items,
+            "errors": self.errors,
+            "busy_ms": round(self.busy_ms, 2),
+            "utilization": round(self.utilization, 3),
+        }
+
+
+class PipelineStage:
+    """
+    Etapa con hilo propio: toma elementos de su cola de entrada, aplica `func` y entrega
+    el resultado (si no es None) a la cola de la etapa siguiente. Un error en un elemento
+    se registra y se descarta ese elemento, sin detener la etapa.
+    """
+    def __init__(self, name: str, func: Callable, inbox: HandoffQueue,
+                 outbox: Optional[HandoffQueue] = None, placement: str = 'thread'):
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stats = StageStats(name, placement)
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        idle_since = time.perf_counter()
+        while self._running:
+            item = self.inbox.get(timeout=0.5)
+            if item is None:
+                continue
+            start = time.perf_counter()
+            try:
+                output = self.func(item)
+            except Exception as e:
+                self.stats.errors += 1
+                logger.error(f"Error en la etapa '{self.name}' del pipeline: {e}")
+                output = None
+            end = time.perf_counter()
+            self.stats.record(end - start, start - idle_since)
+            idle_since = end
+            if output is not None and self.outbox is not None:
+                self.outbox.put(output)
+
+    def stop(self, timeout: float = 2.0):
+        self._running = False
+        self.inbox.close()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+
+class Pipeline:
+    """
+    Etapas encadenadas por colas acotadas que descartan lo más antiguo (salvo las etapas
+    añadidas con `lossless=True`): cada etapa trabaja en paralelo con las demás, así que el
+    ritmo lo marca la etapa más lenta y no la suma de todas. La primera etapa (la captura)
+    la ejecuta quien llama a submit(); sus tiempos se registran con source.record().
+    """
+    def __init__(self, source: str = 'capture', queue_size: int = 2, source_placement: str = 'thread'):
+        self.queue_size = queue_size
+        self.source = StageStats(source, source_placement)
+        self.inbox = HandoffQueue(queue_size)
+        self.stages: List[PipelineStage] = []
+
+    def add(self, name: str, func: Callable, placement: str = 'thread', lossless: bool = False) -> 'Pipeline':
+        """
+        Añade una etapa al final, alimentada por la salida de la anterior. Con `lossless`
+        su cola de entrada no descarta: la etapa anterior espera a que haya sitio.
+        """
+        if self.stages:
+            inbox = self.stages[-1].outbox = HandoffQueue(self.queue_size, drop_oldest=not lossless)
+        else:
+            inbox = self.inbox
+        self.stages.append(PipelineStage(name, func, inbox, placement=placement))
+        return self
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def submit(self, item) -> bool:
+        """Entrega un elemento a la primera etapa. False si desplazó a uno sin procesar."""
+        return self.inbox.put(item)
+
+    def stop(self):
+        # De la última a la primera: cerrar antes la cola sin descartes libera a quien espera en put()
+        for stage in reversed(self.stages):
+            stage.stop()
+
+    def stats(self) -> Dict:
+        """Por etapa: ubicación, elementos, errores, ms por elemento, utilización y su cola de entrada"""
+        stages = {self.source.name: self.source.stats()}
+        for stage in self.stages:
+            stages[stage.name] = {**stage.stats.stats(),
+                                  "queue_depth": stage.inbox.depth(),
+                                  "queue_dropped": stage.inbox.dropped}
+        return {"queue_size": self.queue_size, "stages": stages}
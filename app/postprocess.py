@@ -0,0 +1,83 @@
+import numpy as np
+from typing import Dict, Tuple
+
+_EMPTY_XYXY = np.zeros((0, 4), dtype=np.float32)
+_EMPTY = np.zeros((0,), dtype=np.float32)
+
+
+class DetectionSummary:
+    """Resultado compacto del post-procesado de un frame."""
+    __slots__ = ('pizza', 'blister', 'conf_pizza', 'conf_blister', 'num_boxes', 'num_inside')
+
+    def __init__(self, pizza=False, blister=False, conf_pizza=0.0, conf_blister=0.0, num_boxes=0, num_inside=0):
+        self.pizza = pizza
+        self.blister = blister
+        self.conf_pizza = conf_pizza  # Porcentaje con 1 decimal
+        self.conf_blister = conf_blister
+        self.num_boxes = num_boxes
+        self.num_inside = num_inside
+
+    def as_dict(self) -> Dict:
+        """Formato de diccionario usado por el estado compartido y los endpoints"""
+        return {'pizza': self.pizza, 'blister': self.blister,
+                'conf_pizza': self.conf_pizza, 'conf_blister': self.conf_blister}
+
+
+def _to_numpy(values):
+    if hasattr(values, 'cpu'):
+        values = values.cpu()
+    return np.asarray(values)
+
+
+def boxes_data(boxes) -> np.ndarray:
+    """
+    Filas de boxes.data en memoria del host con una sola transferencia:
+    [x1, y1, x2, y2, (track_id), conf, cls]; 7 columnas cuando hay ids de track.
+    """
+    return _to_numpy(boxes.data)
+
+
+def boxes_to_numpy(boxes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Copia a memoria del host las clases, confianzas y coordenadas de todas las cajas
+    con una sola transferencia: (cls[N], conf[N], xyxy[N, 4]).
+    """
+    if boxes is None or len(boxes) == 0:
+        return _EMPTY, _EMPTY, _EMPTY_XYXY
+    # Filas de boxes.data: [x1, y1, x2, y2, (track_id), conf, cls]
+    data = boxes_data(boxes)
+    return data[:, -1], data[:, -2], data[:, :4]
+
+
+def inside_area_mask(xyxy: np.ndarray, area: Tuple[int, int, int, int]) -> np.ndarray:
+    """Máscara de las cajas que están completamente dentro del área (x1, y1, x2, y2)"""
+    ax1, ay1, ax2, ay2 = area
+    return ((xyxy[:, 0] >= ax1) & (xyxy[:, 1] >= ay1) &
+            (xyxy[:, 2] <= ax2) & (xyxy[:, 3] <= ay2))
+
+
+def _best_conf(conf: np.ndarray, mask: np.ndarray) -> float:
+    return round(float(conf[mask].max()) * 100, 1) if mask.any() else 0.0
+
+
+def summarize_detections(boxes, area: Tuple[int, int, int, int],
+                         pizza_class_id: int, blister_class_id: int) -> DetectionSummary:
+    """
+    Post-procesado vectorizado de las cajas de un frame: presencia de pizza y blister
+    dentro del área de inspección y la mejor confianza de cada clase.
+    """
+    cls, conf, xyxy = boxes_to_numpy(boxes)
+    if len(xyxy) == 0:
+        return DetectionSummary()
+
+    inside = inside_area_mask(xyxy, area)
+    pizza_mask = inside & (cls == pizza_class_id)
+    blister_mask = inside & (cls == blister_class_id)
+    return DetectionSummary(
+        pizza=bool(pizza_mask.any()),
+        blister=bool(blister_mask.any()),
+        conf_pizza=_best_conf(conf, pizza_mask),
+        conf_blister=_best_conf(conf, blister_mask),
+        num_boxes=len(xyxy),
+        num_inside=int(inside.sum()),
+    )
@@ -0,0 +1,158 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+
+class PulseScheduler:
+    """
+    Planificador de pulsos OPC-UA con un único hilo y una cola acotada.
+    Cada pulso se traduce en dos escrituras programadas (flanco de subida y de bajada)
+    en lugar de ocupar un hilo con sleep entre ambas. Por nodo se garantiza el orden
+    de los pulsos, la anchura mínima del pulso y una separación mínima entre el flanco
+    de bajada de uno y el de subida del siguiente.
+    Los flancos que vencen a la vez en nodos distintos se escriben en una sola llamada.
+    """
+    def __init__(self, writer: Callable[[List[Tuple[str, bool]]], bool], pulse_width: float = 0.1,
+                 min_gap: float = 0.1, max_queue: int = 64, batch_window: float = 0.005):
+        self._writer = writer  # writer([(node_id, valor), ...]) -> True si la escritura tuvo éxito
+        self.pulse_width = pulse_width
+        self.min_gap = min_gap
+        self.max_queue = max_queue
+        self.batch_window = batch_window  # Flancos que vencen dentro de esta ventana van en el mismo lote
+        self._heap = []  # (instante, orden, node_id, valor, label, detectado_en)
+        self._order = itertools.count()
+        self._next_free: Dict[str, float] = {}  # Primer instante libre para el siguiente flanco de subida de cada nodo
+        self._cond = threading.Condition()
+        self._running = True
+        self._pending_pulses = 0
+
+        # Estadísticas
+        self.pulses_submitted = 0
+        self.pulses_dropped = 0
+        self.pulses_completed = 0
+        self.writes_failed = 0
+        self.batches = 0
+        self.edges_written = 0
+        self.last_latency_ms = 0.0  # Desde la detección del flanco hasta la escritura del flanco de subida
+        self.max_latency_ms = 0.0
+        self._latency_total_ms = 0.0
+        self._latency_samples = 0
+
+        self._thread = threading.Thread(target=self._run, name="opcua-pulses", daemon=True)
+        self._thread.start()
+
+    def submit(self, node_id: str, label: str = "", detected_at: Optional[float] = None) -> bool:
+        """
+        Programa un pulso en el nodo. No bloquea. Devuelve False si la cola está llena.
+        `detected_at` (time.monotonic) es el instante en que se detectó el flanco.
+        """
+        detected_at = detected_at if detected_at is not None else time.monotonic()
+        with self._cond:
+            if not self._running:
+                return False
+            if self._pending_pulses >= self.max_queue:
+                self.pulses_dropped += 1
+                logger.warning(f"⚠️ Cola de pulsos llena ({self.max_queue}), pulso {label} descartado")
+                return False
+
+            rise_at = max(time.monotonic(), self._next_free.get(node_id, 0.0))
+            fall_at = rise_at + self.pulse_width
+            self._next_free[node_id] = fall_at + self.min_gap
+            heapq.heappush(self._heap, (rise_at, next(self._order), node_id, True, label, detected_at))
+            heapq.heappush(self._heap, (fall_at, next(self._order), node_id, False, label, detected_at))
+            self._pending_pulses += 1
+            self.pulses_submitted += 1
+            self._cond.notify()
+        return True
+
+    def _next_batch(self) -> List[Tuple]:
+        """Saca del heap los flancos vencidos, como mucho uno por nodo para conservar el orden"""
+        limit = time.monotonic() + self.batch_window
+        batch, nodes = [], set()
+        while self._heap and self._heap[0][0] <= limit and self._heap[0][2] not in nodes:
+            edge = heapq.heappop(self._heap)
+            nodes.add(edge[2])
+            batch.append(edge)
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Tras stop(flush=True) se sigue esperando a que venza cada flanco programado
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    if not self._running and not self._heap:
+                        return
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                batch = self._next_batch()
+            if not batch:
+                continue
+
+            # Escribir fuera del lock para que submit() nunca espere a la red
+            try:
+                ok = self._writer([(node_id, value) for _, _, node_id, value, _, _ in batch])
+            except Exception as e:
+                logger.error(f"❌ Error al escribir flancos de pulso: {e}")
+                ok = False
+            written_at = time.monotonic()
+            self.batches += 1
+            self.edges_written += len(batch)
+            if not ok:
+                self.writes_failed += 1
+
+            for _, _, node_id, value, label, detected_at in batch:
+                if value:
+                    self._record_latency((written_at - detected_at) * 1000)
+                    continue
+                with self._cond:
+                    self._pending_pulses -= 1
+                    self.pulses_completed += 1
+                if ok:
+                    logger.info(f"✅ Pulso {label} enviado correctamente")
+                else:
+                    logger.warning(f"⚠️ No se pudo enviar pulso {label}")
+
+    def _record_latency(self, ms: float):
+        self.last_latency_ms = ms
+        self.max_latency_ms = max(self.max_latency_ms, ms)
+        self._latency_total_ms += ms
+        self._latency_samples += 1
+
+    def queue_depth(self) -> int:
+        """Pulsos pendientes (programados y aún sin flanco de bajada)"""
+        return self._pending_pulses
+
+    def stats(self) -> Dict:
+        samples = self._latency_samples
+        return {
+            "queue_depth": self._pending_pulses,
+            "max_queue": self.max_queue,
+            "pulses_submitted": self.pulses_submitted,
+            "pulses_completed": self.pulses_completed,
+            "pulses_dropped": self.pulses_dropped,
+            "writes_failed": self.writes_failed,
+            "edges_per_batch": round(self.edges_written / self.batches, 2) if self.batches else 0.0,
+            "last_latency_ms": round(self.last_latency_ms, 2),
+            "avg_latency_ms": round(self._latency_total_ms / samples, 2) if samples else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 2),
+        }
+
+    def stop(self, flush: bool = True, timeout: float = 2.0):
+        """
+        Detiene el hilo. Con flush=True se escriben antes los flancos ya programados, cada
+        uno a su hora, y se espera al último (más `timeout` para la escritura) para no dejar
+        ningún nodo a True.
+        """
+        with self._cond:
+            if not flush:
+                self._heap.clear()
+            self._running = False
+            last_edge = max((edge[0] for edge in self._heap), default=time.monotonic())
+            self._cond.notify()
+        self._thread.join(timeout=max(last_edge - time.monotonic(), 0.0) + timeout)
@@ -0,0 +1,270 @@
+import cv2
+import json
+import logging
+import mmap
+import os
+import queue
+import threading
+import time
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+FRAMES_FILE = 'frames.bin'
+INDEX_FILE = 'index.bin'
+META_FILE = 'meta.json'
+
+# Registro de tamaño fijo por frame en index.bin: dónde está el frame en frames.bin, su
+# forma, lo que se detectó y cuántos pulsos de cada tipo se enviaron al PLC en ese frame
+# (con el conteo por tracks varias pizzas pueden contarse en el mismo frame)
+INDEX_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('timestamp', '<f8'),
+    ('offset', '<u8'),
+    ('length', '<u4'),
+    ('height', '<u2'),
+    ('width', '<u2'),
+    ('channels', 'u1'),
+    ('pizza', 'u1'),
+    ('blister', 'u1'),
+    ('pulses_sin_blister', 'u1'),
+    ('pulses_con_blister', 'u1'),
+    ('conf_pizza', '<f4'),
+    ('conf_blister', '<f4'),
+])
+
+
+def is_recording(path) -> bool:
+    """True si la ruta es un directorio de grabación (se puede usar como fuente de vídeo)"""
+    return isinstance(path, (str, os.PathLike)) and os.path.isfile(os.path.join(path, META_FILE))
+
+
+class FrameRecorder:
+    """
+    Graba los frames del loop de detección en un almacén compacto: frames.bin con los
+    frames seguidos (BGR sin comprimir o JPEG) e index.bin con un registro fijo por frame
+    (timestamp, flags de detección y pulso al PLC). La codificación y la escritura las hace
+    un hilo propio; record() nunca bloquea y, si la cola está llena, el frame se descarta.
+    """
+    def __init__(self, directory, encoding: str = 'jpeg', jpeg_quality: int = 90,
+                 queue_size: int = 64, max_bytes: int = 0, camera_id: Optional[str] = None):
+        if encoding not in ('raw', 'jpeg'):
+            raise ValueError(f"Codificación de grabación no soportada: {encoding}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = str(directory)
+        self.encoding = encoding
+        self.jpeg_quality = jpeg_quality
+        self.max_bytes = max_bytes  # 0 = sin límite
+        with open(os.path.join(self.directory, META_FILE), 'w') as f:
+            json.dump({"version": FORMAT_VERSION, "encoding": encoding, "camera_id": camera_id,
+                       "created": time.time()}, f)
+        self._frames = open(os.path.join(self.directory, FRAMES_FILE), 'ab')
+        self._index = open(os.path.join(self.directory, INDEX_FILE), 'ab')
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+
+        # Estadísticas
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.bytes_written = self._frames.tell()
+        self.full = False
+
+        self._thread = threading.Thread(target=self._run, name="frame-recorder", daemon=True)
+        self._thread.start()
+        logger.info(f"Grabación iniciada en {self.directory} ({encoding})")
+
+    def record(self, captured, detections: Dict, events: Sequence[str] = ()) -> bool:
+        """Encola un frame capturado con sus detecciones y los pulsos emitidos (uno por pizza). No bloquea."""
+        if self._closed or self.full:
+            return False
+        try:
+            self._queue.put_nowait((captured, detections, tuple(events)))
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(*item)
+            except Exception as e:
+                logger.error(f"Error al grabar frame en {self.directory}: {e}")
+                self.frames_dropped += 1
+        self._frames.close()
+        self._index.close()
+
+    def _write(self, captured, detections, events):
+        frame = captured.frame
+        if self.encoding == 'jpeg':
+            ok, payload = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                raise ValueError("no se pudo codificar el frame")
+        else:
+            payload = np.ascontiguousarray(frame)
+
+        if self.max_bytes and self.bytes_written + payload.nbytes > self.max_bytes:
+            self.full = True
+            logger.warning(f"Grabación {self.directory} llena ({self.max_bytes} bytes), se detiene")
+            return
+
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record['seq'] = captured.seq
+        record['timestamp'] = captured.timestamp
+        record['offset'] = self.bytes_written
+        record['length'] = payload.nbytes
+        record['height'], record['width'] = frame.shape[:2]
+        record['channels'] = frame.shape[2] if frame.ndim == 3 else 1
+        record['pizza'] = detections.get('pizza', False)
+        record['blister'] = detections.get('blister', False)
+        # Eventos como EVENT_* de app.camera_manager
+        record['pulses_sin_blister'] = min(events.count('sin_blister'), 255)
+        record['pulses_con_blister'] = min(events.count('con_blister'), 255)
+        record['conf_pizza'] = detections.get('conf_pizza', 0.0)
+        record['conf_blister'] = detections.get('conf_blister', 0.0)
+
+        self._frames.write(payload.data)
+        self.bytes_written += payload.nbytes
+        self.frames_written += 1
+        # Primero los datos y luego el índice: un lector nunca ve un registro sin su frame
+        if self._queue.empty():
+            self._frames.flush()
+        self._index.write(record.tobytes())
+        if self._queue.empty():
+            self._index.flush()
+
+    def stats(self) -> Dict:
+        return {
+            "directory": self.directory,
+            "encoding": self.encoding,
+            "frames_written": self.frames_written,
+            "frames_dropped": self.frames_dropped,
+            "queue_depth": self._queue.qsize(),
+            "bytes_written": self.bytes_written,
+            "full": self.full,
+        }
+
+    def close(self, timeout: float = 5.0):
+        """Escribe lo pendiente y cierra los ficheros"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout=timeout)
+        logger.info(f"Grabación cerrada en {self.directory}: {self.frames_written} frames")
+
+
+class RecordingReader:
+    """
+    Lectura de una grabación. frames.bin se mapea en memoria: los frames sin comprimir se
+    devuelven como vistas de solo lectura sobre el mapa (sin copia) y los JPEG se decodifican
+    directamente desde él. El índice también se mapea en memoria.
+    """
+    def __init__(self, directory):
+        self.directory = str(directory)
+        with open(os.path.join(self.directory, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.encoding = self.meta['encoding']
+
+        self._file = open(os.path.join(self.directory, FRAMES_FILE), 'rb')
+        data_size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if data_size else b''
+
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize if os.path.exists(index_path) else 0
+        index = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(count,)) if count else \
+            np.zeros(0, dtype=INDEX_DTYPE)
+        # Descartar registros cuyo frame no llegó a escribirse por completo
+        valid = int(np.searchsorted(index['offset'] + index['length'], data_size, side='right')) if count else 0
+        self.index = index[:valid]
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def entry(self, i: int) -> Dict:
+        """Metadatos del frame i: secuencia, timestamp, flags y pulsos emitidos por tipo"""
+        rec = self.index[i]
+        return {
+            "seq": int(rec['seq']),
+            "timestamp": float(rec['timestamp']),
+            "pizza": bool(rec['pizza']),
+            "blister": bool(rec['blister']),
+            "conf_pizza": float(rec['conf_pizza']),
+            "conf_blister": float(rec['conf_blister']),
+            "pulses": {"sin_blister": int(rec['pulses_sin_blister']),
+                       "con_blister": int(rec['pulses_con_blister'])},
+        }
+
+    def frame(self, i: int) -> np.ndarray:
+        """Frame i: vista sin copia (raw, solo lectura) o imagen decodificada (JPEG)"""
+        rec = self.index[i]
+        buffer = np.frombuffer(self._data, dtype=np.uint8, count=int(rec['length']), offset=int(rec['offset']))
+        if self.encoding == 'jpeg':
+            return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        shape = (int(rec['height']), int(rec['width']), int(rec['channels']))
+        return buffer.reshape(shape if shape[2] > 1 else shape[:2])
+
+    def fps(self) -> float:
+        """Frecuencia de grabación estimada a partir de los timestamps"""
+        if len(self.index) < 2:
+            return 0.0
+        intervals = np.diff(np.asarray(self.index['timestamp']))
+        intervals = intervals[intervals > 0]
+        return float(1.0 / np.median(intervals)) if intervals.size else 0.0
+
+    def close(self):
+        # Las vistas devueltas por frame() mantienen vivo el mapa hasta que se liberan
+        self.index = self.index[:0]
+        self._file.close()
+
+
+class ReplayCapture:
+    """
+    Fuente de vídeo sobre una grabación con la interfaz de cv2.VideoCapture que usa
+    FrameGrabber (isOpened, read, get, set, release), para reproducirla como una cámara.
+    """
+    def __init__(self, directory):
+        try:
+            self.reader = RecordingReader(directory)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"No se pudo abrir la grabación {directory}: {e}")
+            self.reader = None
+        self.position = 0
+
+    def isOpened(self) -> bool:
+        return self.reader is not None and len(self.reader) > 0
+
+    def read(self):
+        if self.reader is None or self.position >= len(self.reader):
+            return False, None
+        frame = self.reader.frame(self.position)
+        self.position += 1
+        return frame is not None, frame
+
+    def get(self, prop_id) -> float:
+        if self.reader is None:
+            return 0.0
+        if prop_id == cv2.CAP_PROP_FPS:
+            return self.reader.fps()
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.reader))
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        return 0.0
+
+    def set(self, prop_id, value) -> bool:
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            self.position = max(int(value), 0)
+            return True
+        return False
+
+    def release(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
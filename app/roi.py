@@ -0,0 +1,75 @@
+from typing import Tuple
+
+# Múltiplo de tamaño de entrada que exige YOLO (stride máximo de la red)
+MODEL_STRIDE = 32
+
+
+def inspection_area(frame_shape) -> Tuple[int, int, int, int]:
+    """
+    Coordenadas del área de inspección (recuadro verde) para un frame de la forma dada: (x1, y1, x2, y2)
+    """
+    h, w = frame_shape[:2]
+    x1, y1 = w // 2 - 260, h // 2 - 165
+    x2, y2 = w // 2 + 160, h // 2 + 165
+    return x1, y1, x2, y2
+
+
+def crop_bounds(area: Tuple[int, int, int, int], frame_shape, margin: int) -> Tuple[int, int, int, int]:
+    """Área ampliada con un margen y recortada a los límites del frame: (x1, y1, x2, y2)"""
+    h, w = frame_shape[:2]
+    x1, y1, x2, y2 = area
+    return max(x1 - margin, 0), max(y1 - margin, 0), min(x2 + margin, w), min(y2 + margin, h)
+
+
+def roi_imgsz(bounds: Tuple[int, int, int, int]) -> int:
+    """
+    Tamaño de entrada para inferir sobre el recorte: su lado mayor redondeado al stride.
+    Así el modelo procesa menos píxeles en vez de reescalar el recorte hasta 640.
+    """
+    x1, y1, x2, y2 = bounds
+    side = max(x2 - x1, y2 - y1)
+    return max(((side + MODEL_STRIDE - 1) // MODEL_STRIDE) * MODEL_STRIDE, MODEL_STRIDE)
+
+
+def predict_frames(model, frames, areas, config):
+    """
+    Ejecuta YOLO sobre un lote de frames (uno por cámara) en una sola llamada y devuelve
+    un resultado por frame. Con INFERENCE_ROI activo solo se infiere sobre el área de
+    inspección de cada frame más un margen, y las cajas se trasladan a coordenadas del
+    frame completo para que el resto del proceso no note la diferencia.
+    """
+    conf = config['CONF_THRESHOLD']
+    if not config.get('INFERENCE_ROI', False):
+        # Mismo tamaño de entrada con el que se exportó el backend (ver app.model_backends)
+        return model.predict(frames, conf=conf, imgsz=config.get('MODEL_IMGSZ', 640))
+
+    margin = config.get('INFERENCE_ROI_MARGIN', 32)
+    bounds = [crop_bounds(area, frame.shape, margin) for frame, area in zip(frames, areas)]
+    crops = [frame[y1:y2, x1:x2] for frame, (x1, y1, x2, y2) in zip(frames, bounds)]
+    results = model.predict(crops, conf=conf, imgsz=max(roi_imgsz(b) for b in bounds))
+    for result, frame, (x1, y1, _, _) in zip(results, frames, bounds):
+        map_result_to_frame(result, frame, (x1, y1))
+    return results
+
+
+def map_result_to_frame(result, frame, offset: Tuple[int, int]):
+    """
+    Traslada las cajas de un resultado obtenido sobre un recorte a coordenadas del frame completo
+    y sustituye la imagen original, de modo que `plot()` y el post-procesado trabajen sobre el frame.
+    """
+    dx, dy = offset
+    result.orig_img = frame
+    result.orig_shape = frame.shape[:2]
+    boxes = result.boxes
+    if boxes is None:
+        return result
+
+    data = boxes.data.clone() if hasattr(boxes.data, 'clone') else boxes.data.copy()
+    if len(data):
+        data[:, 0] += dx
+        data[:, 2] += dx
+        data[:, 1] += dy
+        data[:, 3] += dy
+    # update() recrea las cajas con la forma del frame completo
+    result.update(boxes=data)
+    return result
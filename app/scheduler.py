@@ -0,0 +1,119 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+
+class RateMeter:
+    """Eventos por segundo en una ventana de los últimos `window` eventos (thread-safe)"""
+    def __init__(self, window: int = 120):
+        self._ticks = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def tick(self):
+        with self._lock:
+            self._ticks.append(time.perf_counter())
+
+    def rate(self) -> float:
+        with self._lock:
+            if len(self._ticks) < 2:
+                return 0.0
+            span = self._ticks[-1] - self._ticks[0]
+            return (len(self._ticks) - 1) / span if span > 0 else 0.0
+
+
+class FrameScheduler:
+    """
+    Marca el ritmo del loop de detección con un objetivo de inferencias por segundo.
+    Cada ciclo (captura + inferencia + post-procesado) se mide y solo se duerme lo que
+    falta hasta el siguiente instante de la rejilla; si un ciclo se pasa de plazo, los
+    instantes perdidos se descartan en lugar de intentar recuperarlos.
+    Con target_fps = 0 no se duerme nunca (modo de máximo rendimiento para benchmarks).
+    `observer(etapa, segundos)` recibe además cada medida (p. ej. los histogramas de /metrics).
+    """
+    def __init__(self, target_fps: float = 0.0, window: int = 120,
+                 observer: Optional[Callable[[str, float], None]] = None):
+        self.target_fps = target_fps
+        self.period = 1.0 / target_fps if target_fps and target_fps > 0 else 0.0
+        self._next_deadline = None
+        self._cycle_start = 0.0
+        self._cycle_ends = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.cycles = 0
+        self.deadline_misses = 0
+        self.frames_dropped = 0  # Instantes de la rejilla descartados por sobrecarga
+        self.stage_ms: Dict[str, float] = {}  # Media móvil exponencial por etapa
+        self.cycle_ms = 0.0
+        self._observer = observer
+
+    @property
+    def max_throughput(self) -> bool:
+        return self.period == 0.0
+
+    def begin(self):
+        """Marca el inicio de un ciclo"""
+        self._cycle_start = time.perf_counter()
+        if self._next_deadline is None:
+            self._next_deadline = self._cycle_start
+
+    @contextmanager
+    def stage(self, name: str):
+        """Mide la duración de una etapa del ciclo"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, (time.perf_counter() - start) * 1000)
+
+    def _record(self, name: str, ms: float, alpha: float = 0.1):
+        previous = self.stage_ms.get(name)
+        self.stage_ms[name] = ms if previous is None else previous + alpha * (ms - previous)
+        if self._observer is not None:
+            self._observer(name, ms / 1000)
+
+    def end(self):
+        """Cierra el ciclo y duerme lo necesario para mantener el ritmo objetivo"""
+        now = time.perf_counter()
+        elapsed = now - self._cycle_start
+        self.cycle_ms = elapsed * 1000 if not self.cycles else self.cycle_ms + 0.1 * (elapsed * 1000 - self.cycle_ms)
+        with self._lock:
+            self.cycles += 1
+            self._cycle_ends.append(now)
+
+        if self.max_throughput:
+            return
+
+        self._next_deadline += self.period
+        if now > self._next_deadline:
+            # Sobrecarga: saltar los instantes ya vencidos en vez de acumular retraso
+            missed = math.ceil((now - self._next_deadline) / self.period)
+            self.deadline_misses += 1
+            self.frames_dropped += missed
+            self._next_deadline += missed * self.period
+        time.sleep(max(self._next_deadline - now, 0.0))
+
+    def reset(self):
+        """Reinicia la rejilla (p. ej. tras una espera sin frames) para no contar esa pausa como retraso"""
+        self._next_deadline = None
+
+    def achieved_fps(self) -> float:
+        """Ciclos por segundo en la ventana reciente"""
+        with self._lock:
+            if len(self._cycle_ends) < 2:
+                return 0.0
+            span = self._cycle_ends[-1] - self._cycle_ends[0]
+            return (len(self._cycle_ends) - 1) / span if span > 0 else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "target_fps": self.target_fps,
+            "max_throughput": self.max_throughput,
+            "achieved_fps": round(self.achieved_fps(), 2),
+            "cycles": self.cycles,
+            "deadline_misses": self.deadline_misses,
+            "frames_dropped": self.frames_dropped,
+            "cycle_ms": round(self.cycle_ms, 2),
+            "stage_ms": {name: round(ms, 2) for name, ms in self.stage_ms.items()},
+        }
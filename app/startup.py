@@ -0,0 +1,70 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+
+def process_start_time() -> float:
+    """Instante (epoch) en que arrancó el proceso, según /proc; si no se puede leer, ahora"""
+    try:
+        with open('/proc/self/stat') as f:
+            # El campo 22 (starttime) va después del nombre del ejecutable, que puede tener espacios
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class StartupTimer:
+    """
+    Fases del arranque medidas desde el inicio del proceso: cada mark() registra el
+    instante en que terminó una fase y lo escribe en el log. La fase 'first_detection'
+    cierra el arranque y se compara con el objetivo de tiempo hasta la primera detección.
+    """
+    def __init__(self, started: Optional[float] = None):
+        self.started = process_start_time() if started is None else started
+        self.target_seconds = 0.0  # 0 = sin objetivo
+        self._phases: Dict[str, float] = {}  # Fase -> segundos desde el inicio del proceso
+        self._lock = threading.Lock()
+
+    def mark(self, phase: str) -> float:
+        """Registra el fin de una fase (solo la primera vez). Devuelve los segundos desde el inicio."""
+        elapsed = time.time() - self.started
+        with self._lock:
+            if phase in self._phases:
+                return self._phases[phase]
+            self._phases[phase] = elapsed
+        logger.info(f"Arranque: {phase} a los {elapsed:.2f}s")
+        if phase == 'first_detection':
+            logger.info("Fases del arranque: " + ", ".join(f"{name}={seconds:.2f}s"
+                                                           for name, seconds in self.phases().items()))
+        if phase == 'first_detection' and self.target_seconds:
+            if elapsed > self.target_seconds:
+                logger.warning(f"Primera detección a los {elapsed:.2f}s, por encima del objetivo "
+                               f"de {self.target_seconds:.0f}s")
+            else:
+                logger.info(f"Primera detección dentro del objetivo de {self.target_seconds:.0f}s")
+        return elapsed
+
+    def done(self, phase: str) -> bool:
+        with self._lock:
+            return phase in self._phases
+
+    def phases(self) -> Dict[str, float]:
+        """Segundos desde el inicio del proceso hasta el fin de cada fase, en orden"""
+        with self._lock:
+            return {phase: round(seconds, 3) for phase, seconds in self._phases.items()}
+
+    def time_to_first_detection(self) -> Optional[float]:
+        with self._lock:
+            return self._phases.get('first_detection')
+
+
+# Arranque de este proceso
+STARTUP = StartupTimer()
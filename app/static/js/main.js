@@ -2,15 +2,29 @@ console.log("Versión: 1.0.1"); // Para verificar que se cargó la nueva versió
 
 const videoElement = document.getElementById('videoStream');
 
+let videoObjectUrl = null;
+
+// Mensajes binarios: cabecera (versión u8, flags u8, tamaño de cabecera u16, secuencia u64) + JPEG
 function startVideoStream() {
-    const socket = new WebSocket('ws://localhost:5000/video_feed');
+    const protocol = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+    const socket = new WebSocket(`${protocol}${window.location.host}/video_feed`);
+    socket.binaryType = 'arraybuffer';
 
     socket.onmessage = function(event) {
-        const image = new Image();
-        image.src = URL.createObjectURL(event.data);
-        image.onload = function() {
-            videoElement.src = image.src;
-        };
+        const view = new DataView(event.data);
+        const headerSize = view.getUint16(2, true);
+        // Confirmar al recibir, con la secuencia: confirma también los anteriores, así que
+        // un frame que no llega a pintarse no deja huecos ocupados en el servidor
+        if (socket.readyState === WebSocket.OPEN) {
+            socket.send(`ack:${view.getBigUint64(4, true)}`);
+        }
+        const url = URL.createObjectURL(new Blob([event.data.slice(headerSize)], { type: 'image/jpeg' }));
+        // Liberar la imagen anterior al sustituirla, se haya llegado a cargar o no
+        if (videoObjectUrl) {
+            URL.revokeObjectURL(videoObjectUrl);
+        }
+        videoObjectUrl = url;
+        videoElement.src = url;
     };
 
     socket.onclose = function() {
@@ -21,6 +35,7 @@ function startVideoStream() {
 window.onload = function() {
     startVideoStream();
     updateStatus();
+    startStatusStream();
 };
 
 // Variables globales para el estado del PLC
@@ -28,59 +43,93 @@ let plcLastKnownStatus = false;
 let plcStatusConfirmationCount = 0;
 const PLC_STATUS_CONFIRMATION_THRESHOLD = 3; // Requiere 3 lecturas consecutivas para cambiar el estado
 
+// Estado completo: último snapshot del stream SSE con los deltas aplicados
+let statusState = null;
+
+function mergeStatus(target, delta) {
+    for (const [key, value] of Object.entries(delta)) {
+        if (value && typeof value === 'object' && !Array.isArray(value) &&
+            target[key] && typeof target[key] === 'object') {
+            mergeStatus(target[key], value);
+        } else {
+            target[key] = value;
+        }
+    }
+    return target;
+}
+
+// El servidor empuja el estado solo cuando cambia (SSE); sin EventSource se consulta /status
+function startStatusStream() {
+    if (!window.EventSource) {
+        setInterval(updateStatus, 2000);
+        return;
+    }
+    const source = new EventSource('/status/stream');
+    source.addEventListener('snapshot', function(event) {
+        statusState = JSON.parse(event.data);
+        renderStatus(statusState, true);
+    });
+    source.addEventListener('delta', function(event) {
+        if (statusState) {
+            renderStatus(mergeStatus(statusState, JSON.parse(event.data)), true);
+        }
+    });
+    source.onerror = function(error) {
+        console.error('Error en el stream de estado:', error);
+    };
+}
+
 function updateStatus() {
     fetch('/status')
         .then(response => response.json())
-        .then(data => {
-            console.log("Datos recibidos:", data);
-            
-            // Actualizar estado PLC con histéresis para evitar parpadeo
-            const plcStatus = document.getElementById('plc-status');
-            if (plcStatus) {
-                const currentStatus = data.opcua_connected;
-                
-                // Lógica de histéresis - solo cambia el estado después de varias confirmaciones
-                if (currentStatus === plcLastKnownStatus) {
-                    // Estado estable, mantener contador en 0
-                    plcStatusConfirmationCount = 0;
-                } else {
-                    // Estado diferente del último conocido, incrementar contador
-                    plcStatusConfirmationCount++;
-                    
-                    // Solo cambiar el estado visual después de superar el umbral
-                    if (plcStatusConfirmationCount >= PLC_STATUS_CONFIRMATION_THRESHOLD) {
-                        // Actualizar el estado visual
-                        plcLastKnownStatus = currentStatus;
-                        plcStatusConfirmationCount = 0;
-                        
-                        // Aplicar el cambio visual
-                        if (currentStatus) {
-                            plcStatus.innerHTML = '<span class="status-indicator connected"></span>Conectado';
-                            plcStatus.className = 'status-value connected';
-                        } else {
-                            plcStatus.innerHTML = '<span class="status-indicator disconnected"></span>Desconectado';
-                            plcStatus.className = 'status-value disconnected';
-                        }
-                    }
-                    // Si no supera el umbral, mantener el estado visual anterior
-                }
-            }
-            
-            // Resto del código de actualización...
-            // Actualizar contadores usando los datos de last_detection
-            if (data.last_detection) {
-                updateCounters(data.last_detection);
-            }
-        })
+        .then(data => renderStatus(data, false))
         .catch(err => {
             console.error('Error al actualizar estado:', err);
         });
 }
 
-// Actualizar con mayor frecuencia
-setInterval(updateStatus, 2000);  // Cada 2 segundos en lugar de 5
-
-// Ejecutar una vez al cargar
-document.addEventListener('DOMContentLoaded', function() {
-    updateStatus();
-});
\ No newline at end of file
+function renderStatus(data, pushed) {
+    console.log("Datos recibidos:", data);
+    
+    // Actualizar estado PLC con histéresis para evitar parpadeo
+    // (los datos empujados por SSE ya son cambios confirmados)
+    const plcStatus = document.getElementById('plc-status');
+    if (plcStatus) {
+        const currentStatus = data.opcua_connected;
+        if (pushed && currentStatus !== plcLastKnownStatus) {
+            plcStatusConfirmationCount = PLC_STATUS_CONFIRMATION_THRESHOLD - 1;
+        }
+        
+        // Lógica de histéresis - solo cambia el estado después de varias confirmaciones
+        if (currentStatus === plcLastKnownStatus) {
+            // Estado estable, mantener contador en 0
+            plcStatusConfirmationCount = 0;
+        } else {
+            // Estado diferente del último conocido, incrementar contador
+            plcStatusConfirmationCount++;
+            
+            // Solo cambiar el estado visual después de superar el umbral
+            if (plcStatusConfirmationCount >= PLC_STATUS_CONFIRMATION_THRESHOLD) {
+                // Actualizar el estado visual
+                plcLastKnownStatus = currentStatus;
+                plcStatusConfirmationCount = 0;
+                
+                // Aplicar el cambio visual
+                if (currentStatus) {
+                    plcStatus.innerHTML = '<span class="status-indicator connected"></span>Conectado';
+                    plcStatus.className = 'status-value connected';
+                } else {
+                    plcStatus.innerHTML = '<span class="status-indicator disconnected"></span>Desconectado';
+                    plcStatus.className = 'status-value disconnected';
+                }
+            }
+            // Si no supera el umbral, mantener el estado visual anterior
+        }
+    }
+    
+    // Resto del código de actualización...
+    // Actualizar contadores usando los datos de last_detection
+    if (data.last_detection && typeof updateCounters === 'function') {
+        updateCounters(data.last_detection);
+    }
+}
\ No newline at end of file
@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Campos que cambian en cada frame: viajan con los eventos pero no los provocan
+VOLATILE_KEYS = frozenset({'timestamp', 'seq', 'conf_pizza', 'conf_blister'})
+
+
+def significant(state):
+    """Copia del estado sin los campos volátiles, para decidir si hubo un cambio real"""
+    if isinstance(state, dict):
+        return {key: significant(value) for key, value in state.items() if key not in VOLATILE_KEYS}
+    return state
+
+
+def diff(old: Dict, new: Dict) -> Dict:
+    """Claves de `new` que difieren de `old`; los diccionarios anidados se comparan por clave"""
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = diff(previous, value)
+            if nested:
+                delta[key] = nested
+        elif value != previous:
+            delta[key] = value
+    return delta
+
+
+def sse_event(event: str, event_id: int, data) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class StatusHub:
+    """
+    Estado de todas las cámaras para los clientes SSE. Un único hilo lo reconstruye cada
+    `interval` segundos mientras haya clientes y sube la versión solo cuando cambian flags,
+    contadores o el estado OPC-UA. Cada cliente recibe un snapshot completo al conectar y
+    cada `snapshot_interval` segundos, y entre medias solo los campos que cambiaron.
+    """
+    def __init__(self, build: Callable[[], Dict], interval: float = 0.1,
+                 snapshot_interval: float = 30.0, keepalive_interval: float = 15.0):
+        self._build = build  # build() -> {id_cámara: estado}
+        self.interval = interval
+        self.snapshot_interval = snapshot_interval
+        self.keepalive_interval = keepalive_interval
+        self._cond = threading.Condition()
+        self._state = None
+        self._significant = None
+        self._version = 0
+        self._clients = 0
+        self._thread = None
+
+        # Estadísticas
+        self.events_sent = 0
+        self.snapshots_sent = 0
+
+    def _ensure_running(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="status-stream", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Sin clientes no se reconstruye nada
+                self._cond.wait_for(lambda: self._clients > 0)
+            try:
+                state = self._build()
+            except Exception as e:
+                logger.error(f"Error al construir el estado para SSE: {e}")
+                time.sleep(self.interval)
+                continue
+            current = significant(state)
+            with self._cond:
+                self._state = state  # Siempre el último, para que los snapshots lleven datos frescos
+                if current != self._significant:
+                    self._significant = current
+                    self._version += 1
+                    self._cond.notify_all()
+            time.sleep(self.interval)
+
+    def stream(self, select: Callable[[Dict], Optional[Dict]]) -> Iterator[str]:
+        """
+        Generador de eventos SSE para un cliente. `select(estado)` extrae del estado de
+        todas las cámaras lo que ve este cliente (None si aún no hay nada que enviar).
+        """
+        self._ensure_running()
+        with self._cond:
+            self._clients += 1
+            self._cond.notify_all()
+        sent = None
+        version = -1
+        last_snapshot = last_event = time.monotonic()
+        try:
+            # Reintento del EventSource del navegador si se corta la conexión
+            yield "retry: 2000\n\n"
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._version != version, timeout=self.keepalive_interval)
+                    version, state = self._version, self._state
+                now = time.monotonic()
+                current = select(state) if state is not None else None
+
+                if current is not None and (sent is None or now - last_snapshot >= self.snapshot_interval):
+                    yield sse_event('snapshot', version, current)
+                    self.snapshots_sent += 1
+                    sent, last_snapshot, last_event = current, now, now
+                    continue
+
+                if current is not None and diff(significant(sent), significant(current)):
+                    yield sse_event('delta', version, diff(sent, current))
+                    self.events_sent += 1
+                    sent, last_event = current, now
+                elif now - last_event >= self.keepalive_interval:
+                    # Comentario SSE: mantiene viva la conexión y detecta clientes caídos
+                    yield ": keepalive\n\n"
+                    last_event = now
+        finally:
+            with self._cond:
+                self._clients -= 1
+
+    def client_count(self) -> int:
+        return self._clients
+
+    def stats(self) -> Dict:
+        return {
+            "clients": self._clients,
+            "version": self._version,
+            "deltas_sent": self.events_sent,
+            "snapshots_sent": self.snapshots_sent,
+        }
@@ -0,0 +1,118 @@
+import logging
+import socket
+import struct
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import fcntl
+    from termios import TIOCOUTQ
+except ImportError:
+    # Sin ioctl (Windows) solo se aplica el plazo de escritura
+    fcntl = None
+    TIOCOUTQ = None
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+
+class ViewerLimit:
+    """Límite global de clientes de vídeo simultáneos (0 = sin límite)"""
+    def __init__(self, max_viewers: int = 0):
+        self.max_viewers = max_viewers
+        self._lock = threading.Lock()
+        self.viewers = 0
+        self.rejected = 0  # Clientes rechazados o degradados a snapshot por el límite
+        self.evicted = 0  # Clientes expulsados por lentos (plazo de escritura o presupuesto de bytes)
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.max_viewers and self.viewers >= self.max_viewers:
+                self.rejected += 1
+                return False
+            self.viewers += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.viewers -= 1
+
+    def record_eviction(self):
+        with self._lock:
+            self.evicted += 1
+
+    def stats(self) -> Dict:
+        return {
+            "clients": self.viewers,
+            "max_clients": self.max_viewers,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+        }
+
+
+def socket_from_environ(environ) -> Optional[socket.socket]:
+    """Socket del cliente en los servidores WSGI que lo exponen (werkzeug, gunicorn)"""
+    sock = environ.get('werkzeug.socket') or environ.get('gunicorn.socket')
+    return sock if isinstance(sock, socket.socket) else None
+
+
+def unsent_bytes(sock: socket.socket) -> Optional[int]:
+    """Bytes escritos en el socket que el cliente aún no ha confirmado (None si no se puede saber)"""
+    if TIOCOUTQ is None:
+        return None
+    try:
+        return struct.unpack('i', fcntl.ioctl(sock.fileno(), TIOCOUTQ, b'\0\0\0\0'))[0]
+    except (OSError, ValueError):
+        return None
+
+
+class SendGuard:
+    """
+    Límites de envío de un cliente de streaming. Cada escritura tiene un plazo: se fija
+    como timeout del socket, así un cliente parado no retiene el hilo para siempre (el
+    servidor WSGI corta la conexión y cierra el generador). Además, mientras los bytes
+    sin confirmar en el socket superen el presupuesto no se envían frames nuevos, y si el
+    cliente no baja de él dentro del plazo se le expulsa.
+    """
+    def __init__(self, environ, write_timeout: float = 5.0, max_in_flight_bytes: int = 0,
+                 limit: Optional[ViewerLimit] = None):
+        self.write_timeout = write_timeout
+        self.max_in_flight_bytes = max_in_flight_bytes  # 0 = sin presupuesto
+        self._limit = limit
+        self._sock = socket_from_environ(environ)
+        self._over_budget_since = None
+        self.evicted = False
+        if self._sock is not None and write_timeout:
+            try:
+                self._sock.settimeout(write_timeout)
+            except OSError as e:
+                logger.warning(f"No se pudo fijar el plazo de escritura del cliente: {e}")
+
+    def can_send(self) -> bool:
+        """False si el cliente va por encima del presupuesto de bytes (el frame se salta)"""
+        if not self.max_in_flight_bytes or self._sock is None:
+            return True
+        pending = unsent_bytes(self._sock)
+        if pending is None or pending <= self.max_in_flight_bytes:
+            self._over_budget_since = None
+            return True
+        now = time.monotonic()
+        if self._over_budget_since is None:
+            self._over_budget_since = now
+        elif self.write_timeout and now - self._over_budget_since > self.write_timeout:
+            self._evict(f"{pending} bytes sin confirmar durante más de {self.write_timeout}s")
+        return False
+
+    def sent(self, started: float):
+        """Registra una escritura que empezó en `started`; expulsa si superó el plazo"""
+        elapsed = time.monotonic() - started
+        if self.write_timeout and elapsed > self.write_timeout:
+            self._evict(f"escritura de {elapsed:.1f}s")
+
+    def _evict(self, reason: str):
+        if not self.evicted:
+            self.evicted = True
+            if self._limit is not None:
+                self._limit.record_eviction()
+            logger.warning(f"Cliente de streaming lento expulsado: {reason}")
@@ -0,0 +1,128 @@
+import cv2
+import logging
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Tuple
+
+from app.metrics import STAGE_SECONDS
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Calidad de un stream: ancho en píxeles (0 = original), calidad JPEG y FPS máximos (0 = sin límite)
+StreamTier = namedtuple('StreamTier', ['width', 'quality', 'max_fps'])
+
+_ENCODE_SECONDS = STAGE_SECONDS.labels('encode')
+
+MIN_WIDTH = 64
+MAX_FPS = 60
+
+
+def _int_arg(args, name: str, default: int) -> int:
+    try:
+        return int(args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def tier_from_args(args, config) -> StreamTier:
+    """
+    Construye el tier a partir de los parámetros de la petición (`width`, `quality`, `fps`),
+    usando los valores por defecto de la configuración y acotando valores fuera de rango.
+    """
+    width = _int_arg(args, 'width', config.get('STREAM_WIDTH', 0))
+    quality = _int_arg(args, 'quality', config.get('STREAM_JPEG_QUALITY', 95))
+    max_fps = _int_arg(args, 'fps', config.get('STREAM_MAX_FPS', 0))
+
+    width = 0 if width <= 0 else max(width, MIN_WIDTH)
+    quality = min(max(quality, 10), 100)
+    max_fps = min(max(max_fps, 0), MAX_FPS)
+    return StreamTier(width, quality, max_fps)
+
+
+def encode_frame(frame, tier: StreamTier) -> bytes:
+    """Redimensiona (sin ampliar) y codifica un frame a JPEG según el tier"""
+    start = time.perf_counter()
+    if tier.width and tier.width < frame.shape[1]:
+        h, w = frame.shape[:2]
+        height = max(int(round(h * tier.width / w)), 1)
+        frame = cv2.resize(frame, (tier.width, height), interpolation=cv2.INTER_AREA)
+    _, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, tier.quality])
+    data = jpeg.tobytes()
+    _ENCODE_SECONDS.observe(time.perf_counter() - start)
+    return data
+
+
+class TierEncoder:
+    """
+    Caché de JPEG por tier. Cada combinación (ancho, calidad) se codifica como mucho
+    una vez por frame de origen y la comparten todos los clientes de ese tier.
+    Los tiers sin clientes se eliminan de la caché.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users: Dict[Tuple[int, int], int] = {}
+        self._key_locks: Dict[Tuple[int, int], threading.Lock] = {}
+        self._cache: Dict[Tuple[int, int], Tuple[int, bytes]] = {}
+        self.encodes = 0
+        self.cache_hits = 0
+
+    @staticmethod
+    def _key(tier: StreamTier) -> Tuple[int, int]:
+        # Los FPS máximos no afectan a la codificación: solo cuentan ancho y calidad
+        return tier.width, tier.quality
+
+    def acquire(self, tier: StreamTier):
+        """Registra un cliente que usa este tier"""
+        key = self._key(tier)
+        with self._lock:
+            self._users[key] = self._users.get(key, 0) + 1
+            self._key_locks.setdefault(key, threading.Lock())
+
+    def release(self, tier: StreamTier):
+        """Da de baja un cliente; si el tier queda sin clientes se descarta su caché"""
+        key = self._key(tier)
+        with self._lock:
+            users = self._users.get(key, 0) - 1
+            if users > 0:
+                self._users[key] = users
+                return
+            self._users.pop(key, None)
+            self._key_locks.pop(key, None)
+            self._cache.pop(key, None)
+        logger.info(f"Tier {key} sin clientes, eliminado de la caché")
+
+    def encode(self, seq: int, frame, tier: StreamTier) -> bytes:
+        """Devuelve el JPEG del frame `seq` para el tier, codificándolo solo si no está en caché"""
+        key = self._key(tier)
+        key_lock = self._key_locks.get(key)
+        if key_lock is None:
+            # Tier sin clientes registrados: codificar sin cachear
+            self.encodes += 1
+            return encode_frame(frame, tier)
+
+        with key_lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == seq:
+                self.cache_hits += 1
+                return cached[1]
+            data = encode_frame(frame, tier)
+            self.encodes += 1
+            with self._lock:
+                # Solo guardar si el tier sigue teniendo clientes
+                if key in self._users:
+                    self._cache[key] = (seq, data)
+            return data
+
+    def prime(self, seq: int, frame):
+        """Codifica el frame `seq` para todos los tiers con clientes, fuera de los hilos de los clientes"""
+        with self._lock:
+            keys = list(self._users)
+        for width, quality in keys:
+            self.encode(seq, frame, StreamTier(width, quality, 0))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            tiers = [{"width": k[0], "quality": k[1], "clients": n} for k, n in self._users.items()]
+        return {"tiers": tiers, "encodes": self.encodes, "cache_hits": self.cache_hits}
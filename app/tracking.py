@@ -0,0 +1,32 @@
+# Importaciones de torch y ultralytics diferidas a la primera llamada: importar este
+# módulo no debe retrasar el arranque del servidor web (ver app.startup)
+
+
+def create_tracker(config, frame_rate: int = 30):
+    """
+    Crea un tracker independiente (ByteTrack por defecto, ver TRACKER en config).
+    Cada cámara tiene el suyo para poder inferir en lote sin mezclar sus tracks.
+    """
+    from ultralytics.trackers.track import TRACKER_MAP
+    from ultralytics.utils import IterableSimpleNamespace, yaml_load
+    from ultralytics.utils.checks import check_yaml
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(config.get('TRACKER', 'bytetrack.yaml'))))
+    return TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+
+
+def apply_tracker(tracker, result):
+    """
+    Actualiza el tracker con las detecciones de un resultado de `predict` y devuelve el
+    resultado con los IDs de track, igual que hace `model.track` internamente.
+    """
+    import torch
+    det = result.boxes.cpu().numpy()
+    if len(det) == 0:
+        return result
+    tracks = tracker.update(det, result.orig_img)
+    if len(tracks) == 0:
+        return result
+    # Filas de tracks: [x1, y1, x2, y2, track_id, conf, cls, índice de la detección]
+    result = result[tracks[:, -1].astype(int)]
+    result.update(boxes=torch.as_tensor(tracks[:, :-1]))
+    return result
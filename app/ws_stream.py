@@ -0,0 +1,99 @@
+import logging
+import struct
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from app.stream_tiers import StreamTier
+
+# Configuración de logging
+logger = logging.getLogger(__name__)
+
+# Cabecera de cada mensaje binario, seguida del JPEG:
+# versión (u8), flags (u8), tamaño de la cabecera (u16), secuencia del frame (u64), little-endian
+WS_HEADER = struct.Struct('<BBHQ')
+WS_PROTOCOL_VERSION = 1
+
+# Bits del campo flags
+FLAG_PIZZA = 0x01
+FLAG_BLISTER = 0x02
+FLAG_PULSE = 0x04  # En este frame se emitió un pulso al PLC
+FLAG_OPCUA = 0x08  # Conexión OPC-UA activa
+
+# Código de cierre WebSocket "Try Again Later" cuando se alcanza el límite de espectadores
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+def frame_flags(detections: Dict, event: Optional[str], opcua_connected: bool) -> int:
+    """Flags de detección de un frame tal como viajan en la cabecera"""
+    return ((FLAG_PIZZA if detections.get('pizza') else 0) |
+            (FLAG_BLISTER if detections.get('blister') else 0) |
+            (FLAG_PULSE if event else 0) |
+            (FLAG_OPCUA if opcua_connected else 0))
+
+
+def pack_frame(seq: int, flags: int, jpeg: bytes) -> bytes:
+    return WS_HEADER.pack(WS_PROTOCOL_VERSION, flags, WS_HEADER.size, seq) + jpeg
+
+
+def _drain_acks(ws, unacked: deque, wait: float):
+    """
+    Lee los acks pendientes del cliente y libera sus huecos. 'ack:<seq>' confirma ese frame
+    y todos los anteriores, así que un ack perdido o un frame que el cliente no llegó a
+    pintar no deja huecos ocupados para siempre; 'ack' sin secuencia libera un solo hueco.
+    """
+    message = ws.receive(timeout=wait)
+    while message is not None:
+        if isinstance(message, bytes):
+            message = message.decode(errors='replace')
+        _, _, seq = message.partition(':')
+        if seq.isdigit():
+            acked = int(seq)
+            while unacked and unacked[0] <= acked:
+                unacked.popleft()
+        elif unacked:
+            unacked.popleft()
+        message = ws.receive(timeout=0)
+
+
+def serve_video(ws, ctx, tier: StreamTier, max_in_flight: int = 2):
+    """
+    Envía por un WebSocket los frames anotados de una cámara como mensajes binarios
+    (cabecera + JPEG). Contrapresión por conexión: como mucho `max_in_flight` frames
+    sin confirmar; mientras el cliente no confirma, los frames nuevos sustituyen a los
+    intermedios en el broadcaster y el cliente recibe solo el más reciente.
+    Con max_in_flight = 0 no se esperan acks (solo se salta lo que llega durante un envío).
+    """
+    subscription = ctx.broadcaster.subscribe(f"ws-{ctx.id}-{threading.get_ident()}")
+    ctx.tier_encoder.acquire(tier)
+    unacked = deque()  # Secuencias enviadas y aún sin confirmar
+    min_interval = 1.0 / tier.max_fps if tier.max_fps else 0.0
+    last_sent = 0.0
+    try:
+        while True:
+            # Respetar los FPS máximos del tier: los frames intermedios se saltan
+            if min_interval:
+                wait = last_sent + min_interval - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+
+            if max_in_flight:
+                _drain_acks(ws, unacked, 0 if len(unacked) < max_in_flight else 1.0)
+                if len(unacked) >= max_in_flight:
+                    continue
+
+            annotated = subscription.next_frame(timeout=1.0)
+            if annotated is None:
+                if ctx.broadcaster.closed:
+                    break
+                continue
+            jpeg = ctx.tier_encoder.encode(subscription.last_seq, annotated, tier)
+            ws.send(pack_frame(subscription.last_seq, subscription.last_meta or 0, jpeg))
+            subscription.record_sent(WS_HEADER.size + len(jpeg))
+            last_sent = time.monotonic()
+            if max_in_flight:
+                unacked.append(subscription.last_seq)
+    finally:
+        subscription.close()
+        ctx.tier_encoder.release(tier)
@@ -0,0 +1,62 @@
+"""Utilidades compartidas por los scripts de benchmark."""
+import sys
+from pathlib import Path
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config
+
+
+def load_config(**overrides):
+    """Configuración de la aplicación como diccionario (igual que app.config.from_object)"""
+    config = {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+    config.update(overrides)
+    return config
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+
+def image_frames(directory, limit=None):
+    """Itera las imágenes de un directorio en orden alfabético"""
+    paths = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    if not paths:
+        sys.exit(f"No hay imágenes en {directory}")
+    for path in paths[:limit]:
+        frame = cv2.imread(str(path))
+        if frame is not None:
+            yield frame
+
+
+def source_frames(path, limit=None):
+    """Frames de un vídeo o de un directorio de imágenes"""
+    if Path(path).is_dir():
+        return image_frames(path, limit)
+    return video_frames(path, limit)
+
+
+def video_frames(path, limit=None):
+    """Itera los frames de un vídeo en orden, sin saltar ninguno"""
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        sys.exit(f"No se pudo abrir {path}")
+    count = 0
+    try:
+        while limit is None or count < limit:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame
+            count += 1
+    finally:
+        cap.release()
+
+
+def video_fps(path) -> float:
+    """Frecuencia nominal de un vídeo (30 si no se puede leer)"""
+    cap = cv2.VideoCapture(str(path))
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0.0
+    cap.release()
+    return fps or 30.0
@@ -0,0 +1,107 @@
+"""
+Compara la inferencia en el propio proceso con el proceso de inferencia
+(PIPELINE_PLACEMENT['inference'] = 'process') mientras N clientes de streaming simulados
+codifican JPEG y hacen trabajo Python en otros hilos, como los hilos de Flask. Informa de las detecciones por segundo, la latencia p50/p95
+de cada lote y los frames por segundo servidos a los clientes en cada modo.
+
+Uso:
+    python benchmarks/inference_worker.py video.mp4 [--clients 0 4 8] [--frames 300]
+"""
+import argparse
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from common import load_config, source_frames
+
+from app.inference_worker import InferenceWorker
+from app.model_backends import select_model
+from app.model_registry import get_model
+from app.roi import inspection_area, predict_frames
+from app.tracking import create_tracker, apply_tracker
+
+
+def streaming_client(frame, quality, stop, served):
+    """Cliente simulado: codifica el frame y recorre los bytes en Python, como un generador MJPEG"""
+    count = 0
+    while not stop.is_set():
+        ok, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if ok:
+            b''.join(buffer.tobytes()[i:i + 4096] for i in range(0, len(buffer), 4096))
+        count += 1
+    served.append(count)
+
+
+def run(infer, frames, clients, quality):
+    """Infiere todos los frames con `clients` hilos de streaming; devuelve (fps, latencias, fps por cliente)"""
+    stop = threading.Event()
+    served = []
+    threads = [threading.Thread(target=streaming_client, args=(frames[0], quality, stop, served), daemon=True)
+               for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    latencies = []
+    start = time.perf_counter()
+    for frame in frames:
+        begin = time.perf_counter()
+        infer(frame)
+        latencies.append(time.perf_counter() - begin)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+    client_fps = sum(served) / elapsed / clients if clients else 0.0
+    return len(frames) / elapsed, np.array(latencies) * 1000, client_fps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help="Vídeo o directorio de imágenes")
+    parser.add_argument('--clients', type=int, nargs='+', default=[0, 4, 8],
+                        help="Número de clientes de streaming simulados")
+    parser.add_argument('--frames', type=int, default=300, help="Número máximo de frames")
+    parser.add_argument('--quality', type=int, default=80, help="Calidad JPEG de los clientes")
+    args = parser.parse_args()
+
+    config = load_config()
+    path = select_model(config)
+    if path is None:
+        sys.exit("No se encontró ningún modelo")
+    frames = list(source_frames(args.source, args.frames))
+    if not frames:
+        sys.exit("No hay frames")
+    area = inspection_area(frames[0].shape)
+
+    model = get_model(path)
+    if model is None:
+        sys.exit("No se pudo cargar el modelo")
+    tracker = create_tracker(config, frame_rate=config.get('DETECTION_TARGET_FPS', 15) or 30)
+
+    def in_process(frame):
+        apply_tracker(tracker, predict_frames(model, [frame], [area], config)[0])
+
+    worker = InferenceWorker(path, config, max_frame_bytes=max(frame.nbytes for frame in frames))
+    if not worker.start():
+        sys.exit("No arrancó el proceso de inferencia")
+
+    def out_of_process(frame):
+        if worker.infer([frame], [area], [0]) is None:
+            sys.exit("El proceso de inferencia falló")
+
+    print(f"{len(frames)} frames de {frames[0].shape[1]}x{frames[0].shape[0]}, modelo {path.name}")
+    print(f"{'modo':<10} {'clientes':>8} {'det/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'fps/cliente':>12}")
+    try:
+        for clients in args.clients:
+            for label, infer in (('proceso', in_process), ('worker', out_of_process)):
+                fps, latencies, client_fps = run(infer, frames, clients, args.quality)
+                print(f"{label:<10} {clients:>8} {fps:>8.1f} {np.percentile(latencies, 50):>8.1f} "
+                      f"{np.percentile(latencies, 95):>8.1f} {client_fps:>12.1f}")
+    finally:
+        worker.close()
+
+
+if __name__ == '__main__':
+    main()
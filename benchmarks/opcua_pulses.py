@@ -0,0 +1,143 @@
+"""
+Levanta un servidor OPC-UA local en el propio proceso, envía ráfagas de pulsos con
+OPCUAClient y comprueba en el servidor que cada nodo recibe los pulsos completos y en
+orden, con la anchura y la separación mínimas configuradas. Informa de la profundidad
+máxima de la cola y de la latencia desde la detección hasta la escritura.
+Termina con código 1 si algún pulso se pierde, se fusiona o no respeta los tiempos.
+
+Uso:
+    python benchmarks/opcua_pulses.py [--pulses 200] [--nodes 2] [--interval 0.0]
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from common import load_config
+
+from opcua import Server
+
+from app.camera import OPCUAClient
+
+
+class EdgeRecorder:
+    """Handler de la suscripción del servidor: guarda (timestamp, valor) de cada cambio por nodo"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changes = defaultdict(list)
+
+    def datachange_notification(self, node, val, data):
+        value = data.monitored_item.Value
+        stamp = value.SourceTimestamp or value.ServerTimestamp
+        with self.lock:
+            self.changes[node.nodeid.to_string()].append((stamp, bool(val)))
+
+
+def start_server(endpoint, node_count):
+    server = Server()
+    server.set_endpoint(endpoint)
+    idx = server.register_namespace("urn:yolo-flask-streamer:bench")
+    plc = server.get_objects_node().add_object(idx, "PLC")
+    nodes = []
+    for i in range(node_count):
+        var = plc.add_variable(f"ns={idx};s=pulse_{i}", f"pulse_{i}", False)
+        var.set_writable()
+        nodes.append(var)
+    server.start()
+    return server, nodes
+
+
+def check_node(changes, expected, width, gap, tolerance=0.9):
+    """Devuelve (pulsos vistos, anchura mínima, separación mínima, errores) de un nodo"""
+    errors = []
+    values = [value for _, value in changes]
+    # El primer cambio notificado puede ser el valor inicial (False)
+    if values and not values[0]:
+        changes = changes[1:]
+        values = values[1:]
+    if any(values[i] == values[i + 1] for i in range(len(values) - 1)):
+        errors.append("flancos repetidos (pulsos fusionados o desordenados)")
+    rises = [t for t, v in changes if v]
+    falls = [t for t, v in changes if not v]
+    if len(rises) != expected or len(falls) != expected:
+        errors.append(f"{len(rises)} subidas / {len(falls)} bajadas, esperados {expected}")
+    widths = [(f - r).total_seconds() for r, f in zip(rises, falls)]
+    gaps = [(r - f).total_seconds() for f, r in zip(falls, rises[1:])]
+    min_width = min(widths) if widths else 0.0
+    min_gap = min(gaps) if gaps else float('inf')
+    if widths and min_width < width * tolerance:
+        errors.append(f"pulso de {min_width * 1000:.1f} ms (< {width * 1000:.0f} ms)")
+    if gaps and min_gap < gap * tolerance:
+        errors.append(f"separación de {min_gap * 1000:.1f} ms (< {gap * 1000:.0f} ms)")
+    return len(rises), min_width, min_gap, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pulses', type=int, default=200, help="Pulsos totales a enviar")
+    parser.add_argument('--nodes', type=int, default=2, help="Nodos booleanos en el servidor")
+    parser.add_argument('--interval', type=float, default=0.0,
+                        help="Segundos entre pulsos enviados (0 = ráfaga de golpe)")
+    parser.add_argument('--endpoint', default="opc.tcp://127.0.0.1:48400/bench/")
+    args = parser.parse_args()
+
+    server, nodes = start_server(args.endpoint, args.nodes)
+    recorder = EdgeRecorder()
+    subscription = server.create_subscription(5, recorder)
+    subscription.subscribe_data_change(nodes)
+
+    node_ids = [node.nodeid.to_string() for node in nodes]
+    config = load_config(OPCUA_URL=args.endpoint, OPCUA_NODE_SIN_BLISTER=node_ids[0],
+                         OPCUA_NODE_CON_BLISTER=node_ids[-1], OPCUA_PULSE_QUEUE_SIZE=args.pulses)
+    client = OPCUAClient(config, node_ids)
+    try:
+        if not client.connect(force=True):
+            sys.exit("No se pudo conectar al servidor OPC-UA local")
+
+        start = time.perf_counter()
+        submit_ms = []
+        max_depth = 0
+        for i in range(args.pulses):
+            t0 = time.perf_counter()
+            client.generate_pulse(node_ids[i % len(node_ids)], f"bench {i}")
+            submit_ms.append((time.perf_counter() - t0) * 1000)
+            max_depth = max(max_depth, client.pulse_scheduler.queue_depth())
+            if args.interval:
+                time.sleep(args.interval)
+        while client.pulse_scheduler.queue_depth() > 0:
+            max_depth = max(max_depth, client.pulse_scheduler.queue_depth())
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        time.sleep(0.2)  # Dejar que la suscripción publique los últimos cambios
+    finally:
+        client.pulse_scheduler.stop()
+        client.disconnect()
+        server.stop()
+
+    stats = client.pulse_scheduler.stats()
+    width, gap = config['OPCUA_PULSE_WIDTH'], config['OPCUA_PULSE_MIN_GAP']
+    failed = False
+    print(f"{'nodo':<28} {'pulsos':>7} {'ancho mín (ms)':>15} {'separación mín (ms)':>20}")
+    for index, node_id in enumerate(node_ids):
+        expected = len(range(index, args.pulses, len(node_ids)))
+        with recorder.lock:
+            changes = list(recorder.changes[node_id])
+        seen, min_width, min_gap, errors = check_node(changes, expected, width, gap)
+        print(f"{node_id:<28} {seen:>7} {min_width * 1000:>15.1f} {min_gap * 1000:>20.1f}")
+        for error in errors:
+            print(f"  ERROR: {error}")
+        failed = failed or bool(errors)
+
+    print(f"Tiempo total: {elapsed:.2f} s, submit medio {sum(submit_ms) / len(submit_ms):.3f} ms, "
+          f"máx {max(submit_ms):.3f} ms")
+    print(f"Cola máxima: {max_depth}, descartados: {stats['pulses_dropped']}, "
+          f"escrituras fallidas: {stats['writes_failed']}")
+    print(f"Latencia detección→escritura: media {stats['avg_latency_ms']} ms, máx {stats['max_latency_ms']} ms")
+    if failed or stats['writes_failed']:
+        sys.exit(1)
+    print("OK: todos los pulsos completos, en orden y con los tiempos mínimos")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Mide contra un servidor OPC-UA local en el propio proceso las escrituras por segundo y
+la latencia de ida y vuelta de OPCUAClient, nodo a nodo (write_value) frente a todos los
+nodos en una sola llamada (write_values). Al final mide cuánto tarda el cliente en dar la
+conexión por perdida en dos casos: un enlace que enmudece sin cerrarse (cable desconectado,
+simulado con un proxy TCP que deja de reenviar) y el servidor detenido.
+
+Uso:
+    python benchmarks/opcua_writes.py [--writes 2000] [--nodes 2]
+"""
+import argparse
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from common import load_config
+
+from opcua_pulses import start_server
+
+from app.camera import OPCUAClient
+
+
+class SilentProxy:
+    """
+    Proxy TCP entre el cliente y el servidor. silence() deja de reenviar en ambos sentidos
+    sin cerrar los sockets: el cliente no recibe error ni cierre, como con un cable
+    desconectado.
+    """
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.silent = threading.Event()
+        self._listener = socket.create_server(('127.0.0.1', 0))
+        self.port = self._listener.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            downstream, _ = self._listener.accept()
+            upstream = socket.create_connection(self.upstream)
+            for source, target in ((downstream, upstream), (upstream, downstream)):
+                threading.Thread(target=self._pump, args=(source, target), daemon=True).start()
+
+    def _pump(self, source, target):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                if not self.silent.is_set():
+                    target.sendall(data)
+        except OSError:
+            pass
+
+    def silence(self):
+        self.silent.set()
+
+
+def detection_time(client, cut, limit=10.0):
+    """Corta el enlace con `cut()` y devuelve los segundos hasta que el cliente da la conexión por perdida"""
+    cut()
+    start = time.perf_counter()
+    while client.connected and time.perf_counter() - start < limit:
+        time.sleep(0.01)
+    return None if client.connected else time.perf_counter() - start
+
+
+def report(name, latencies_ms, node_writes, elapsed):
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    print(f"{name:<22} {len(latencies_ms) / elapsed:>10.0f} {node_writes / elapsed:>12.0f} "
+          f"{p50:>8.2f} {p95:>8.2f} {p99:>8.2f}")
+
+
+def timed(fn, count):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        if not fn(i):
+            sys.exit("Escritura fallida contra el servidor local")
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writes', type=int, default=2000, help="Llamadas por modo")
+    parser.add_argument('--nodes', type=int, default=2, help="Nodos booleanos escritos en cada llamada")
+    parser.add_argument('--endpoint', default="opc.tcp://127.0.0.1:48401/bench/")
+    args = parser.parse_args()
+
+    server, nodes = start_server(args.endpoint, args.nodes)
+    node_ids = [node.nodeid.to_string() for node in nodes]
+    config = load_config(OPCUA_URL=args.endpoint, OPCUA_NODE_SIN_BLISTER=node_ids[0],
+                         OPCUA_NODE_CON_BLISTER=node_ids[-1])
+    client = OPCUAClient(config, node_ids)
+    if not client.connect(force=True):
+        server.stop()
+        sys.exit("No se pudo conectar al servidor OPC-UA local")
+
+    handles = [client.nodes[node_id] for node_id in node_ids]
+    print(f"{'modo':<22} {'llamadas/s':>10} {'escrituras/s':>12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    # Nodo a nodo: una llamada Write por nodo (como antes de agrupar)
+    single, single_time = timed(lambda i: all(client.write_value(node, bool(i % 2)) for node in handles), args.writes)
+    report(f"nodo a nodo (x{args.nodes})", single, args.writes * args.nodes, single_time)
+    # Agrupado: todos los nodos en una sola llamada Write
+    batched, batched_time = timed(lambda i: client.write_values([(node_id, bool(i % 2)) for node_id in node_ids]),
+                                  args.writes)
+    report("agrupado", batched, args.writes * args.nodes, batched_time)
+
+    # Enlace mudo: el mismo cliente (su hilo de vigilancia es el del proceso) vuelve a
+    # conectarse a través del proxy, que deja de reenviar sin cerrar
+    print(f"Vigilancia de la conexión: {client.link_stats()['liveness']}")
+    endpoint = urlparse(args.endpoint)
+    proxy = SilentProxy((endpoint.hostname, endpoint.port))
+    detections = {}
+    for name, url, cut in (("enlace mudo", endpoint._replace(netloc=f"127.0.0.1:{proxy.port}").geturl(),
+                            proxy.silence),
+                           ("servidor detenido", args.endpoint, server.stop)):
+        client.disconnect()
+        client.url = url
+        client.client = client._create_client()
+        if not client.connect(force=True):
+            server.stop()
+            sys.exit(f"No se pudo conectar al servidor OPC-UA local ({name})")
+        time.sleep(1.0)
+        detections[name] = detection_time(client, cut)
+    client.pulse_scheduler.stop(flush=False)
+    client.disconnect()
+
+    failed = False
+    for name, detection in detections.items():
+        if detection is None:
+            print(f"ERROR ({name}): la caída no se detectó en 10 s")
+            failed = True
+            continue
+        print(f"Caída detectada ({name}) en {detection * 1000:.0f} ms")
+        if detection >= 1.0:
+            print(f"ERROR ({name}): la caída se detectó en más de 1 s")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+Reproduce un vídeo o un directorio de imágenes por el mismo camino que el loop de detección
+(captura → inferencia → post-procesado → codificación JPEG → pulsos al PLC) sin cámara, PLC
+ni GPU. Informa de FPS, latencia p50/p95/p99 por etapa y memoria máxima (RSS), y compara
+con un baseline guardado: termina con código 1 si hay regresión.
+
+Backends de modelo:
+    yolo  modelo real (models/yolo_weights.pt) en CPU
+    stub  modelo determinista sin red neuronal, para medir solo el coste del pipeline
+
+Uso:
+    python benchmarks/pipeline.py video.mp4 --backend stub --save-baseline baseline_stub.json
+    python benchmarks/pipeline.py video.mp4 --backend stub --baseline baseline_stub.json
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+
+import numpy as np
+import torch
+
+from common import load_config, source_frames
+
+from ultralytics.engine.results import Results
+
+import app.camera as camera_module
+from app.camera import VideoCamera
+from app.camera_manager import CameraContext, create_motion_gate
+from app.capture import CapturedFrame
+from app.counting import create_track_counter
+from app.model_registry import get_model
+from app.pulse_scheduler import PulseScheduler
+from app.stream_tiers import StreamTier
+from app.tracking import create_tracker, apply_tracker
+
+STAGES = ('capture', 'inference', 'postprocess', 'encode')
+
+
+class StubModel:
+    """
+    Modelo determinista: según la posición del frame en un ciclo fijo devuelve nada,
+    una pizza o una pizza con blister dentro del área. La pizza alterna entre dos
+    posiciones sin solape de un ciclo al siguiente, así que cada ciclo es un track nuevo
+    (y una pizza con blister contada) aunque el hueco entre ciclos sea corto.
+    """
+    def __init__(self, pizza_id, blister_id, period=30):
+        self.pizza_id = pizza_id
+        self.blister_id = blister_id
+        self.period = period
+        self.names = {blister_id: 'blister', pizza_id: 'pizza'}
+        self.calls = 0
+
+    def _boxes(self, frame):
+        phase = self.calls % self.period
+        self.calls += 1
+        h, w = frame.shape[:2]
+        cycle = (self.calls - 1) // self.period
+        cx, cy = w / 2 + (60 if cycle % 2 else -100), h / 2
+        rows = []
+        if phase >= self.period // 3:
+            rows.append([cx - 40, cy - 40, cx + 40, cy + 40, 0.9, self.pizza_id])
+        if phase >= 2 * self.period // 3:
+            rows.append([cx - 15, cy - 15, cx + 15, cy + 15, 0.8, self.blister_id])
+        return torch.tensor(rows, dtype=torch.float32).reshape(-1, 6)
+
+    def expected_counts(self):
+        """(sin blister, con blister) que debe contar el pipeline: uno con blister por ciclo que llegó al blister"""
+        cycles, phase = divmod(self.calls, self.period)
+        return 0, cycles + (1 if phase > 2 * self.period // 3 else 0)
+
+    def predict(self, frames, conf=0.5, **kwargs):
+        return [Results(frame, path='', names=self.names, boxes=self._boxes(frame)) for frame in frames]
+
+
+class RecordingPLC:
+    """Sustituto del cliente OPC-UA: los pulsos pasan por el PulseScheduler real sin red"""
+    connected = True
+
+    def __init__(self, config):
+        self.pulses = 0
+        self.pulse_scheduler = PulseScheduler(lambda values: True,
+                                              pulse_width=config.get('OPCUA_PULSE_WIDTH', 0.1),
+                                              min_gap=config.get('OPCUA_PULSE_MIN_GAP', 0.1),
+                                              max_queue=1 << 20)
+
+    def generate_pulse(self, node_id, label, detected_at=None):
+        self.pulses += 1
+        return self.pulse_scheduler.submit(node_id, label, detected_at)
+
+
+def load_backend(name, config):
+    if name == 'stub':
+        return StubModel(config['PIZZA_CLASS_ID'], config['BLISTER_CLASS_ID'])
+    model = get_model(config['BASE_DIR'] / 'models' / 'yolo_weights.pt')
+    if model is None:
+        sys.exit("No se pudo cargar el modelo")
+    model.to('cpu')
+    return model
+
+
+def run(source, backend, config, limit, tier):
+    """Procesa todos los frames y devuelve (tiempos por etapa en ms, frames, segundos, contadores, pulsos)"""
+    camera = VideoCamera.offline(config)
+    ctx = CameraContext('bench', source, node_sin_blister='sin_blister', node_con_blister='con_blister')
+    ctx.tracker = create_tracker(config)
+    ctx.motion_gate = create_motion_gate(config)
+    ctx.track_counter = create_track_counter(config)
+    # Un cliente suscrito para que se anote cada frame, como con el stream abierto
+    subscription = ctx.broadcaster.subscribe('bench')
+    plc = RecordingPLC(config)
+    camera_module._opcua_client = plc
+
+    times = {stage: [] for stage in STAGES}
+    frames = source_frames(source, limit)
+    processed = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            t0 = time.perf_counter()
+            frame = next(frames, None)
+            if frame is None:
+                break
+            t1 = time.perf_counter()
+            area = ctx.area_coords(frame.shape)
+            if camera.needs_inference(ctx, frame, area):
+                result = camera.run_inference(backend, [frame], [area])[0]
+                ctx.last_result = apply_tracker(ctx.tracker, result)
+            else:
+                ctx.last_result.orig_img = frame
+            t2 = time.perf_counter()
+            # Instante de captura nominal a 30 FPS: la caducidad de los tracks no depende de la velocidad de la máquina
+            captured = CapturedFrame(processed + 1, processed / 30.0, frame)
+            camera.process_detections(ctx, [ctx.last_result], area, captured)
+            t3 = time.perf_counter()
+            seq, annotated = ctx.broadcaster.latest()
+            ctx.tier_encoder.encode(seq, annotated, tier)
+            t4 = time.perf_counter()
+            for stage, (a, b) in zip(STAGES, ((t0, t1), (t1, t2), (t2, t3), (t3, t4))):
+                times[stage].append((b - a) * 1000)
+            processed += 1
+    finally:
+        elapsed = time.perf_counter() - start
+        subscription.close()
+        plc.pulse_scheduler.stop(flush=False)
+        camera_module._opcua_client = None
+    return times, processed, elapsed, ctx.counters(), plc.pulses
+
+
+def summarize(times, processed, elapsed, counters, pulses):
+    report = {
+        "frames": processed,
+        "fps": round(processed / elapsed, 2) if elapsed else 0.0,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": {},
+        "counter_sin_blister": counters['counter_sin_blister'],
+        "counter_con_blister": counters['counter_con_blister'],
+        "pulses": pulses,
+    }
+    for stage, values in times.items():
+        if values:
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            report["stages"][stage] = {"p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3)}
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Lista de regresiones respecto al baseline (vacía si no hay ninguna)"""
+    regressions = []
+    if report["fps"] < baseline["fps"] * (1 - tolerance):
+        regressions.append(f"FPS {report['fps']} < {baseline['fps']} (-{tolerance:.0%})")
+    if report["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"RSS {report['peak_rss_mb']} MB > {baseline['peak_rss_mb']} MB (+{tolerance:.0%})")
+    for stage, values in baseline["stages"].items():
+        current = report["stages"].get(stage)
+        if current and current["p95_ms"] > values["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{stage} p95 {current['p95_ms']} ms > {values['p95_ms']} ms (+{tolerance:.0%})")
+    # Con el mismo vídeo y backend los resultados deben ser idénticos
+    if report["frames"] == baseline["frames"]:
+        for key in ("counter_sin_blister", "counter_con_blister", "pulses"):
+            if report[key] != baseline[key]:
+                regressions.append(f"{key} {report[key]} != {baseline[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help="Vídeo grabado de la línea o directorio de imágenes")
+    parser.add_argument('--backend', choices=('yolo', 'stub'), default='yolo')
+    parser.add_argument('--frames', type=int, default=None, help="Número máximo de frames")
+    parser.add_argument('--width', type=int, default=0, help="Ancho del JPEG codificado (0 = original)")
+    parser.add_argument('--quality', type=int, default=None, help="Calidad JPEG")
+    parser.add_argument('--baseline', help="JSON de baseline con el que comparar")
+    parser.add_argument('--save-baseline', help="Guardar el resultado como baseline en este JSON")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Margen de regresión admitido")
+    args = parser.parse_args()
+
+    config = load_config()
+    tier = StreamTier(args.width, args.quality or config['STREAM_JPEG_QUALITY'], 0)
+    backend = load_backend(args.backend, config)
+    report = summarize(*run(args.source, backend, config, args.frames, tier))
+    report["backend"] = args.backend
+
+    print(f"{report['frames']} frames, {report['fps']} FPS, RSS máx {report['peak_rss_mb']} MB, "
+          f"contadores {report['counter_sin_blister']}/{report['counter_con_blister']}, pulsos {report['pulses']}")
+    print(f"{'etapa':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<12} {values['p50_ms']:>9.3f} {values['p95_ms']:>9.3f} {values['p99_ms']:>9.3f}")
+
+    # Con el modelo stub el conteo es conocido: cada ciclo es una pizza con blister y un pulso
+    if args.backend == 'stub':
+        sin_blister, con_blister = backend.expected_counts()
+        counted = (report['counter_sin_blister'], report['counter_con_blister'], report['pulses'])
+        if counted != (sin_blister, con_blister, sin_blister + con_blister):
+            sys.exit(f"ERROR: conteo {counted[0]}/{counted[1]} con {counted[2]} pulsos, "
+                     f"se esperaba {sin_blister}/{con_blister} con {sin_blister + con_blister} pulsos")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline guardado en {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("backend") != args.backend:
+            sys.exit(f"El baseline es del backend {baseline.get('backend')}, no de {args.backend}")
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESIÓN: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("OK: sin regresiones respecto al baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Micro-benchmark del post-procesado de detecciones: bucle por caja (implementación anterior,
+con .item()/.cpu() por caja) frente a summarize_detections vectorizado, con frames sintéticos
+de muchas cajas.
+
+Uso:
+    python benchmarks/postprocess.py [--boxes 10 100 1000] [--repeat 200]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from ultralytics.engine.results import Boxes
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config
+from app.roi import inspection_area
+from app.postprocess import summarize_detections
+
+FRAME_SHAPE = (480, 640)
+
+
+def legacy_flags(boxes, area, pizza_id, blister_id):
+    """Bucle por caja tal y como lo hacían background_detection_loop y get_detection_flags"""
+    flags = {'pizza': False, 'blister': False, 'conf_pizza': 0.0, 'conf_blister': 0.0}
+    ax1, ay1, ax2, ay2 = area
+    for box in boxes:
+        cls = int(box.cls[0].item()) if box.cls is not None else -1
+        conf = float(box.conf[0].item()) if box.conf is not None else 0.0
+        conf_percent = round(conf * 100, 1)
+        bx1, by1, bx2, by2 = box.xyxy[0].cpu().numpy()
+        if bx1 >= ax1 and by1 >= ay1 and bx2 <= ax2 and by2 <= ay2:
+            if cls == pizza_id:
+                flags['pizza'] = True
+                flags['conf_pizza'] = conf_percent
+            elif cls == blister_id:
+                flags['blister'] = True
+                flags['conf_blister'] = conf_percent
+    return flags
+
+
+def synthetic_boxes(n, device, rng):
+    """Cajas aleatorias [x1, y1, x2, y2, conf, cls] repartidas por el frame"""
+    h, w = FRAME_SHAPE
+    xy = rng.uniform(0, [w - 20, h - 20], size=(n, 2))
+    wh = rng.uniform(10, 200, size=(n, 2))
+    xyxy = np.concatenate([xy, np.minimum(xy + wh, [w, h])], axis=1)
+    conf = rng.uniform(0.5, 1.0, size=(n, 1))
+    cls = rng.integers(0, 2, size=(n, 1))
+    data = torch.tensor(np.concatenate([xyxy, conf, cls], axis=1), dtype=torch.float32, device=device)
+    return Boxes(data, FRAME_SHAPE)
+
+
+def timeit(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--boxes', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    area = inspection_area(FRAME_SHAPE)
+    pizza_id, blister_id = Config.PIZZA_CLASS_ID, Config.BLISTER_CLASS_ID
+
+    print(f"Dispositivo: {args.device}")
+    print(f"{'cajas':>6} {'bucle (ms)':>12} {'vectorizado (ms)':>18} {'speedup':>8}  flags iguales")
+    for n in args.boxes:
+        boxes = synthetic_boxes(n, args.device, rng)
+        legacy = legacy_flags(boxes, area, pizza_id, blister_id)
+        summary = summarize_detections(boxes, area, pizza_id, blister_id)
+        # La confianza no se compara: antes ganaba la última caja, ahora la mejor de cada clase
+        same = (legacy['pizza'], legacy['blister']) == (summary.pizza, summary.blister)
+
+        t_loop = timeit(lambda: legacy_flags(boxes, area, pizza_id, blister_id), args.repeat)
+        t_vec = timeit(lambda: summarize_detections(boxes, area, pizza_id, blister_id), args.repeat)
+        print(f"{n:>6} {t_loop * 1000:>12.3f} {t_vec * 1000:>18.3f} {t_loop / t_vec:>7.1f}x  {same}")
+
+
+if __name__ == '__main__':
+    main()
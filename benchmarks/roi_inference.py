@@ -0,0 +1,101 @@
+"""
+Compara la inferencia sobre el frame completo con la inferencia sobre el recorte del área
+de inspección (INFERENCE_ROI): latencia por frame y paridad de los flags pizza/blister.
+
+Uso:
+    python benchmarks/roi_inference.py video.mp4 [--weights models/yolo_weights.pt] [--frames 300]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import Config
+from app.roi import inspection_area, crop_bounds, roi_imgsz, map_result_to_frame
+from app.postprocess import summarize_detections
+
+
+def detection_flags(result, area, pizza_id, blister_id):
+    """Flags (pizza, blister) dentro del área, con el mismo post-procesado que el loop de detección"""
+    summary = summarize_detections(result.boxes, area, pizza_id, blister_id)
+    return summary.pizza, summary.blister
+
+
+def run_full(model, frame, conf):
+    return model.track(frame, conf=conf, persist=True, verbose=False)[0]
+
+
+def run_roi(model, frame, conf, margin):
+    bounds = crop_bounds(inspection_area(frame.shape), frame.shape, margin)
+    x1, y1, x2, y2 = bounds
+    result = model.track(frame[y1:y2, x1:x2], conf=conf, imgsz=roi_imgsz(bounds), persist=True, verbose=False)[0]
+    return map_result_to_frame(result, frame, (x1, y1))
+
+
+def summarize(name, latencies):
+    lat = np.array(latencies) * 1000
+    print(f"{name:<12} media={lat.mean():7.2f} ms  p50={np.percentile(lat, 50):7.2f} ms  "
+          f"p95={np.percentile(lat, 95):7.2f} ms  fps={1000 / lat.mean():6.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', help="Vídeo grabado de la línea")
+    parser.add_argument('--weights', default=str(Config.BASE_DIR / 'models' / 'yolo_weights.pt'))
+    parser.add_argument('--frames', type=int, default=300, help="Número máximo de frames a procesar")
+    parser.add_argument('--margin', type=int, default=32, help="Margen alrededor del área de inspección")
+    args = parser.parse_args()
+
+    # Modelos independientes para que cada modo tenga su propio estado de tracking
+    full_model = YOLO(args.weights)
+    roi_model = YOLO(args.weights)
+
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        sys.exit(f"No se pudo abrir {args.video}")
+
+    full_lat, roi_lat = [], []
+    matches = frames = 0
+    mismatched = []
+    while frames < args.frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        area = inspection_area(frame.shape)
+
+        start = time.perf_counter()
+        full_result = run_full(full_model, frame, Config.CONF_THRESHOLD)
+        full_lat.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        roi_result = run_roi(roi_model, frame, Config.CONF_THRESHOLD, args.margin)
+        roi_lat.append(time.perf_counter() - start)
+
+        full_flags = detection_flags(full_result, area, Config.PIZZA_CLASS_ID, Config.BLISTER_CLASS_ID)
+        roi_flags = detection_flags(roi_result, area, Config.PIZZA_CLASS_ID, Config.BLISTER_CLASS_ID)
+        if full_flags == roi_flags:
+            matches += 1
+        else:
+            mismatched.append(frames)
+        frames += 1
+    cap.release()
+
+    if not frames:
+        sys.exit("El vídeo no contiene frames")
+
+    # El primer frame incluye la inicialización del predictor: no se cuenta en la latencia
+    summarize("frame", full_lat[1:] or full_lat)
+    summarize("roi", roi_lat[1:] or roi_lat)
+    print(f"Paridad de flags: {matches}/{frames} frames ({100 * matches / frames:.1f}%)")
+    if mismatched:
+        print(f"Frames distintos: {mismatched[:20]}{' ...' if len(mismatched) > 20 else ''}")
+
+
+if __name__ == '__main__':
+    main()
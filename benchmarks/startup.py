@@ -0,0 +1,93 @@
+"""
+Mide el arranque de la aplicación: lanza el servidor en un proceso nuevo (en localhost)
+y consulta /ready hasta que responde 200. Informa del tiempo hasta la primera respuesta
+HTTP (lo que retrasan las importaciones), del tiempo hasta estar listo y de las fases del
+arranque. Termina con código 1 si la primera detección llega después del objetivo
+(STARTUP_TARGET_SECONDS o --target).
+
+Uso:
+    python benchmarks/startup.py [--source video.mp4] [--port 5055] [--timeout 120]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from common import load_config
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Arranca run.py como lo haría `python run.py`, pero en localhost y con la fuente indicada
+SERVER = """
+import sys
+from config import Config
+if sys.argv[2]:
+    Config.VIDEO_SOURCE = sys.argv[2]
+import run
+run.app.run(host='127.0.0.1', port=int(sys.argv[1]), threaded=True, debug=False)
+"""
+
+
+def poll_ready(url: str):
+    """(código HTTP, cuerpo JSON) de /ready, o (None, None) si el servidor aún no responde"""
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'{}')
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default='', help="Fuente de vídeo (por defecto VIDEO_SOURCE de config.py)")
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--timeout', type=float, default=120.0, help="Segundos máximos de espera")
+    parser.add_argument('--target', type=float, default=None,
+                        help="Objetivo de segundos hasta la primera detección (por defecto STARTUP_TARGET_SECONDS)")
+    args = parser.parse_args()
+
+    target = args.target if args.target is not None else load_config().get('STARTUP_TARGET_SECONDS', 0)
+    url = f"http://127.0.0.1:{args.port}/ready"
+    start = time.time()
+    server = subprocess.Popen([sys.executable, '-c', SERVER, str(args.port), args.source], cwd=ROOT)
+    first_response = None
+    data = None
+    try:
+        while time.time() - start < args.timeout:
+            if server.poll() is not None:
+                sys.exit(f"El servidor terminó con código {server.returncode}")
+            status, body = poll_ready(url)
+            if status is not None and first_response is None:
+                first_response = time.time() - start
+            if status == 200:
+                data = body
+                break
+            time.sleep(0.1)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    if first_response is None:
+        sys.exit(f"El servidor no respondió en {args.timeout:.0f}s")
+    print(f"Primera respuesta HTTP: {first_response:.2f}s")
+    if data is None:
+        sys.exit(f"ERROR: /ready no respondió 200 en {args.timeout:.0f}s")
+    print("Fases (segundos desde el inicio del proceso):")
+    for phase, seconds in data['phases'].items():
+        print(f"  {phase:<16} {seconds:>8.2f}")
+    ttfd = data['time_to_first_detection']
+    print(f"Primera detección: {ttfd:.2f}s (objetivo {target or '-'}s)")
+    if target and ttfd > target:
+        print("ERROR: primera detección por encima del objetivo")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Reproduce un vídeo grabado de la línea infiriendo uno de cada N frames (menor ritmo de
+inferencia) y compara el conteo por flancos de los flags con el conteo por id de track
+(COUNT_BY). La referencia es el conteo por tracks infiriendo todos los frames. Cada
+pizza contada es un pulso al PLC, así que los contadores validan también los pulsos.
+Termina con código 1 si el conteo por tracks de algún ritmo se aparta de la referencia
+más de la tolerancia.
+
+Uso:
+    python benchmarks/track_counting.py video.mp4 [--strides 1 2 3] [--frames 5000]
+"""
+import argparse
+import sys
+
+from common import load_config, video_fps, video_frames
+
+from app.camera_manager import CameraContext
+from app.counting import create_track_counter
+from app.model_registry import get_model
+from app.postprocess import summarize_detections
+from app.tracking import create_tracker, apply_tracker
+
+KEYS = ('counter_sin_blister', 'counter_con_blister', 'counter_total')
+
+
+def replay(model, video, config, stride, fps, limit):
+    """
+    Infiere uno de cada `stride` frames con el instante de captura real de cada frame
+    y devuelve (contadores por flancos, contadores por tracks, stats de la tabla de tracks)
+    """
+    edges = CameraContext('edge', video)
+    tracks = CameraContext('track', video)
+    tracker = create_tracker(config, frame_rate=max(int(round(fps / stride)), 1))
+    counter = create_track_counter({**config, 'COUNT_BY': 'track'})
+    for index, frame in enumerate(video_frames(video, limit)):
+        if index % stride:
+            continue
+        area = edges.area_coords(frame.shape)
+        result = model.predict(frame, conf=config['CONF_THRESHOLD'], verbose=False)[0]
+        result = apply_tracker(tracker, result)
+        summary = summarize_detections(result.boxes, area, config['PIZZA_CLASS_ID'], config['BLISTER_CLASS_ID'])
+        edges.update_edges(summary.pizza, summary.blister)
+        for item in counter.update(result.boxes, area, now=index / fps):
+            tracks.count(con_blister=item.result == 'con_blister')
+    return edges.counters(), tracks.counters(), counter.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', help="Vídeo grabado de la línea")
+    parser.add_argument('--strides', type=int, nargs='+', default=[1, 2, 3],
+                        help="Inferir uno de cada N frames (1 = todos)")
+    parser.add_argument('--frames', type=int, default=None, help="Número máximo de frames")
+    parser.add_argument('--tolerance', type=float, default=0.0,
+                        help="Desviación admitida respecto a la referencia (fracción del total)")
+    args = parser.parse_args()
+
+    config = load_config()
+    model = get_model(config['BASE_DIR'] / 'models' / 'yolo_weights.pt')
+    if model is None:
+        sys.exit("No se pudo cargar el modelo")
+    fps = video_fps(args.video)
+
+    strides = sorted(set([1] + args.strides))
+    runs = {stride: replay(model, args.video, config, stride, fps, args.frames) for stride in strides}
+    reference = runs[1][1]
+
+    print(f"Vídeo a {fps:.1f} FPS; referencia: conteo por tracks infiriendo todos los frames")
+    print(f"{'ritmo':<10} {'conteo':<8} {'sin blister':>12} {'con blister':>12} {'total':>8} {'caducados':>10}")
+    failures = []
+    for stride, (edge_counts, track_counts, stats) in runs.items():
+        label = f"1/{stride}" if stride > 1 else "todos"
+        print(f"{label:<10} {'flancos':<8} " + " ".join(f"{edge_counts[k]:>12}" for k in KEYS[:2])
+              + f" {edge_counts['counter_total']:>8}")
+        print(f"{label:<10} {'tracks':<8} " + " ".join(f"{track_counts[k]:>12}" for k in KEYS[:2])
+              + f" {track_counts['counter_total']:>8} {stats['expired']:>10}")
+        allowed = args.tolerance * max(reference['counter_total'], 1)
+        if any(abs(track_counts[k] - reference[k]) > allowed for k in KEYS):
+            failures.append(label)
+
+    if failures:
+        print(f"ERROR: el conteo por tracks difiere de la referencia con ritmo {', '.join(failures)}")
+        sys.exit(1)
+    print("OK: conteo por tracks estable al reducir el ritmo de inferencia")
+
+
+if __name__ == '__main__':
+    main()
@@ -14,9 +14,70 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def check_detection_status():
-    """Verifica el estado de detección cada 5 segundos y lo registra"""
-    url = "http://192.168.9.30:8080/status"
+BASE_URL = "http://192.168.9.30:8080"
+
+def log_status(data):
+    """Registra el estado de detección recibido"""
+    detection_enabled = data.get("detection_enabled", False)
+    last_detection = data.get("last_detection", {})
+    pizza_detected = last_detection.get("pizza", False)
+    blister_detected = last_detection.get("blister", False)
+    timestamp = last_detection.get("timestamp", None)
+    
+    # Registrar estado
+    logger.info(f"Detección activa: {detection_enabled}")
+    logger.info(f"Última detección: Pizza: {pizza_detected}, Blister: {blister_detected}")
+    logger.info(f"Contadores: {last_detection.get('counter_sin_blister', 0)}/{last_detection.get('counter_con_blister', 0)}, "
+                f"OPC-UA: {data.get('opcua_connected', False)}")
+    logger.info(f"Timestamp: {timestamp}")
+    logger.info("-" * 50)
+
+def merge(target, delta):
+    """Aplica un delta del stream (solo los campos que cambiaron) sobre el estado completo"""
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+def stream_detection_status(base_url=BASE_URL):
+    """Recibe el estado por SSE (/status/stream) y lo registra solo cuando cambia"""
+    url = f"{base_url}/status/stream"
+    logger.info(f"Iniciando monitoreo de detección por SSE en {url}...")
+    
+    while True:
+        state = None
+        try:
+            with requests.get(url, stream=True, timeout=(5, 60)) as response:
+                if response.status_code != 200:
+                    logger.error(f"Error al abrir el stream: HTTP {response.status_code}")
+                    time.sleep(2)
+                    continue
+                
+                event = None
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("event:"):
+                        event = line.split(":", 1)[1].strip()
+                    elif line.startswith("data:"):
+                        data = json.loads(line.split(":", 1)[1])
+                        if event == "snapshot":
+                            state = data
+                        elif event == "delta" and state is not None:
+                            merge(state, data)
+                        if state is not None:
+                            log_status(state)
+                    elif not line:
+                        event = None
+        except Exception as e:
+            logger.error(f"Error de conexión: {e}")
+        
+        # Reconectar; el servidor envía un snapshot completo al volver
+        time.sleep(2)
+
+def check_detection_status(base_url=BASE_URL):
+    """Verifica el estado de detección cada 2 segundos y lo registra"""
+    url = f"{base_url}/status"
     
     logger.info("Iniciando monitoreo de detección...")
     
@@ -24,29 +85,24 @@ def check_detection_status():
         try:
             response = requests.get(url)
             if response.status_code == 200:
-                data = response.json()
-                
-                # Extraer datos
-                detection_enabled = data.get("detection_enabled", False)
-                last_detection = data.get("last_detection", {})
-                pizza_detected = last_detection.get("pizza", False)
-                blister_detected = last_detection.get("blister", False)
-                timestamp = last_detection.get("timestamp", None)
-                
-                # Registrar estado
-                logger.info(f"Detección activa: {detection_enabled}")
-                logger.info(f"Última detección: Pizza: {pizza_detected}, Blister: {blister_detected}")
-                logger.info(f"Timestamp: {timestamp}")
-                logger.info("-" * 50)
-                
+                log_status(response.json())
             else:
                 logger.error(f"Error al obtener estado: HTTP {response.status_code}")
         
         except Exception as e:
             logger.error(f"Error de conexión: {e}")
         
-        # Esperar 5 segundos antes de verificar nuevamente
+        # Esperar 2 segundos antes de verificar nuevamente
         time.sleep(2)
 
 if __name__ == "__main__":
-    check_detection_status()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Monitoreo del estado de detección")
+    parser.add_argument("--url", default=BASE_URL, help="URL base de la aplicación")
+    parser.add_argument("--poll", action="store_true", help="Consultar /status periódicamente en lugar de usar SSE")
+    args = parser.parse_args()
+    
+    if args.poll:
+        check_detection_status(args.url)
+    else:
+        stream_detection_status(args.url)
@@ -20,6 +20,14 @@ class Config:
     OPCUA_URL = "opc.tcp://192.168.9.20:4840"
     OPCUA_NODE_SIN_BLISTER = "ns=4;i=3"  # NodeId para pizza sin blister
     OPCUA_NODE_CON_BLISTER = "ns=4;i=4"  # NodeId para pizza con blister
+    OPCUA_PULSE_WIDTH = 0.1  # Segundos que el nodo permanece a True en cada pulso
+    OPCUA_PULSE_MIN_GAP = 0.1  # Segundos mínimos a False entre dos pulsos del mismo nodo
+    OPCUA_PULSE_QUEUE_SIZE = 64  # Pulsos pendientes máximos; por encima se descartan
+    OPCUA_WRITE_BATCH_WINDOW = 0.005  # Flancos de nodos distintos dentro de esta ventana se escriben juntos
+    OPCUA_TIMEOUT = 1  # Segundos de espera de cada petición al servidor
+    OPCUA_LIVENESS_INTERVAL = 0.25  # Periodo de la suscripción a la hora del servidor
+    OPCUA_LIVENESS_TIMEOUT = 0.6  # Segundos sin señales de vida antes de comprobar la conexión
+    OPCUA_LINK_LOSS_TIMEOUT = 0.9  # Segundos máximos sin señales de vida (sondeo incluido) antes de dar la conexión por perdida
     
     WINDOW_NAME = 'YOLO Video Stream'
     RED_DOT_POSITION = (50,50)
@@ -30,6 +38,94 @@ class Config:
     GREEN_DOT_COLOR = (0, 255, 0)  # Green in BGR
     PIZZA_CLASS_ID = 1
     BLISTER_CLASS_ID = 0
+    
+    # Multi-cámara: lista de cámaras, cada una con su fuente, ROI (x1, y1, x2, y2) y nodos OPC-UA.
+    # None = una sola cámara con VIDEO_SOURCE y los nodos OPCUA_NODE_* de arriba. Ejemplo:
+    # CAMERAS = [
+    #     {"id": "linea1", "source": 0, "roi": (60, 75, 480, 405),
+    #      "opcua_node_sin_blister": "ns=4;i=3", "opcua_node_con_blister": "ns=4;i=4"},
+    #     {"id": "linea2", "source": "videos/linea2.mp4",
+    #      "opcua_node_sin_blister": "ns=4;i=5", "opcua_node_con_blister": "ns=4;i=6"},
+    # ]
+    CAMERAS = None
+    TRACKER = 'bytetrack.yaml'  # Configuración del tracker de cada cámara
+    
+    # Conteo de pizzas: 'track' (una vez por id de track, robusto a frames perdidos) o 'edge' (flanco de los flags)
+    COUNT_BY = 'track'
+    COUNT_TRACK_TTL = 2.0  # Segundos sin ver un track antes de olvidarlo (y poder contar otro con el mismo id)
+    COUNT_MAX_TRACKS = 256  # Tracks recordados por cámara; por encima se olvida el menos reciente
+    COUNT_MIN_HITS = 1  # Frames de un track dentro del área para contarlo (menos = ruido, no se cuenta)
+    COUNT_EXIT_SECONDS = 0.5  # Segundos sin ver un track en el área para contarlo sin blister (None = al caducar)
+    
+    # Ritmo objetivo del loop de detección en inferencias por segundo (0 = máximo rendimiento)
+    DETECTION_TARGET_FPS = 15
+    
+    # Detector de cambios: si el área de inspección no cambia se reutiliza la última detección
+    MOTION_GATING = False
+    MOTION_THRESHOLD = 0.01  # Fracción de píxeles cambiados que dispara la inferencia
+    MOTION_PIXEL_DELTA = 20  # Diferencia de gris (0-255) para considerar un píxel cambiado
+    MOTION_SCALE = 0.25  # Reducción del área antes de comparar
+    MOTION_MAX_SKIP = 50  # Inferir al menos cada N frames aunque no haya cambios
+    
+    # Inferencia solo sobre el área de inspección (más un margen en píxeles) en lugar del frame completo
+    INFERENCE_ROI = False
+    INFERENCE_ROI_MARGIN = 32
+    
+    # Backend del modelo: 'auto' (el más rápido de MODEL_BACKEND_CANDIDATES según un micro-benchmark
+    # al arrancar) o uno concreto: 'pytorch', 'tensorrt' (models/yolo_weights_engine.engine), 'onnx',
+    # 'onnx_int8', 'openvino', 'openvino_fp16' u 'openvino_int8'. Las exportaciones se guardan en
+    # MODEL_CACHE_DIR por huella de los pesos y tamaño de entrada, y solo se hacen la primera vez
+    MODEL_BACKEND = 'auto'
+    MODEL_BACKEND_CANDIDATES = ('pytorch', 'tensorrt', 'onnx', 'openvino', 'openvino_fp16')
+    MODEL_IMGSZ = 640  # Tamaño de entrada del modelo (y de las exportaciones)
+    MODEL_CACHE_DIR = BASE_DIR / 'models' / 'cache'
+    MODEL_BENCHMARK_RUNS = 10  # Inferencias por candidato en el micro-benchmark
+    MODEL_BACKEND_REBENCHMARK = False  # True = medir de nuevo aunque haya una elección guardada
+    MODEL_INT8_DATA = None  # YAML de dataset para calibrar 'openvino_int8' (p. ej. 'pizzas.yaml')
+    
+    # Arranque: objetivo de segundos desde el inicio del proceso hasta la primera detección
+    # (se avisa en el log si se supera; fases en /ready y en /metrics), 0 = sin objetivo
+    STARTUP_TARGET_SECONDS = 30
+    
+    # Loop de detección como pipeline: captura → inferencia → post-procesado → codificación,
+    # cada etapa en paralelo y con una cola de entrada acotada que descarta lo más antiguo
+    PIPELINE_QUEUE_SIZE = 2  # Lotes como máximo en la cola de entrada de cada etapa
+    # Ubicación por etapa: 'thread' (por defecto) o, solo para la inferencia, 'process': el modelo y
+    # los trackers en un proceso aparte (sin competir por el GIL con el streaming); los frames se
+    # pasan por memoria compartida y el proceso se reinicia si cae o no responde
+    PIPELINE_PLACEMENT = {'capture': 'thread', 'inference': 'thread', 'postprocess': 'thread', 'encode': 'thread'}
+    INFERENCE_WORKER_MAX_FRAME_BYTES = 1920 * 1080 * 3  # Tamaño de cada ranura de frame (BGR)
+    INFERENCE_WORKER_TIMEOUT = 5.0  # Segundos máximos por lote antes de reiniciar el proceso
+    
+    # Calidad por defecto del stream (se puede cambiar por cliente con ?width=&quality=&fps=)
+    STREAM_WIDTH = 0  # Ancho en píxeles, 0 = resolución original
+    STREAM_JPEG_QUALITY = 95  # Calidad JPEG (95 es el valor por defecto de OpenCV)
+    STREAM_MAX_FPS = 0  # FPS máximos por cliente, 0 = sin límite
+    STREAM_MAX_CLIENTS = 16  # Clientes MJPEG simultáneos, 0 = sin límite
+    STREAM_OVERFLOW = 'snapshot'  # Por encima del límite: 'snapshot' (un único JPEG) o 'refuse' (503)
+    STREAM_WRITE_TIMEOUT = 5  # Segundos máximos por escritura a un cliente antes de expulsarlo
+    STREAM_MAX_IN_FLIGHT_BYTES = 1024 * 1024  # Bytes sin confirmar por cliente antes de saltar frames, 0 = sin límite
+    WS_MAX_VIEWERS = 8  # Espectadores de vídeo por WebSocket simultáneos, 0 = sin límite
+    WS_MAX_IN_FLIGHT = 2  # Frames enviados sin confirmar por conexión antes de saltar frames
+    
+    # Estado por Server-Sent Events (/status/stream)
+    STATUS_STREAM_INTERVAL = 0.1  # Segundos entre comprobaciones de cambios (una para todos los clientes)
+    STATUS_STREAM_SNAPSHOT_INTERVAL = 30  # Segundos entre snapshots completos a cada cliente
+    
+    # Grabación de frames y detecciones para reproducir incidencias (también con /api/recording/start)
+    RECORDING_ENABLED = False
+    RECORDING_DIR = BASE_DIR / 'recordings'  # Un subdirectorio por sesión y cámara
+    RECORDING_ENCODING = 'jpeg'  # 'jpeg' (compacto) o 'raw' (BGR sin comprimir, lectura sin copia)
+    RECORDING_JPEG_QUALITY = 90
+    RECORDING_MAX_MB = 2048  # Tamaño máximo de frames.bin por cámara, 0 = sin límite
+    RECORDING_QUEUE_SIZE = 64  # Frames pendientes de escribir; por encima se descartan
+    
+    # Registro persistente de producción: una fila por pizza contada y agregados para /api/events
+    EVENT_LOG_ENABLED = True
+    EVENT_LOG_PATH = BASE_DIR / 'instance' / 'events.db'  # SQLite en modo WAL
+    EVENT_LOG_FLUSH_INTERVAL = 1.0  # Segundos máximos que un evento espera en la cola antes de escribirse
+    EVENT_LOG_RETENTION_DAYS = 365  # Días que se conservan los eventos individuales (0 = siempre); los agregados no caducan
+    EVENT_LOG_SHIFTS = [('mañana', 6), ('tarde', 14), ('noche', 22)]  # (nombre, hora de inicio) de cada turno
     BASE_DIR = BASE_DIR  # Add BASE_DIR to the configuration
 
 class ProductionConfig(Config):
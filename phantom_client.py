@@ -36,15 +36,16 @@ def phantom_client():
         while True:
             try:
                 logger.info("Conectando al stream de video...")
-                # Hacer una conexión al stream pero no procesar los datos
-                response = requests.get(f"{url}/video_feed", stream=True)
-                
-                # Leer algunos bytes para mantener la conexión activa
-                for chunk in response.iter_content(chunk_size=1024):
-                    if chunk:
-                        # Procesamos unos pocos chunks y luego reconectamos
-                        # para evitar consumir demasiada memoria/ancho de banda
-                        break
+                # Hacer una conexión al stream pero no procesar los datos.
+                # Cerrar la respuesta al salir: si no, el socket queda abierto sin leer
+                # y el servidor mantiene el cliente hasta que lo expulsa por lento
+                with requests.get(f"{url}/video_feed", stream=True, timeout=10) as response:
+                    # Leer algunos bytes para mantener la conexión activa
+                    for chunk in response.iter_content(chunk_size=1024):
+                        if chunk:
+                            # Procesamos unos pocos chunks y luego reconectamos
+                            # para evitar consumir demasiada memoria/ancho de banda
+                            break
                 
                 logger.info("Reconectando...")
                 time.sleep(5)  # Esperar antes de reconectar
@@ -1,19 +1,59 @@
-from flask import Flask, render_template, Response, jsonify
+from flask import Flask, render_template, Response, jsonify, request, abort
 from app.camera import generate_frames, VideoCamera
 from config import Config
 import logging
 import threading
 import time
 import atexit
-from app.camera import cleanup
+from app.camera import cleanup, get_camera_manager, get_scheduler, get_event_log, get_inference_worker, get_pipeline, opcua_is_connected, opcua_stats, metrics_samples, warm_up_model, detection_fps
+from app.event_log import parse_time
+from app.model_backends import selected_backend, backend_stats
+from app.metrics import REGISTRY, CONTENT_TYPE
+from app.status_stream import StatusHub
+from app.ws_stream import serve_video, CLOSE_TRY_AGAIN_LATER
+from app.stream_guard import ViewerLimit, SendGuard
+from app.stream_tiers import tier_from_args
+from app.camera_manager import camera_configs
+from app.detection_snapshot import EMPTY_SNAPSHOT, embed_json
+from app.startup import STARTUP
 
 app = Flask(__name__, template_folder='app/templates')
 app.config.from_object(Config)
 
+# Objetivo de tiempo desde el inicio del proceso hasta la primera detección
+STARTUP.target_seconds = app.config.get('STARTUP_TARGET_SECONDS', 0)
+
+# Gauges y contadores del estado de la aplicación en /metrics
+REGISTRY.register_collector(metrics_samples)
+REGISTRY.register_collector(lambda: [('yolo_status_stream_clients', 'gauge', 'Clientes conectados a /status/stream',
+                                      [({}, status_hub.client_count())])])
+REGISTRY.register_collector(lambda: [('yolo_startup_phase_seconds', 'gauge',
+                                      'Segundos desde el inicio del proceso hasta el fin de cada fase del arranque',
+                                      [({"phase": phase}, seconds) for phase, seconds in STARTUP.phases().items()])])
+
 # Configuración de logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# Importar biblioteca para el stream de vídeo por WebSocket
+try:
+    from flask_sock import Sock
+    SOCK_AVAILABLE = True
+except ImportError as e:
+    SOCK_AVAILABLE = False
+    Sock = None  # Definir Sock como None para evitar NameError
+    logger.error(f"La biblioteca flask-sock no está instalada: {e}. El vídeo por WebSocket no estará disponible.")
+
+sock = Sock(app) if SOCK_AVAILABLE else None
+ws_viewers = ViewerLimit(app.config.get('WS_MAX_VIEWERS', 8))
+mjpeg_clients = ViewerLimit(app.config.get('STREAM_MAX_CLIENTS', 16))
+REGISTRY.register_collector(lambda: [
+    ('yolo_stream_clients_rejected_total', 'counter', 'Clientes MJPEG rechazados o degradados a snapshot',
+     [({}, mjpeg_clients.rejected)]),
+    ('yolo_stream_clients_evicted_total', 'counter', 'Clientes MJPEG expulsados por lentos',
+     [({}, mjpeg_clients.evicted)]),
+])
+
 # Shared state object to control detection
 class SharedState:
     detection_enabled = True  # Cambiado a True por defecto
@@ -28,21 +68,74 @@ def initialize_detection():
     """Inicializa la cámara y activa la detección automáticamente"""
     global camera_instance
     logger.info("Inicializando sistema de detección...")
+    # Cargar y calentar el modelo mientras se abren las cámaras y se conecta el PLC
+    threading.Thread(target=warm_up_model, args=(app.config,), name="model-warmup", daemon=True).start()
     camera_instance = VideoCamera(app.config)
     shared_state.detection_enabled = True
     logger.info("Sistema de detección inicializado")
 
 # Iniciar en un thread separado para no bloquear el arranque
+STARTUP.mark('imports')
 threading.Thread(target=initialize_detection, daemon=True).start()
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def check_camera_id(cam_id):
+    """Devuelve 404 si la cámara no está configurada"""
+    if cam_id is not None and str(cam_id) not in [str(cam.get('id', i)) for i, cam in enumerate(camera_configs(app.config))]:
+        abort(404, description=f"Cámara desconocida: {cam_id}")
+
 @app.route('/video_feed')
-def video_feed():
-    logger.info(f"Video feed requested, detection_enabled={shared_state.detection_enabled}")
-    return Response(generate_frames(app.config, shared_state), mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/video_feed/<cam_id>')
+def video_feed(cam_id=None):
+    check_camera_id(cam_id)
+    # Calidad opcional del stream: /video_feed?width=640&quality=60&fps=5
+    tier = tier_from_args(request.args, app.config)
+    if not mjpeg_clients.acquire():
+        # Límite de clientes alcanzado: un único JPEG (snapshot) o rechazo
+        logger.warning(f"Límite de clientes de vídeo alcanzado ({mjpeg_clients.max_viewers})")
+        snapshot = VideoCamera(app.config, cam_id).snapshot(tier) \
+            if app.config.get('STREAM_OVERFLOW', 'snapshot') == 'snapshot' else None
+        if snapshot is None:
+            return Response("Demasiados clientes de vídeo", status=503, headers={"Retry-After": "5"})
+        return Response(snapshot, mimetype='image/jpeg', headers={"Cache-Control": "no-store"})
+    logger.info(f"Video feed requested (cámara {cam_id}), detection_enabled={shared_state.detection_enabled}, tier={tier}")
+    guard = SendGuard(request.environ, app.config.get('STREAM_WRITE_TIMEOUT', 5),
+                      app.config.get('STREAM_MAX_IN_FLIGHT_BYTES', 0), limit=mjpeg_clients)
+    response = Response(generate_frames(app.config, shared_state, tier, cam_id, guard),
+                        mimetype='multipart/x-mixed-replace; boundary=frame')
+    # El servidor WSGI cierra la respuesta siempre, aunque el generador no llegue a arrancar
+    response.call_on_close(mjpeg_clients.release)
+    return response
+
+def video_websocket(ws, cam_id=None):
+    """
+    Vídeo por WebSocket: un mensaje binario por frame con cabecera (versión, flags de
+    detección, tamaño de cabecera, secuencia) seguida del JPEG. El cliente confirma
+    cada frame mostrado; los frames que llegan mientras tanto se saltan.
+    """
+    if cam_id is not None and str(cam_id) not in [str(cam.get('id', i)) for i, cam in enumerate(camera_configs(app.config))]:
+        ws.close(reason=1008, message=f"Cámara desconocida: {cam_id}")
+        return
+    if not ws_viewers.acquire():
+        logger.warning(f"Límite de espectadores WebSocket alcanzado ({ws_viewers.max_viewers}), conexión rechazada")
+        ws.close(reason=CLOSE_TRY_AGAIN_LATER, message="Demasiados espectadores")
+        return
+    try:
+        tier = tier_from_args(request.args, app.config)
+        camera = VideoCamera(app.config, cam_id)
+        logger.info(f"Cliente WebSocket conectado (cámara {camera.camera.id}), tier={tier}")
+        serve_video(ws, camera.camera, tier, max_in_flight=app.config.get('WS_MAX_IN_FLIGHT', 2))
+    finally:
+        ws_viewers.release()
+        logger.info("Cliente WebSocket desconectado")
+
+# Misma URL que el MJPEG: las peticiones WebSocket van a estas rutas y las HTTP a video_feed
+if sock is not None:
+    sock.route('/video_feed')(video_websocket)
+    sock.route('/video_feed/<cam_id>', endpoint='video_websocket_camera')(video_websocket)
 
 @app.route('/start_detection', methods=['POST'])
 def start_detection():
@@ -58,47 +151,204 @@ def stop_detection():
     logger.info(f"detection_enabled={shared_state.detection_enabled}")
     return jsonify(success=True)
 
-@app.route('/status', methods=['GET'])
-def status():
-    """Endpoint para verificar el estado de la detección y PLC"""
-    from app.camera import _counter_pizza_sin_blister, _counter_pizza_con_blister, _counter_total
-    
-    # Asegurarse de que todos los campos necesarios estén presentes
-    detection_data = shared_state.last_detection.copy()
-    
-    # Forzar la actualización de los contadores desde las variables globales
-    detection_data["counter_sin_blister"] = _counter_pizza_sin_blister
-    detection_data["counter_con_blister"] = _counter_pizza_con_blister
-    detection_data["counter_total"] = _counter_total
-    
-    # Calcular porcentajes
-    total = detection_data["counter_total"] if detection_data["counter_total"] > 0 else 1
-    detection_data["porcentaje_sin_blister"] = (detection_data["counter_sin_blister"] / total) * 100
-    detection_data["porcentaje_con_blister"] = (detection_data["counter_con_blister"] / total) * 100
-    
-    # Verificar estado de conexión OPC-UA
-    from app.camera import _opcua_client
-    opcua_connected = _opcua_client and _opcua_client.connected if _opcua_client else False
-    
-    return jsonify({
+def status_envelope(ctx, snapshot):
+    """Campos de /status de una cámara salvo `last_detection` (que es el propio snapshot)"""
+    return {
+        "camera_id": ctx.id if ctx else None,
         "detection_enabled": shared_state.detection_enabled,
-        "last_detection": detection_data,
         "plc_signals": {
-            "bit0_pizza_sin_blister": detection_data.get("pizza", False) and not detection_data.get("blister", False),
-            "bit1_pizza_con_blister": detection_data.get("pizza", False) and detection_data.get("blister", False)
+            "bit0_pizza_sin_blister": snapshot.pizza and not snapshot.blister,
+            "bit1_pizza_con_blister": snapshot.pizza and snapshot.blister
         },
-        "opcua_connected": opcua_connected,
+        "opcua_connected": opcua_is_connected(),
+        "model_backend": selected_backend(),
         "system_status": "active" if camera_instance is not None else "initializing"
-    })
+    }
+
+def camera_status(ctx):
+    """Estado de detección, contadores y señales PLC de una cámara"""
+    # Una sola lectura de la referencia: todos los campos salen del mismo frame
+    snapshot = ctx.snapshot if ctx else EMPTY_SNAPSHOT
+    return {**status_envelope(ctx, snapshot), "last_detection": snapshot.as_dict()}
+
+@app.route('/status', methods=['GET'])
+@app.route('/status/<cam_id>', methods=['GET'])
+def status(cam_id=None):
+    """Endpoint para verificar el estado de la detección y PLC (de la primera cámara si no se indica)"""
+    check_camera_id(cam_id)
+    manager = get_camera_manager()
+    ctx = manager.get(cam_id) if manager else None
+    snapshot = ctx.snapshot if ctx else EMPTY_SNAPSHOT
+    data = status_envelope(ctx, snapshot)
+    data["cameras"] = list(manager.contexts.keys()) if manager else []
+    # El JSON del snapshot se serializa una sola vez por frame y se reutiliza en cada petición
+    return Response(embed_json(data, "last_detection", snapshot.to_json()), mimetype='application/json')
+
+def all_camera_status():
+    """Estado de todas las cámaras, construido una sola vez por ciclo para todos los clientes SSE"""
+    manager = get_camera_manager()
+    if not manager:
+        return {}
+    cameras = list(manager.contexts.keys())
+    return {ctx.id: {**camera_status(ctx), "cameras": cameras} for ctx in manager.contexts.values()}
+
+# Estado empujado a los clientes por Server-Sent Events (sustituye al sondeo de /status)
+status_hub = StatusHub(all_camera_status,
+                       interval=app.config.get('STATUS_STREAM_INTERVAL', 0.1),
+                       snapshot_interval=app.config.get('STATUS_STREAM_SNAPSHOT_INTERVAL', 30))
+
+@app.route('/status/stream', methods=['GET'])
+@app.route('/status/stream/<cam_id>', methods=['GET'])
+def status_stream(cam_id=None):
+    """
+    Stream SSE del estado de una cámara (la primera si no se indica): evento 'snapshot' con el
+    mismo contenido que /status al conectar y periódicamente, y eventos 'delta' con solo los
+    campos que cambian cuando cambian los flags, los contadores o el estado OPC-UA.
+    """
+    check_camera_id(cam_id)
+
+    def select(state):
+        if cam_id is not None:
+            return state.get(str(cam_id))
+        manager = get_camera_manager()
+        return state.get(manager.default.id) if manager else None
+
+    return Response(status_hub.stream(select), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # Añadir o modificar la ruta para el estado de detección
 
 @app.route('/api/detection_status', methods=['GET'])
 def detection_status():
     """Devuelve el estado actual de la detección"""
+    manager = get_camera_manager()
+    if not manager:
+        return jsonify({"detection_enabled": shared_state.detection_enabled,
+                        "last_detection": shared_state.last_detection})
+    return Response(embed_json({"detection_enabled": shared_state.detection_enabled},
+                               "last_detection", manager.default.snapshot.to_json()),
+                    mimetype='application/json')
+
+@app.route('/api/models', methods=['GET'])
+def api_models():
+    """Devuelve los modelos cargados en el proceso y la memoria que ocupa cada uno"""
+    from app.model_registry import model_stats
+    # Backend elegido y tiempos del micro-benchmark de cada candidato
+    return jsonify({"models": model_stats(), "backend": backend_stats()})
+
+@app.route('/api/scheduler', methods=['GET'])
+def api_scheduler():
+    """Devuelve el ritmo del loop de detección: FPS logrados, plazos incumplidos y tiempos por etapa"""
+    scheduler = get_scheduler()
+    manager = get_camera_manager()
+    data = scheduler.stats() if scheduler else {}
+    # achieved_fps cuenta los lotes capturados; detection_fps, los que completan la inferencia
+    data["detection_fps"] = round(detection_fps(), 2)
+    # Fracción de frames en los que el detector de cambios evitó la inferencia
+    data["motion_gating"] = {ctx.id: ctx.motion_gate.stats() for ctx in manager.contexts.values()
+                             if ctx.motion_gate} if manager else {}
+    # Tabla de tracks del conteo: activos, contados, caducados y expulsados por tamaño
+    data["track_counting"] = {ctx.id: ctx.track_counter.stats() for ctx in manager.contexts.values()
+                              if ctx.track_counter} if manager else {}
+    # Proceso de inferencia: PID, peticiones, fallos y reinicios (None = inferencia en este proceso)
+    worker = get_inference_worker()
+    data["inference_worker"] = worker.stats() if worker else None
+    # Etapas del pipeline: ubicación, utilización, ms por lote y profundidad/descartes de su cola
+    pipeline = get_pipeline()
+    data["pipeline"] = pipeline.stats() if pipeline else {}
+    return jsonify(data)
+
+@app.route('/api/opcua', methods=['GET'])
+def api_opcua():
+    """Devuelve el estado de la conexión OPC-UA y de la cola de pulsos al PLC"""
+    return jsonify(opcua_stats())
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """
+    Listo para inspeccionar: modelo cargado y calentado, alguna cámara abierta y primera
+    detección publicada. 503 mientras no, con las fases del arranque ya completadas.
+    """
+    checks = {
+        "model": STARTUP.done('model_ready'),
+        "cameras": STARTUP.done('cameras_opened'),
+        "detection": STARTUP.done('first_detection'),
+    }
+    is_ready = all(checks.values())
     return jsonify({
-        "detection_enabled": shared_state.detection_enabled,
-        "last_detection": shared_state.last_detection,
+        "ready": is_ready,
+        "checks": checks,
+        "phases": STARTUP.phases(),
+        "time_to_first_detection": STARTUP.time_to_first_detection(),
+        "target_seconds": STARTUP.target_seconds,
+    }), 200 if is_ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas en formato de texto de Prometheus: latencia por etapa, clientes, OPC-UA y contadores"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/api/recording', methods=['GET'])
+def api_recording():
+    """Devuelve el estado de la grabación de cada cámara: frames escritos, descartados y bytes"""
+    manager = get_camera_manager()
+    return jsonify(manager.recording_stats() if manager else {})
+
+@app.route('/api/recording/start', methods=['POST'])
+def api_recording_start():
+    """Empieza a grabar frames, detecciones y pulsos de todas las cámaras"""
+    manager = get_camera_manager()
+    if not manager:
+        return jsonify({"success": False, "message": "Cámaras no inicializadas"}), 503
+    session = manager.start_recording(app.config)
+    return jsonify({"success": True, "session": session, "recording": manager.recording_stats()})
+
+@app.route('/api/recording/stop', methods=['POST'])
+def api_recording_stop():
+    """Detiene la grabación y cierra los ficheros"""
+    manager = get_camera_manager()
+    if manager:
+        manager.stop_recording()
+    return jsonify({"success": True})
+
+# Periodo consultado por defecto en /api/events según la granularidad
+EVENTS_DEFAULT_SPAN = {'minute': 3600, 'hour': 86400, 'shift': 7 * 86400}
+
+@app.route('/api/events', methods=['GET'])
+def api_events():
+    """
+    Pizzas contadas por periodo desde el registro persistente:
+    /api/events?granularity=minute|hour|shift&from=<ISO o epoch>&to=<ISO o epoch>&camera=<id>
+    """
+    event_log = get_event_log()
+    if not event_log:
+        return jsonify({"success": False, "message": "Registro de producción desactivado"}), 503
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in EVENTS_DEFAULT_SPAN:
+        return jsonify({"success": False, "message": f"Granularidad no soportada: {granularity}"}), 400
+    try:
+        end = parse_time(request.args.get('to'), time.time())
+        start = parse_time(request.args.get('from'), end - EVENTS_DEFAULT_SPAN[granularity])
+    except ValueError as e:
+        return jsonify({"success": False, "message": f"Fecha no válida: {e}"}), 400
+    return jsonify({
+        "granularity": granularity,
+        "from": start,
+        "to": end,
+        "aggregates": event_log.aggregates(granularity, start, end, request.args.get('camera')),
+        "log": event_log.stats(),
+    })
+
+@app.route('/api/stream_clients', methods=['GET'])
+def api_stream_clients():
+    """Estadísticas de cada cliente de streaming (frames enviados y saltados, FPS efectivos) y límites globales"""
+    manager = get_camera_manager()
+    cameras = manager.contexts.values() if manager else []
+    return jsonify({
+        "cameras": {ctx.id: {"clients": ctx.broadcaster.stats(), "encoding": ctx.tier_encoder.stats()}
+                    for ctx in cameras},
+        "mjpeg": mjpeg_clients.stats(),
+        "websocket": ws_viewers.stats(),
     })
 
 # Añadir esta ruta a tu archivo run.py